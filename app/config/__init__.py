@@ -1,4 +1,12 @@
-from app.config.database import Base, engine, get_db, SessionLocal
 from app.config.settings import settings
 
-__all__ = ["Base", "engine", "get_db", "SessionLocal", "settings"]
+__all__ = ["Base", "engine", "get_db", "get_session", "SessionLocal", "settings"]
+
+
+def __getattr__(nombre):
+    # database se importa al pedirlo: importar app.config.settings no debe crear
+    # el engine, porque los módulos que lo instrumentan también leen settings
+    if nombre in __all__:
+        from app.config import database
+        return getattr(database, nombre)
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
@@ -0,0 +1,218 @@
+"""
+Métricas de la aplicación en formato de texto de Prometheus (GET /metrics)
+
+Contadores e histogramas propios, sin dependencias: cada métrica guarda sus
+series por tupla de etiquetas y las actualiza bajo un lock propio (sin
+contención en la práctica), de modo que registrar una observación solo
+suma enteros. Se alimentan desde el middleware de logging (peticiones HTTP),
+los eventos de SQLAlchemy del engine (consultas SQL) y el detector de
+alertas (lecturas procesadas y alertas generadas, al confirmarse).
+"""
+from bisect import bisect_left
+from collections import Counter
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.config.metricas_pool import metricas_async, metricas_sync
+from app.utils.transacciones import al_confirmar
+import threading
+import time
+
+# Límites (en segundos) de los buckets de los histogramas de latencia
+BUCKETS_HTTP = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_SQL = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+
+# Cantidad máxima de sentencias distintas cuyo tipo se recuerda
+MAX_SENTENCIAS_CACHE = 2000
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _etiquetas(nombres: tuple, valores: tuple, extra: str = "") -> str:
+    pares = [f'{nombre}="{_escapar(valor)}"' for nombre, valor in zip(nombres, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+class Contador:
+    def __init__(self, nombre: str, ayuda: str, etiquetas: tuple = ()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self._series: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+    
+    def incrementar(self, *valores, cantidad: float = 1):
+        with self._lock:
+            self._series[valores] = self._series.get(valores, 0) + cantidad
+    
+    def exponer(self) -> list[str]:
+        with self._lock:
+            series = list(self._series.items())
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} counter"]
+        for valores, total in series:
+            lineas.append(f"{self.nombre}{_etiquetas(self.etiquetas, valores)} {total}")
+        return lineas
+
+
+class _Serie:
+    __slots__ = ("buckets", "suma")
+    
+    def __init__(self, cantidad_buckets: int):
+        # Conteos por bucket sin acumular; el último es +Inf
+        self.buckets = [0] * (cantidad_buckets + 1)
+        self.suma = 0.0
+
+
+class Histograma:
+    def __init__(self, nombre: str, ayuda: str, etiquetas: tuple = (), buckets: tuple = BUCKETS_HTTP):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self.limites = buckets
+        self._series: dict[tuple, _Serie] = {}
+        self._lock = threading.Lock()
+    
+    def observar(self, valor: float, *valores):
+        indice = bisect_left(self.limites, valor)
+        with self._lock:
+            serie = self._series.get(valores)
+            if serie is None:
+                serie = self._series[valores] = _Serie(len(self.limites))
+            serie.buckets[indice] += 1
+            serie.suma += valor
+    
+    def exponer(self) -> list[str]:
+        with self._lock:
+            series = [(valores, list(serie.buckets), serie.suma) for valores, serie in self._series.items()]
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        for valores, buckets, suma in series:
+            acumulado = 0
+            for limite, cantidad in zip((*self.limites, "+Inf"), buckets):
+                acumulado += cantidad
+                le = f'le="{limite}"'
+                lineas.append(f"{self.nombre}_bucket{_etiquetas(self.etiquetas, valores, le)} {acumulado}")
+            etiquetas = _etiquetas(self.etiquetas, valores)
+            lineas.append(f"{self.nombre}_sum{etiquetas} {suma}")
+            lineas.append(f"{self.nombre}_count{etiquetas} {acumulado}")
+        return lineas
+
+
+peticiones_http = Contador(
+    "risk_advisor_http_peticiones_total", "Peticiones HTTP atendidas", ("metodo", "ruta", "status")
+)
+duracion_http = Histograma(
+    "risk_advisor_http_duracion_segundos", "Duración de las peticiones HTTP", ("metodo", "ruta")
+)
+consultas_sql = Contador(
+    "risk_advisor_sql_consultas_total", "Sentencias SQL ejecutadas", ("motor", "operacion")
+)
+duracion_sql = Histograma(
+    "risk_advisor_sql_duracion_segundos", "Duración de las sentencias SQL", ("motor", "operacion"), BUCKETS_SQL
+)
+errores_sql = Contador("risk_advisor_sql_errores_total", "Sentencias SQL con error", ("motor",))
+lecturas_procesadas = Contador("risk_advisor_lecturas_procesadas_total", "Lecturas analizadas y confirmadas")
+alertas_generadas = Contador(
+    "risk_advisor_alertas_generadas_total", "Alertas nuevas generadas por el detector", ("tipo_alerta",)
+)
+alertas_repetidas = Contador(
+    "risk_advisor_alertas_repetidas_total", "Repeticiones sumadas a alertas abiertas dentro del cooldown"
+)
+
+METRICAS = (
+    peticiones_http,
+    duracion_http,
+    consultas_sql,
+    duracion_sql,
+    errores_sql,
+    lecturas_procesadas,
+    alertas_generadas,
+    alertas_repetidas,
+)
+
+
+def registrar_peticion(metodo: str, ruta: str, status_code: int, duracion: float):
+    peticiones_http.incrementar(metodo, ruta, status_code)
+    duracion_http.observar(duracion, metodo, ruta)
+
+
+def registrar_ingesta(db: Session, lecturas: int, alertas: list, repeticiones: int):
+    """
+    Suma las lecturas analizadas y las alertas del lote cuando se confirme la
+    transacción. Las repeticiones incluyen las ya agrupadas en `ocurrencias`
+    de las alertas nuevas del mismo lote
+    """
+    tipos = Counter(alerta.tipo_alerta for alerta in alertas)
+    repeticiones += sum(alerta.ocurrencias - 1 for alerta in alertas)
+    
+    def _registrar():
+        lecturas_procesadas.incrementar(cantidad=lecturas)
+        for tipo, cantidad in tipos.items():
+            alertas_generadas.incrementar(tipo, cantidad=cantidad)
+        if repeticiones:
+            alertas_repetidas.incrementar(cantidad=repeticiones)
+    
+    al_confirmar(db, _registrar)
+
+
+def instrumentar_sql(engine, motor: str):
+    """Registra los listeners que cuentan y miden las sentencias de un engine síncrono"""
+    operaciones: dict[str, str] = {}
+    
+    def _operacion(sentencia: str) -> str:
+        # Las sentencias compiladas se reutilizan: el tipo se calcula una vez por texto
+        operacion = operaciones.get(sentencia)
+        if operacion is None:
+            partes = sentencia.split(None, 1)
+            operacion = partes[0].upper() if partes else ""
+            if len(operaciones) >= MAX_SENTENCIAS_CACHE:
+                operaciones.clear()
+            operaciones[sentencia] = operacion
+        return operacion
+    
+    @event.listens_for(engine, "before_cursor_execute")
+    def _antes(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("inicio_consultas", []).append(time.perf_counter())
+    
+    @event.listens_for(engine, "after_cursor_execute")
+    def _despues(conn, cursor, statement, parameters, context, executemany):
+        duracion = time.perf_counter() - conn.info["inicio_consultas"].pop()
+        operacion = _operacion(statement)
+        consultas_sql.incrementar(motor, operacion)
+        duracion_sql.observar(duracion, motor, operacion)
+    
+    @event.listens_for(engine, "handle_error")
+    def _error(contexto):
+        inicios = contexto.connection.info.get("inicio_consultas") if contexto.connection is not None else None
+        if inicios:
+            inicios.pop()
+        errores_sql.incrementar(motor)
+
+
+def _metricas_pools() -> list[str]:
+    """Estado de los pools de conexiones (ver metricas_pool)"""
+    pools = [metricas for metricas in (metricas_sync, metricas_async) if metricas.engine is not None]
+    series = (
+        ("risk_advisor_pool_conexiones_en_uso", "gauge", "Conexiones del pool en uso",
+         lambda metricas: getattr(metricas.engine.pool, "checkedout", lambda: 0)()),
+        ("risk_advisor_pool_checkouts_total", "counter", "Conexiones entregadas por el pool",
+         lambda metricas: metricas.checkouts),
+        ("risk_advisor_pool_timeouts_total", "counter", "Esperas por una conexión que agotaron el timeout",
+         lambda metricas: metricas.timeouts),
+    )
+    lineas = []
+    for nombre, tipo, ayuda, valor in series:
+        lineas += [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} {tipo}"]
+        lineas += [f'{nombre}{{pool="{metricas.nombre}"}} {valor(metricas)}' for metricas in pools]
+    return lineas
+
+
+def exponer() -> str:
+    """Todas las métricas en el formato de texto de Prometheus"""
+    lineas = []
+    for metrica in METRICAS:
+        lineas += metrica.exponer()
+    lineas += _metricas_pools()
+    return "\n".join(lineas) + "\n"
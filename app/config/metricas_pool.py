@@ -0,0 +1,136 @@
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+import threading
+import time
+
+# Límites (en ms) de los buckets del histograma de espera por una conexión
+BUCKETS_ESPERA_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+
+class MetricasPool:
+    """Métricas de uso de un pool de conexiones, alimentadas por eventos de SQLAlchemy"""
+    
+    def __init__(self, nombre: str):
+        self.nombre = nombre
+        self.engine = None
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.checkins = 0
+        self.conexiones_creadas = 0
+        self.conexiones_invalidadas = 0
+        self.timeouts = 0
+        self.max_en_uso = 0
+        self.max_overflow_usado = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+        self.buckets_espera = [0] * (len(BUCKETS_ESPERA_MS) + 1)
+    
+    def registrar_espera(self, segundos: float, timeout: bool = False):
+        milisegundos = segundos * 1000
+        indice = next(
+            (i for i, limite in enumerate(BUCKETS_ESPERA_MS) if milisegundos <= limite),
+            len(BUCKETS_ESPERA_MS),
+        )
+        with self._lock:
+            self.espera_total += segundos
+            self.espera_max = max(self.espera_max, segundos)
+            self.buckets_espera[indice] += 1
+            if timeout:
+                self.timeouts += 1
+    
+    def instrumentar(self, engine):
+        """Registra los listeners de eventos del pool de un engine síncrono"""
+        self.engine = engine
+        
+        @event.listens_for(engine, "connect")
+        def _connect(dbapi_connection, connection_record):
+            with self._lock:
+                self.conexiones_creadas += 1
+        
+        @event.listens_for(engine, "checkout")
+        def _checkout(dbapi_connection, connection_record, connection_proxy):
+            with self._lock:
+                self.checkouts += 1
+                pool = engine.pool
+                if isinstance(pool, QueuePool):
+                    self.max_en_uso = max(self.max_en_uso, pool.checkedout())
+                    self.max_overflow_usado = max(self.max_overflow_usado, pool.overflow())
+        
+        @event.listens_for(engine, "checkin")
+        def _checkin(dbapi_connection, connection_record):
+            with self._lock:
+                self.checkins += 1
+        
+        @event.listens_for(engine, "invalidate")
+        def _invalidate(dbapi_connection, connection_record, exception):
+            with self._lock:
+                self.conexiones_invalidadas += 1
+    
+    def resumen(self) -> dict:
+        pool = self.engine.pool if self.engine is not None else None
+        estado = {"pool": type(pool).__name__ if pool is not None else None}
+        if isinstance(pool, QueuePool):
+            estado.update({
+                "tamano": pool.size(),
+                "en_uso": pool.checkedout(),
+                "disponibles": pool.checkedin(),
+                "overflow": pool.overflow(),
+                "timeout_segundos": pool.timeout(),
+            })
+        
+        with self._lock:
+            esperas = sum(self.buckets_espera)
+            estado.update({
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "conexiones_creadas": self.conexiones_creadas,
+                "conexiones_invalidadas": self.conexiones_invalidadas,
+                "max_en_uso": self.max_en_uso,
+                "max_overflow_usado": self.max_overflow_usado,
+                "timeouts": self.timeouts,
+                "espera": {
+                    "total": esperas,
+                    "promedio_ms": round(self.espera_total * 1000 / esperas, 3) if esperas else None,
+                    "max_ms": round(self.espera_max * 1000, 3),
+                    "buckets_ms": {
+                        **{f"<={limite}": n for limite, n in zip(BUCKETS_ESPERA_MS, self.buckets_espera)},
+                        f">{BUCKETS_ESPERA_MS[-1]}": self.buckets_espera[-1],
+                    },
+                },
+            })
+        return estado
+
+
+def pool_medido(clase_pool, metricas: MetricasPool):
+    """
+    Subclase del pool que mide cuánto espera cada checkout por una conexión.
+    SQLAlchemy no emite un evento antes de esperar, así que se envuelve _do_get
+    """
+    class PoolMedido(clase_pool):
+        def _do_get(self):
+            inicio = time.perf_counter()
+            try:
+                conexion = super()._do_get()
+            except exc.TimeoutError:
+                metricas.registrar_espera(time.perf_counter() - inicio, timeout=True)
+                raise
+            metricas.registrar_espera(time.perf_counter() - inicio)
+            return conexion
+    
+    PoolMedido.__name__ = clase_pool.__name__
+    return PoolMedido
+
+
+metricas_sync = MetricasPool("sync")
+metricas_async = MetricasPool("async")
+
+PoolSyncMedido = pool_medido(QueuePool, metricas_sync)
+PoolAsyncMedido = pool_medido(AsyncAdaptedQueuePool, metricas_async)
+
+
+def resumen_pools() -> dict:
+    return {
+        metricas.nombre: metricas.resumen()
+        for metricas in (metricas_sync, metricas_async)
+        if metricas.engine is not None
+    }
@@ -7,9 +7,43 @@ class Settings(BaseSettings):
     APP_NAME: str = "Risk Advisor API"
     APP_VERSION: str = "1.0.0"
     DEBUG: bool = True
+    # Log de peticiones: fracción muestreada (0-1); los errores y las
+    # peticiones lentas se registran siempre
+    LOG_PETICIONES_MUESTREO: float = 1.0
+    LOG_PETICIONES_LENTAS_MS: float = 1000
+    # Perfilador de SQL por petición: en todas (PERFIL_SQL) o en las que traen
+    # el header X-Perfil-SQL (PERFIL_SQL_HEADER). Las sentencias normalizadas
+    # que se repiten al menos UMBRAL_REPETIDAS veces se marcan como posible N+1
+    PERFIL_SQL: bool = False
+    PERFIL_SQL_HEADER: bool = False
+    PERFIL_SQL_HISTORIAL: int = 100
+    PERFIL_SQL_UMBRAL_REPETIDAS: int = 3
     
     # Configuración de la base de datos
     DATABASE_URL: str
+    # Modo asíncrono (SQLAlchemy async + asyncpg/aiosqlite)
+    DB_ASYNC: bool = False
+    ASYNC_DATABASE_URL: Optional[str] = None
+    # Pool de conexiones
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = -1
+    DB_POOL_PRE_PING: bool = False
+    DB_STATEMENT_TIMEOUT_MS: Optional[int] = None
+    # Particionado mensual de lecturas y alertas (solo PostgreSQL)
+    DB_PARTICIONADO: bool = False
+    PARTICIONES_MESES_FUTUROS: int = 3
+    PARTICIONES_INTERVALO_HORAS: int = 24
+    RETENCION_DIAS: Optional[int] = None
+    RETENCION_MODO: str = "detach"
+    # Archivo columnar de lecturas de viajes finalizados
+    ARCHIVO_DIRECTORIO: str = "archivo"
+    ARCHIVO_ANTIGUEDAD_HORAS: int = 24
+    ARCHIVO_AUTOMATICO: bool = False
+    ARCHIVO_INTERVALO_MINUTOS: int = 60
+    ARCHIVO_CACHE_VIAJES: int = 16
+    ARCHIVO_CACHE_BLOQUES: int = 64
     
     # Configuración de seguridad
     SECRET_KEY: str
@@ -24,6 +58,68 @@ class Settings(BaseSettings):
     UMBRAL_FRECUENCIA_CARDIACA_MAX: int = 120
     UMBRAL_CABECEOS: int = 3
     UMBRAL_BOSTEZOS: int = 5
+    # JSON con reglas de alertas propias (ver app/services/reglas.py); sin él
+    # se usan reglas equivalentes a los umbrales anteriores
+    REGLAS_ARCHIVO: Optional[str] = None
+    # Ajustes de umbrales por condición médica del conductor (la clave se busca
+    # dentro de condicion_medica) y durante su horario_riesgo "HH:MM-HH:MM"
+    PERFILES_CONDICION: dict[str, dict[str, float]] = {
+        "hipertension": {"UMBRAL_FRECUENCIA_CARDIACA_MAX": 140},
+        "taquicardia": {"UMBRAL_FRECUENCIA_CARDIACA_MAX": 140},
+        "bradicardia": {"UMBRAL_FRECUENCIA_CARDIACA_MIN": 40},
+        "apnea": {"UMBRAL_CABECEOS": 2, "UMBRAL_BOSTEZOS": 4},
+    }
+    PERFIL_HORARIO_RIESGO: dict[str, float] = {"UMBRAL_CABECEOS": 2, "UMBRAL_BOSTEZOS": 4}
+    # Zona horaria (IANA) en la que se interpreta horario_riesgo
+    ZONA_HORARIA: str = "UTC"
+    PERFILES_CACHE_VIAJES: int = 10000
+    
+    # Detección: "lectura" evalúa cada lectura por separado; "ventana" agrega
+    # reglas sobre ventanas deslizantes por viaje mantenidas en memoria
+    DETECCION_MODO: str = "lectura"
+    DETECCION_VENTANA_SEGUNDOS: int = 300
+    DETECCION_VENTANA_LECTURAS: int = 300
+    DETECCION_MIN_LECTURAS: int = 5
+    DETECCION_MAX_VIAJES: int = 2000
+    DETECCION_TTL_SEGUNDOS: int = 1800
+    UMBRAL_CABECEOS_VENTANA: int = 10
+    UMBRAL_BOSTEZOS_VENTANA: int = 15
+    UMBRAL_PERCLOS: float = 0.15
+    UMBRAL_PERCLOS_PENDIENTE: float = 0.01
+    
+    # Deduplicación de alertas repetidas por (viaje, tipo_alerta); 0 la desactiva
+    ALERTAS_COOLDOWN_SEGUNDOS: int = 60
+    ALERTAS_COOLDOWN_MAX_CLAVES: int = 10000
+    # Buffer en memoria de alertas recientes
+    RECIENTES_CAPACIDAD: int = 500
+    RECIENTES_SINCRONIZAR_SEGUNDOS: Optional[float] = None
+    # Stream SSE de alertas
+    SSE_COLA_MAX: int = 100
+    SSE_PING_SEGUNDOS: float = 15
+    SSE_RETRY_MS: int = 3000
+    
+    # Listados serializados con orjson desde filas, sin revalidar con Pydantic
+    JSON_RAPIDO: bool = True
+    
+    # Vista de flota (/viajes/flota): segundos en caché y ventana para el nivel de riesgo
+    FLOTA_CACHE_SEGUNDOS: float = 2
+    FLOTA_VENTANA_RIESGO_SEGUNDOS: int = 300
+    
+    # Ingesta de lecturas
+    MAX_LECTURAS_POR_LOTE: int = 500
+    # Ingesta diferida: POST /lecturas/ responde 202 y un escritor de fondo
+    # persiste las lecturas en lotes
+    INGESTA_DIFERIDA: bool = False
+    INGESTA_COLA_MAX: int = 10000
+    INGESTA_LOTE_MAX: int = 500
+    INGESTA_LOTE_INTERVALO_MS: int = 100
+    INGESTA_REINTENTOS: int = 3
+    INGESTA_RETRY_AFTER_SEGUNDOS: int = 1
+    
+    # Canal websocket de ingesta
+    WS_LOTE_MAX: int = 100
+    WS_LOTE_INTERVALO_MS: int = 200
+    WS_MAX_LECTURAS_PENDIENTES: int = 1000
     
     class Config:
         env_file = ".env"
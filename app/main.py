@@ -1,18 +1,98 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from fastapi.exceptions import RequestValidationError
 from sqlalchemy.exc import SQLAlchemyError
 
 from app.config.settings import settings
-from app.config.database import engine, Base
+from app.config.database import engine, async_engine, Base, ejecutar_con_sesion
+from app.config.metricas_pool import resumen_pools
+from app.config.metricas import exponer as exponer_metricas
 from app.middlewares.error_handler import (
     validation_exception_handler,
     sqlalchemy_exception_handler,
     general_exception_handler,
 )
 from app.middlewares.logging_middleware import LoggingMiddleware
+from app.middlewares.perfil_sql_middleware import PerfilSQLMiddleware
 
 from app.routes import conductores, viajes, lecturas, alertas
+from app.utils.particiones import mantener_periodicamente
+from app.utils.archivar import archivar_periodicamente
+from app.utils.perfil_sql import historial as historial_perfiles
+from app.services.recientes import alertas_recientes
+from app.services.ingesta import escritor_diferido
+from app.services.difusion import difusor_alertas
+import asyncio
+import logging
+import signal
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+async def sincronizar_recientes_periodicamente():
+    """Incorpora al buffer de alertas recientes las escritas por otros procesos"""
+    while True:
+        await asyncio.sleep(settings.RECIENTES_SINCRONIZAR_SEGUNDOS)
+        try:
+            await ejecutar_con_sesion(alertas_recientes.sincronizar)
+        except Exception as e:
+            logger.error(f"Error al sincronizar las alertas recientes: {str(e)}")
+
+
+def cerrar_streams_al_recibir_senales():
+    """
+    Cierra los streams SSE en cuanto llega SIGINT/SIGTERM. Uvicorn espera a que
+    terminen las conexiones abiertas antes del shutdown del lifespan, así que
+    cerrarlos solo ahí dejaría el apagado esperando a los clientes. Se encadena
+    al manejador del servidor; si no hay uno, la señal termina el proceso igual
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return
+    for senal in (signal.SIGINT, signal.SIGTERM):
+        previo = signal.getsignal(senal)
+        if not callable(previo):
+            continue
+        
+        def _manejar(numero, frame, previo=previo):
+            difusor_alertas.cerrar()
+            previo(numero, frame)
+        
+        signal.signal(senal, _manejar)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Tareas de fondo durante la vida de la aplicación"""
+    tareas = []
+    difusor_alertas.abrir()
+    cerrar_streams_al_recibir_senales()
+    try:
+        await ejecutar_con_sesion(alertas_recientes.sincronizar)
+    except Exception as e:
+        # Sin precarga /alertas/recientes sigue respondiendo desde la base
+        logger.error(f"No se pudo precargar las alertas recientes: {str(e)}")
+    if settings.RECIENTES_SINCRONIZAR_SEGUNDOS:
+        tareas.append(asyncio.create_task(sincronizar_recientes_periodicamente()))
+    if settings.DB_PARTICIONADO and engine.dialect.name == "postgresql":
+        tareas.append(asyncio.create_task(mantener_periodicamente()))
+    if settings.INGESTA_DIFERIDA:
+        escritor_diferido.iniciar()
+    if settings.ARCHIVO_AUTOMATICO:
+        tareas.append(asyncio.create_task(archivar_periodicamente()))
+    
+    yield
+    
+    difusor_alertas.cerrar()
+    for tarea in tareas:
+        tarea.cancel()
+    # Persistir las lecturas encoladas antes de cerrar las conexiones
+    await escritor_diferido.detener()
+    if async_engine is not None:
+        await async_engine.dispose()
+
 
 app = FastAPI(
     title=settings.APP_NAME,
@@ -21,6 +101,7 @@ app = FastAPI(
    el padilla se come los mocos
     """,
     debug=settings.DEBUG,
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -29,8 +110,17 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[
+        "X-Next-Cursor",
+        "X-Process-Time",
+        "X-SQL-Consultas",
+        "X-SQL-Tiempo-Ms",
+        "X-SQL-Repetidas",
+        "X-SQL-Perfil",
+    ],
 )
 
+app.add_middleware(PerfilSQLMiddleware)
 app.add_middleware(LoggingMiddleware)
 
 app.add_exception_handler(RequestValidationError, validation_exception_handler)
@@ -62,3 +152,43 @@ def health_check():
         "app": settings.APP_NAME,
         "version": settings.APP_VERSION,
     }
+
+
+@app.get("/health/pool", tags=["Health"])
+def estado_pool_conexiones():
+    """Métricas del pool de conexiones: conexiones en uso, overflow y tiempo de espera"""
+    return resumen_pools()
+
+
+@app.get("/health/ingesta", tags=["Health"])
+def estado_ingesta():
+    """Estado de la cola de ingesta diferida: pendientes, persistidas, descartadas y rechazadas"""
+    return escritor_diferido.resumen()
+
+
+@app.get("/metrics", tags=["Health"], response_class=PlainTextResponse)
+async def metricas():
+    """
+    Métricas en formato de texto de Prometheus: peticiones y latencia por ruta,
+    sentencias SQL, lecturas procesadas, alertas generadas por tipo y pools
+    """
+    return PlainTextResponse(exponer_metricas(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+# El historial solo se expone si el perfilador está activo
+if settings.PERFIL_SQL or settings.PERFIL_SQL_HEADER:
+    @app.get("/debug/sql", tags=["Debug"])
+    def listar_perfiles_sql():
+        """Resumen de los últimos perfiles de SQL por petición (ver PERFIL_SQL), del más reciente al más antiguo"""
+        return [perfil.resumen() for perfil in reversed(historial_perfiles)]
+    
+    @app.get("/debug/sql/{perfil_id}", tags=["Debug"])
+    def obtener_perfil_sql(perfil_id: int):
+        """Sentencias de un perfil de SQL con su duración y filas, y las repetidas (posible N+1)"""
+        for perfil in historial_perfiles:
+            if perfil.id == perfil_id:
+                return perfil.resumen(detalle=True)
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Perfil de SQL con ID {perfil_id} no encontrado"
+        )
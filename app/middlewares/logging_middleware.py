@@ -1,33 +1,94 @@
-from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
-import time
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from typing import Optional
+from app.config.settings import settings
+from app.config.metricas import registrar_peticion
 import logging
+import random
+import time
 
 logger = logging.getLogger(__name__)
 
 
-class LoggingMiddleware(BaseHTTPMiddleware):
-    """Middleware para registrar todas las peticiones HTTP"""
+class LoggingMiddleware:
+    """
+    Middleware ASGI que registra cada petición HTTP en un único registro
+    estructurado (campos en `extra`) y añade el header X-Process-Time.
+    Se registra una fracción LOG_PETICIONES_MUESTREO de las peticiones; los
+    errores (status >= 500 o excepción) y las peticiones que tardan más de
+    LOG_PETICIONES_LENTAS_MS en empezar a responder se registran siempre (se
+    mide hasta el inicio de la respuesta para que los streams largos no
+    cuenten como lentos). No envuelve el cuerpo de la respuesta, así que no
+    interfiere con las respuestas en streaming. También alimenta las métricas
+    HTTP de /metrics (todas las peticiones, sin muestreo)
+    """
     
-    async def dispatch(self, request: Request, call_next):
-        start_time = time.time()
-        
-        # Log de la petición
-        logger.info(f"Iniciando petición: {request.method} {request.url.path}")
+    def __init__(self, app: ASGIApp):
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
         
-        # Procesar la petición
-        response = await call_next(request)
+        inicio = time.perf_counter()
+        status_code = 500
+        respuesta = None
         
-        # Calcular tiempo de procesamiento
-        process_time = time.time() - start_time
+        async def enviar(message: Message):
+            nonlocal status_code, respuesta
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                # Tiempo hasta el inicio de la respuesta, como antes con call_next
+                respuesta = time.perf_counter() - inicio
+                message["headers"] = [
+                    *message.get("headers", ()),
+                    (b"x-process-time", str(respuesta).encode()),
+                ]
+            await send(message)
         
-        # Log de la respuesta
-        logger.info(
-            f"Petición completada: {request.method} {request.url.path} "
-            f"- Status: {response.status_code} - Tiempo: {process_time:.3f}s"
-        )
+        try:
+            await self.app(scope, receive, enviar)
+        except Exception:
+            self._registrar(scope, 500, time.perf_counter() - inicio, respuesta, error=True)
+            raise
+        self._registrar(scope, status_code, time.perf_counter() - inicio, respuesta)
+    
+    @staticmethod
+    def _registrar(
+        scope: Scope, status_code: int, duracion: float, respuesta: Optional[float], error: bool = False
+    ):
+        ruta = getattr(scope.get("route"), "path", None)
+        registrar_peticion(scope["method"], ruta or "sin_ruta", status_code, duracion)
         
-        # Añadir header con el tiempo de procesamiento
-        response.headers["X-Process-Time"] = str(process_time)
+        duracion_ms = duracion * 1000
+        respuesta_ms = respuesta * 1000 if respuesta is not None else duracion_ms
+        if error or status_code >= 500:
+            nivel = logging.ERROR
+        elif respuesta_ms >= settings.LOG_PETICIONES_LENTAS_MS:
+            nivel = logging.WARNING
+        elif random.random() < settings.LOG_PETICIONES_MUESTREO:
+            nivel = logging.INFO
+        else:
+            return
+        if not logger.isEnabledFor(nivel):
+            return
         
-        return response
+        logger.log(
+            nivel,
+            "%s %s %d %.1fms",
+            scope["method"],
+            scope["path"],
+            status_code,
+            duracion_ms,
+            exc_info=error,
+            extra={
+                "metodo": scope["method"],
+                "path": scope["path"],
+                # Plantilla de la ruta (/viajes/{viaje_id}) para agrupar
+                "ruta": ruta,
+                "status": status_code,
+                "duracion_ms": round(duracion_ms, 3),
+                "respuesta_ms": round(respuesta_ms, 3),
+                "cliente": scope["client"][0] if scope.get("client") else None,
+            },
+        )
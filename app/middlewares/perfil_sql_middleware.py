@@ -0,0 +1,51 @@
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.config.settings import settings
+from app.utils.perfil_sql import PerfilSQL, historial, perfilar
+
+HEADER_ACTIVAR = b"x-perfil-sql"
+
+
+class PerfilSQLMiddleware:
+    """
+    Perfila las sentencias SQL de la petición cuando PERFIL_SQL está activo o,
+    con PERFIL_SQL_HEADER, cuando la petición trae el header X-Perfil-SQL.
+    Añade a la respuesta un resumen en headers (X-SQL-Consultas,
+    X-SQL-Tiempo-Ms, X-SQL-Repetidas y X-SQL-Perfil, el id para consultar el
+    detalle en /debug/sql/{id}) y guarda el perfil en el historial
+    """
+    
+    def __init__(self, app: ASGIApp):
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not self._activo(scope):
+            await self.app(scope, receive, send)
+            return
+        
+        perfil = PerfilSQL(scope["method"], scope["path"])
+        
+        async def enviar(message: Message):
+            if message["type"] == "http.response.start":
+                # Las respuestas en streaming solo incluyen las sentencias previas a los headers
+                message["headers"] = [
+                    *message.get("headers", ()),
+                    (b"x-sql-consultas", str(perfil.total).encode()),
+                    (b"x-sql-tiempo-ms", f"{perfil.duracion_ms:.3f}".encode()),
+                    (b"x-sql-repetidas", str(len(perfil.repetidas())).encode()),
+                    (b"x-sql-perfil", str(perfil.id).encode()),
+                ]
+            await send(message)
+        
+        with perfilar(perfil):
+            try:
+                await self.app(scope, receive, enviar)
+            finally:
+                historial.append(perfil)
+    
+    @staticmethod
+    def _activo(scope: Scope) -> bool:
+        if settings.PERFIL_SQL:
+            return True
+        if not settings.PERFIL_SQL_HEADER:
+            return False
+        return any(nombre == HEADER_ACTIVAR for nombre, _ in scope["headers"])
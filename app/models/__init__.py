@@ -1,3 +1,3 @@
-from app.models.models import Conductor, Viaje, LecturaSensor, Alerta
+from app.models.models import Conductor, Viaje, LecturaSensor, Alerta, AgregadoViaje, ArchivoViaje
 
-__all__ = ["Conductor", "Viaje", "LecturaSensor", "Alerta"]
+__all__ = ["Conductor", "Viaje", "LecturaSensor", "Alerta", "AgregadoViaje", "ArchivoViaje"]
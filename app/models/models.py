@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Float
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, ForeignKey, DateTime, Float, Index, JSON
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.config.database import Base
@@ -11,6 +11,8 @@ class Conductor(Base):
     nombre = Column(String, nullable=False)
     condicion_medica = Column(String, nullable=True)
     horario_riesgo = Column(String, nullable=True)
+    # Umbrales propios que reemplazan a los globales y a los de su perfil
+    umbrales = Column(JSON, nullable=True)
     activo = Column(Boolean, default=True)
     
     # Relaciones
@@ -27,8 +29,22 @@ class Viaje(Base):
     
     # Relaciones
     conductor = relationship("Conductor", back_populates="viajes")
-    lecturas = relationship("LecturaSensor", back_populates="viaje")
-    alertas = relationship("Alerta", back_populates="viaje")
+    # Pueden tener miles de filas: nunca se cargan de forma implícita,
+    # se consultan con límite desde los servicios
+    lecturas = relationship("LecturaSensor", back_populates="viaje", lazy="raise_on_sql")
+    alertas = relationship("Alerta", back_populates="viaje", lazy="raise_on_sql")
+    
+    __table_args__ = (
+        # Listado de viajes por conductor, del más reciente al más antiguo
+        Index("ix_viajes_conductor_fecha_inicio", "id_conductor", "fecha_inicio"),
+        # Viaje activo de un conductor (fecha_fin IS NULL)
+        Index(
+            "ix_viajes_conductor_activo",
+            "id_conductor",
+            postgresql_where=fecha_fin.is_(None),
+            sqlite_where=fecha_fin.is_(None),
+        ),
+    )
 
 
 class LecturaSensor(Base):
@@ -44,6 +60,10 @@ class LecturaSensor(Base):
     
     # Relaciones
     viaje = relationship("Viaje", back_populates="lecturas")
+    
+    __table_args__ = (
+        Index("ix_lecturas_sensores_viaje_timestamp", "id_viaje", "timestamp"),
+    )
 
 
 class Alerta(Base):
@@ -54,6 +74,43 @@ class Alerta(Base):
     timestamp = Column(DateTime, default=datetime.utcnow)
     tipo_alerta = Column(String, nullable=False)
     nivel_somnolencia = Column(String, nullable=True)
+    # Repeticiones absorbidas durante el cooldown de (viaje, tipo_alerta)
+    ocurrencias = Column(Integer, nullable=False, default=1, server_default="1")
+    ultima_ocurrencia = Column(DateTime, nullable=True)
     
     # Relaciones
     viaje = relationship("Viaje", back_populates="alertas")
+    
+    __table_args__ = (
+        Index("ix_alertas_viaje_timestamp", "id_viaje", "timestamp"),
+        # Alertas recientes de todo el sistema
+        Index("ix_alertas_timestamp", "timestamp"),
+    )
+
+
+class AgregadoViaje(Base):
+    """Totales por viaje, actualizados en la misma transacción que cada lectura/alerta"""
+    __tablename__ = "agregados_viajes"
+    
+    id_viaje = Column(Integer, ForeignKey("viajes.id_viaje"), primary_key=True)
+    total_lecturas = Column(Integer, nullable=False, default=0)
+    lecturas_con_fc = Column(Integer, nullable=False, default=0)
+    suma_fc = Column(BigInteger, nullable=False, default=0)
+    total_cabeceos = Column(Integer, nullable=False, default=0)
+    total_bostezos = Column(Integer, nullable=False, default=0)
+    total_alertas = Column(Integer, nullable=False, default=0)
+    primera_lectura = Column(DateTime, nullable=True)
+    ultima_lectura = Column(DateTime, nullable=True)
+    id_ultima_lectura = Column(Integer, nullable=True)
+    ultima_alerta = Column(DateTime, nullable=True)
+
+
+class ArchivoViaje(Base):
+    """Registro de un viaje cuyas lecturas se movieron al archivo columnar"""
+    __tablename__ = "archivos_viajes"
+    
+    id_viaje = Column(Integer, ForeignKey("viajes.id_viaje"), primary_key=True)
+    ruta = Column(String(255), nullable=False)
+    total_lecturas = Column(Integer, nullable=False)
+    bytes_archivo = Column(BigInteger, nullable=False)
+    fecha_archivo = Column(DateTime, default=datetime.utcnow)
@@ -1,36 +1,137 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
-from app.config.database import get_db
-from app.services.services import AlertaService
+from app.config.database import SesionBD, get_session, ejecutar, ejecutar_con_sesion
+from app.config.settings import settings
+from app.services.services import AlertaService, ViajeService
+from app.services.recientes import alertas_recientes
+from app.services.difusion import difusor_alertas, evento_sse, parsear_ultimo_id
 from app.schemas.schemas import AlertaCreate, AlertaResponse
+from app.utils.paginacion import agregar_cursor
+from app.utils.respuestas import RespuestaJSONRapida, como_dicts
+import asyncio
 
 router = APIRouter(prefix="/alertas", tags=["Alertas"])
 
 
 @router.get("/", response_model=List[AlertaResponse])
-def listar_alertas(
+async def listar_alertas(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     viaje_id: Optional[int] = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    db: SesionBD = Depends(get_session)
 ):
-    """Listar todas las alertas del sistema"""
-    alertas = AlertaService.get_all(db, viaje_id=viaje_id, skip=skip, limit=limit)
+    """
+    Listar todas las alertas del sistema
+    Si hay más páginas, el header X-Next-Cursor trae el `cursor` de la siguiente
+    """
+    try:
+        alertas = await ejecutar(
+            db, AlertaService.get_all,
+            viaje_id=viaje_id, skip=skip, limit=limit, cursor=cursor, filas=settings.JSON_RAPIDO
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    if settings.JSON_RAPIDO:
+        response = RespuestaJSONRapida(alertas)
+        agregar_cursor(response, alertas, limit, "timestamp", "id_alerta")
+        return response
+    agregar_cursor(response, alertas, limit, "timestamp", "id_alerta")
     return alertas
 
 
 @router.get("/recientes", response_model=List[AlertaResponse])
-def listar_alertas_recientes(limit: int = 10, db: Session = Depends(get_db)):
-    """Obtener las alertas más recientes del sistema"""
-    alertas = AlertaService.get_alertas_recientes(db, limit=limit)
-    return alertas
+async def listar_alertas_recientes(
+    limit: int = Query(10, ge=1, le=1000),
+    since_id: Optional[int] = None,
+):
+    """
+    Obtener las alertas más recientes del sistema
+    Con `since_id` solo se devuelven las alertas con id mayor (para consultas periódicas).
+    Se sirven desde memoria sin consultar la base mientras `limit` no supere RECIENTES_CAPACIDAD
+    """
+    if alertas_recientes.cubre(limit):
+        alertas = alertas_recientes.listar(limit, since_id)
+        # El buffer ya guarda dicts de AlertaResponse
+        return RespuestaJSONRapida(alertas) if settings.JSON_RAPIDO else alertas
+    # Sin sesión por request: solo se abre una si hay que ir a la base
+    alertas = await ejecutar_con_sesion(AlertaService.get_alertas_recientes, limit=limit, since_id=since_id)
+    return RespuestaJSONRapida(como_dicts(alertas, AlertaResponse)) if settings.JSON_RAPIDO else alertas
+
+
+@router.get("/stream")
+async def stream_alertas(
+    request: Request,
+    viaje_id: Optional[int] = None,
+    conductor_id: Optional[int] = None,
+    last_event_id: Optional[str] = Header(None),
+):
+    """
+    Stream Server-Sent Events con cada alerta en cuanto se crea, opcionalmente
+    filtrado por viaje o conductor. El id de cada evento es el id_alerta: al
+    reconectar con el header Last-Event-ID se reenvían las alertas posteriores
+    que sigan en el buffer de recientes. Los consumidores que no siguen el ritmo
+    se desconectan, y todos los streams terminan al apagar el servidor
+    """
+    viajes_del_conductor = {}
+    
+    async def pertenece(alerta: dict) -> bool:
+        if viaje_id is not None and alerta["id_viaje"] != viaje_id:
+            return False
+        if conductor_id is None:
+            return True
+        id_viaje = alerta["id_viaje"]
+        if id_viaje not in viajes_del_conductor:
+            viaje = await ejecutar_con_sesion(ViajeService.get_by_id, id_viaje)
+            viajes_del_conductor[id_viaje] = viaje is not None and viaje.id_conductor == conductor_id
+        return viajes_del_conductor[id_viaje]
+    
+    async def eventos():
+        ultimo_id = parsear_ultimo_id(last_event_id)
+        suscriptor = difusor_alertas.suscribir()
+        try:
+            yield f"retry: {settings.SSE_RETRY_MS}\n\n"
+            if ultimo_id is not None:
+                pendientes = alertas_recientes.listar(settings.RECIENTES_CAPACIDAD, ultimo_id)
+                for alerta in reversed(pendientes):
+                    if await pertenece(alerta):
+                        yield evento_sse(alerta)
+                    ultimo_id = alerta["id_alerta"]
+            
+            while True:
+                try:
+                    alerta = await asyncio.wait_for(suscriptor.cola.get(), settings.SSE_PING_SEGUNDOS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": ping\n\n"
+                    continue
+                if alerta is None:
+                    return
+                # Ya enviada durante la reanudación
+                if ultimo_id is not None and alerta["id_alerta"] <= ultimo_id:
+                    continue
+                if await pertenece(alerta):
+                    yield evento_sse(alerta)
+        finally:
+            difusor_alertas.desuscribir(suscriptor)
+    
+    return StreamingResponse(
+        eventos(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.get("/{alerta_id}", response_model=AlertaResponse)
-def obtener_alerta(alerta_id: int, db: Session = Depends(get_db)):
+async def obtener_alerta(alerta_id: int, db: SesionBD = Depends(get_session)):
     """Obtener información de una alerta específica"""
-    alerta = AlertaService.get_by_id(db, alerta_id)
+    alerta = await ejecutar(db, AlertaService.get_by_id, alerta_id)
     if not alerta:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -40,6 +141,6 @@ def obtener_alerta(alerta_id: int, db: Session = Depends(get_db)):
 
 
 @router.post("/", response_model=AlertaResponse, status_code=status.HTTP_201_CREATED)
-def crear_alerta_manual(alerta: AlertaCreate, db: Session = Depends(get_db)):
+async def crear_alerta_manual(alerta: AlertaCreate, db: SesionBD = Depends(get_session)):
     """Crear una alerta manualmente (normalmente se generan automáticamente)"""
-    return AlertaService.create(db, alerta)
+    return await ejecutar(db, AlertaService.create, alerta)
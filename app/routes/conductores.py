@@ -1,29 +1,43 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from typing import List, Optional
-from app.config.database import get_db
+from app.config.database import SesionBD, get_session, ejecutar
 from app.services.services import ConductorService
 from app.schemas.schemas import ConductorCreate, ConductorUpdate, ConductorResponse
+from app.utils.paginacion import agregar_cursor
 
 router = APIRouter(prefix="/conductores", tags=["Conductores"])
 
 
 @router.get("/", response_model=List[ConductorResponse])
-def listar_conductores(
+async def listar_conductores(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     activo: Optional[bool] = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    db: SesionBD = Depends(get_session)
 ):
-    """Listar todos los conductores registrados"""
-    conductores = ConductorService.get_all(db, skip=skip, limit=limit, activo=activo)
+    """
+    Listar todos los conductores registrados
+    Si hay más páginas, el header X-Next-Cursor trae el `cursor` de la siguiente
+    """
+    try:
+        conductores = await ejecutar(
+            db, ConductorService.get_all, skip=skip, limit=limit, activo=activo, cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    agregar_cursor(response, conductores, limit, "id_conductor")
     return conductores
 
 
 @router.get("/{conductor_id}", response_model=ConductorResponse)
-def obtener_conductor(conductor_id: int, db: Session = Depends(get_db)):
+async def obtener_conductor(conductor_id: int, db: SesionBD = Depends(get_session)):
     """Obtener información de un conductor específico"""
-    conductor = ConductorService.get_by_id(db, conductor_id)
+    conductor = await ejecutar(db, ConductorService.get_by_id, conductor_id)
     if not conductor:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -33,19 +47,19 @@ def obtener_conductor(conductor_id: int, db: Session = Depends(get_db)):
 
 
 @router.post("/", response_model=ConductorResponse, status_code=status.HTTP_201_CREATED)
-def crear_conductor(conductor: ConductorCreate, db: Session = Depends(get_db)):
+async def crear_conductor(conductor: ConductorCreate, db: SesionBD = Depends(get_session)):
     """Registrar un nuevo conductor en el sistema"""
-    return ConductorService.create(db, conductor)
+    return await ejecutar(db, ConductorService.create, conductor)
 
 
 @router.put("/{conductor_id}", response_model=ConductorResponse)
-def actualizar_conductor(
+async def actualizar_conductor(
     conductor_id: int,
     conductor_update: ConductorUpdate,
-    db: Session = Depends(get_db)
+    db: SesionBD = Depends(get_session)
 ):
     """Actualizar información de un conductor"""
-    conductor = ConductorService.update(db, conductor_id, conductor_update)
+    conductor = await ejecutar(db, ConductorService.update, conductor_id, conductor_update)
     if not conductor:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -55,9 +69,9 @@ def actualizar_conductor(
 
 
 @router.delete("/{conductor_id}", status_code=status.HTTP_204_NO_CONTENT)
-def eliminar_conductor(conductor_id: int, db: Session = Depends(get_db)):
+async def eliminar_conductor(conductor_id: int, db: SesionBD = Depends(get_session)):
     """Eliminar un conductor del sistema"""
-    conductor = ConductorService.delete(db, conductor_id)
+    conductor = await ejecutar(db, ConductorService.delete, conductor_id)
     if not conductor:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
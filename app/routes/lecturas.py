@@ -1,30 +1,100 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
-from app.config.database import get_db
-from app.services.services import LecturaSensorService
-from app.services.alerta_detector import AlertaAutoDetector
-from app.schemas.schemas import LecturaSensorCreate, LecturaSensorResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import JSONResponse
+from pydantic import ValidationError
+from typing import List, Optional
+from datetime import datetime
+import asyncio
+import logging
+import orjson
+from app.config.database import SesionBD, get_session, ejecutar, ejecutar_con_sesion
+from app.config.settings import settings
+from app.services.services import LecturaSensorService, ViajeService
+from app.services.micro_lotes import recolectar_lote
+from app.services.ingesta import escritor_diferido
+from app.utils.paginacion import agregar_cursor
+from app.utils.respuestas import RespuestaJSONRapida
+from app.utils.series import parsear_intervalo
+from app.schemas.schemas import (
+    AlertaResponse,
+    LecturaEncoladaResponse,
+    LecturaSensorCreate,
+    LecturaSensorResponse,
+    LoteLecturasResponse,
+    SerieLecturasResponse,
+)
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/lecturas", tags=["Lecturas de Sensores"])
 
 
 @router.get("/viaje/{viaje_id}", response_model=List[LecturaSensorResponse])
-def listar_lecturas_viaje(
+async def listar_lecturas_viaje(
     viaje_id: int,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    db: SesionBD = Depends(get_session)
 ):
-    """Listar todas las lecturas de sensores de un viaje"""
-    lecturas = LecturaSensorService.get_all(db, viaje_id, skip=skip, limit=limit)
+    """
+    Listar todas las lecturas de sensores de un viaje
+    Si hay más páginas, el header X-Next-Cursor trae el `cursor` de la siguiente
+    """
+    try:
+        lecturas = await ejecutar(
+            db, LecturaSensorService.get_all, viaje_id,
+            skip=skip, limit=limit, cursor=cursor, filas=settings.JSON_RAPIDO
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    if settings.JSON_RAPIDO:
+        response = RespuestaJSONRapida(lecturas)
+        agregar_cursor(response, lecturas, limit, "timestamp", "id_lectura")
+        return response
+    agregar_cursor(response, lecturas, limit, "timestamp", "id_lectura")
     return lecturas
 
 
+@router.get("/viaje/{viaje_id}/serie", response_model=SerieLecturasResponse)
+async def obtener_serie_viaje(
+    viaje_id: int,
+    intervalo: Optional[str] = Query(None, description="Tamaño del intervalo: 10s, 1m, 5m, 1h..."),
+    max_puntos: Optional[int] = Query(None, ge=3, le=10000),
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    db: SesionBD = Depends(get_session)
+):
+    """
+    Serie de lecturas de un viaje agregada por intervalos de tiempo, para graficar
+    Cada punto trae FC promedio/mín/máx, PERCLOS promedio y la suma de cabeceos
+    y bostezos. Con `max_puntos` la serie nunca supera esa cantidad de puntos
+    """
+    try:
+        intervalo_segundos = parsear_intervalo(intervalo) if intervalo else None
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    return await ejecutar(
+        db,
+        LecturaSensorService.get_serie,
+        viaje_id,
+        intervalo_segundos=intervalo_segundos,
+        max_puntos=max_puntos,
+        desde=desde,
+        hasta=hasta,
+    )
+
+
 @router.get("/{lectura_id}", response_model=LecturaSensorResponse)
-def obtener_lectura(lectura_id: int, db: Session = Depends(get_db)):
+async def obtener_lectura(lectura_id: int, db: SesionBD = Depends(get_session)):
     """Obtener información de una lectura específica"""
-    lectura = LecturaSensorService.get_by_id(db, lectura_id)
+    lectura = await ejecutar(db, LecturaSensorService.get_by_id, lectura_id)
     if not lectura:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -33,16 +103,151 @@ def obtener_lectura(lectura_id: int, db: Session = Depends(get_db)):
     return lectura
 
 
-@router.post("/", response_model=LecturaSensorResponse, status_code=status.HTTP_201_CREATED)
-def crear_lectura(lectura: LecturaSensorCreate, db: Session = Depends(get_db)):
+@router.post(
+    "/",
+    response_model=LecturaSensorResponse,
+    status_code=status.HTTP_201_CREATED,
+    responses={
+        status.HTTP_202_ACCEPTED: {"model": LecturaEncoladaResponse},
+        status.HTTP_503_SERVICE_UNAVAILABLE: {"description": "Cola de ingesta llena (ver Retry-After)"},
+    },
+)
+async def crear_lectura(lectura: LecturaSensorCreate, db: SesionBD = Depends(get_session)):
     """
     Registrar una nueva lectura de sensores
-    El sistema automáticamente analizará la lectura y generará alertas si es necesario
+    El sistema automáticamente analizará la lectura y generará alertas si es necesario.
+    Con INGESTA_DIFERIDA la lectura se encola y se responde 202 sin esperar a la base
+    """
+    if settings.INGESTA_DIFERIDA:
+        if not escritor_diferido.encolar([lectura]):
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="La cola de ingesta está llena",
+                headers={"Retry-After": str(settings.INGESTA_RETRY_AFTER_SEGUNDOS)},
+            )
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content={"estado": "encolada", "pendientes": escritor_diferido.pendientes},
+        )
+    
+    # Crear la lectura y sus alertas en una sola transacción
+    return await ejecutar(db, LecturaSensorService.create, lectura)
+
+
+@router.post("/batch", response_model=LoteLecturasResponse, status_code=status.HTTP_201_CREATED)
+async def crear_lecturas_lote(lecturas: List[LecturaSensorCreate], db: SesionBD = Depends(get_session)):
     """
-    # Crear la lectura
-    db_lectura = LecturaSensorService.create(db, lectura)
+    Registrar un lote de lecturas de sensores (pueden pertenecer a varios viajes)
+    Las lecturas y sus alertas se guardan en una sola transacción
+    """
+    if not lecturas:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El lote debe contener al menos una lectura"
+        )
+    if len(lecturas) > settings.MAX_LECTURAS_POR_LOTE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"El lote no puede superar {settings.MAX_LECTURAS_POR_LOTE} lecturas"
+        )
     
-    # Analizar automáticamente y generar alertas si es necesario
-    AlertaAutoDetector.analizar_lectura(db, db_lectura)
+    resultado = await ejecutar(db, LecturaSensorService.create_batch, lecturas)
+    
+    return {
+        "total_lecturas": len(resultado),
+        "total_alertas": sum(len(alertas) for _, alertas in resultado),
+        "lecturas": [
+            {**lectura._mapping, "alertas": [dict(alerta._mapping) for alerta in alertas]}
+            for lectura, alertas in resultado
+        ],
+    }
+
+
+@router.websocket("/ws/{viaje_id}")
+async def stream_lecturas_viaje(websocket: WebSocket, viaje_id: int):
+    """
+    Canal persistente de ingesta para un viaje activo
+    El dispositivo envía lecturas como JSON y recibe por el mismo socket la
+    confirmación de cada lote persistido y las alertas generadas
+    """
+    viaje = await ejecutar_con_sesion(ViajeService.get_by_id, viaje_id)
+    if not viaje or viaje.fecha_fin is not None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
     
-    return db_lectura
+    await websocket.accept()
+    
+    # Cola acotada: si la base de datos se atrasa, dejamos de leer del socket
+    # y el control de flujo de TCP frena al dispositivo
+    cola = asyncio.Queue(maxsize=settings.WS_MAX_LECTURAS_PENDIENTES)
+    escritor = asyncio.create_task(_escribir_lotes_ws(websocket, cola))
+    
+    try:
+        while not escritor.done():
+            texto = await websocket.receive_text()
+            try:
+                lectura = LecturaSensorCreate.model_validate({**orjson.loads(texto), "id_viaje": viaje_id})
+            except (ValidationError, orjson.JSONDecodeError, TypeError) as e:
+                await websocket.send_json({"tipo": "error", "detalle": str(e)})
+                continue
+            await cola.put(lectura)
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        if not escritor.done():
+            await cola.put(None)
+        await escritor
+
+
+async def _escribir_lotes_ws(websocket: WebSocket, cola: asyncio.Queue):
+    """Persiste en micro-lotes las lecturas recibidas por el websocket"""
+    conectado = True
+    while True:
+        lote = await recolectar_lote(
+            cola, settings.WS_LOTE_MAX, settings.WS_LOTE_INTERVALO_MS / 1000
+        )
+        lecturas = [lectura for lectura in lote if lectura is not None]
+        
+        if lecturas:
+            try:
+                resultado = await ejecutar_con_sesion(LecturaSensorService.create_batch, lecturas)
+                if conectado:
+                    conectado = await _notificar_lote_ws(websocket, resultado)
+            except Exception as e:
+                logger.error(f"Error al persistir lecturas de la ingesta websocket: {str(e)}")
+                if conectado:
+                    await _cerrar_con_error_ws(websocket)
+                # Descartar lo pendiente para no bloquear al receptor
+                while lote[-1] is not None:
+                    lote = [await cola.get()]
+                return
+        
+        if lote[-1] is None:
+            return
+
+
+async def _cerrar_con_error_ws(websocket: WebSocket):
+    """Avisa al dispositivo que el lote no se pudo procesar y cierra el socket"""
+    try:
+        await websocket.send_json({"tipo": "error", "detalle": "No se pudieron procesar las lecturas"})
+        await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+
+
+async def _notificar_lote_ws(websocket: WebSocket, resultado: list) -> bool:
+    """Envía al dispositivo el acuse del lote y sus alertas. Retorna False si el socket se cerró"""
+    try:
+        await websocket.send_json({
+            "tipo": "lote",
+            "ids": [lectura.id_lectura for lectura, _ in resultado],
+        })
+        for _, alertas in resultado:
+            for alerta in alertas:
+                await websocket.send_json({
+                    "tipo": "alerta",
+                    "alerta": AlertaResponse.model_validate(alerta).model_dump(mode="json"),
+                })
+    except (WebSocketDisconnect, RuntimeError):
+        return False
+    return True
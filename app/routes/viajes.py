@@ -1,48 +1,107 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime
-from app.config.database import get_db
+from app.config.database import SesionBD, get_session, ejecutar
+from app.config.settings import settings
 from app.services.services import ViajeService
+from app.services.flota import vista_flota
 from app.schemas.schemas import (
     ViajeCreate,
     ViajeResponse,
     ViajeDetalladoResponse,
     EstadisticasViajeResponse,
     ViajeFinalize,
+    FlotaResponse,
 )
+from app.utils.paginacion import agregar_cursor
+from app.utils.respuestas import RespuestaJSONRapida
 
 router = APIRouter(prefix="/viajes", tags=["Viajes"])
 
 
 @router.get("/", response_model=List[ViajeResponse])
-def listar_viajes(
+async def listar_viajes(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     conductor_id: Optional[int] = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    db: SesionBD = Depends(get_session)
 ):
-    """Listar todos los viajes registrados"""
-    viajes = ViajeService.get_all(db, skip=skip, limit=limit, conductor_id=conductor_id)
+    """
+    Listar todos los viajes registrados
+    Si hay más páginas, el header X-Next-Cursor trae el `cursor` de la siguiente
+    """
+    try:
+        viajes = await ejecutar(
+            db, ViajeService.get_all, skip=skip, limit=limit, conductor_id=conductor_id, cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    agregar_cursor(response, viajes, limit, "fecha_inicio", "id_viaje")
     return viajes
 
 
+@router.get("/flota", response_model=FlotaResponse)
+async def obtener_flota():
+    """
+    Vista de todos los viajes activos: conductor, última lectura, nivel de
+    riesgo actual y conteo de alertas por nivel. Se sirve desde memoria y se
+    recalcula como mucho cada FLOTA_CACHE_SEGUNDOS o al iniciar/finalizar un viaje
+    """
+    # Sin sesión por request: solo se abre una si hay que recalcular
+    vista = await vista_flota.obtener()
+    # La vista ya está validada contra FlotaResponse
+    return RespuestaJSONRapida(vista) if settings.JSON_RAPIDO else vista
+
+
+def _detalle_viaje(db: Session, viaje_id: int, limite_lecturas, limite_alertas):
+    # Se valida dentro de la sesión para que nada se cargue durante la serialización
+    detalle = ViajeService.get_detalle(db, viaje_id, limite_lecturas, limite_alertas)
+    return ViajeDetalladoResponse.model_validate(detalle) if detalle else None
+
+
 @router.get("/{viaje_id}", response_model=ViajeDetalladoResponse)
-def obtener_viaje(viaje_id: int, db: Session = Depends(get_db)):
-    """Obtener información detallada de un viaje específico"""
-    viaje = ViajeService.get_by_id(db, viaje_id)
+async def obtener_viaje(
+    viaje_id: int,
+    request: Request,
+    limite_lecturas: int = Query(100, ge=0, le=1000),
+    limite_alertas: int = Query(100, ge=0, le=1000),
+    completo: bool = False,
+    db: SesionBD = Depends(get_session)
+):
+    """
+    Obtener información detallada de un viaje específico
+    Incluye las lecturas y alertas más recientes (hasta los límites indicados),
+    sus totales y las URLs paginadas del historial. Con `completo=true`
+    se incluye el historial completo
+    """
+    viaje = await ejecutar(
+        db,
+        _detalle_viaje,
+        viaje_id,
+        None if completo else limite_lecturas,
+        None if completo else limite_alertas,
+    )
     if not viaje:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Viaje con ID {viaje_id} no encontrado"
         )
+    
+    viaje.lecturas_url = str(request.app.url_path_for("listar_lecturas_viaje", viaje_id=viaje_id))
+    viaje.alertas_url = f"{request.app.url_path_for('listar_alertas')}?viaje_id={viaje_id}"
     return viaje
 
 
 @router.get("/{viaje_id}/estadisticas", response_model=EstadisticasViajeResponse)
-def obtener_estadisticas_viaje(viaje_id: int, db: Session = Depends(get_db)):
+async def obtener_estadisticas_viaje(viaje_id: int, db: SesionBD = Depends(get_session)):
     """Obtener estadísticas de un viaje"""
-    estadisticas = ViajeService.get_estadisticas(db, viaje_id)
+    estadisticas = await ejecutar(db, ViajeService.get_estadisticas, viaje_id)
     if not estadisticas:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -52,17 +111,17 @@ def obtener_estadisticas_viaje(viaje_id: int, db: Session = Depends(get_db)):
 
 
 @router.get("/conductor/{conductor_id}/activo", response_model=Optional[ViajeResponse])
-def obtener_viaje_activo(conductor_id: int, db: Session = Depends(get_db)):
+async def obtener_viaje_activo(conductor_id: int, db: SesionBD = Depends(get_session)):
     """Obtener el viaje activo de un conductor"""
-    viaje = ViajeService.get_active_by_conductor(db, conductor_id)
+    viaje = await ejecutar(db, ViajeService.get_active_by_conductor, conductor_id)
     return viaje
 
 
 @router.post("/", response_model=ViajeResponse, status_code=status.HTTP_201_CREATED)
-def iniciar_viaje(viaje: ViajeCreate, db: Session = Depends(get_db)):
+async def iniciar_viaje(viaje: ViajeCreate, db: SesionBD = Depends(get_session)):
     """Iniciar un nuevo viaje"""
     try:
-        return ViajeService.create(db, viaje)
+        return await ejecutar(db, ViajeService.create, viaje)
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -71,13 +130,13 @@ def iniciar_viaje(viaje: ViajeCreate, db: Session = Depends(get_db)):
 
 
 @router.put("/{viaje_id}/finalizar", response_model=ViajeResponse)
-def finalizar_viaje(
+async def finalizar_viaje(
     viaje_id: int,
     viaje_fin: ViajeFinalize,
-    db: Session = Depends(get_db)
+    db: SesionBD = Depends(get_session)
 ):
     """Finalizar un viaje en curso"""
-    viaje = ViajeService.finalize(db, viaje_id, viaje_fin.fecha_fin)
+    viaje = await ejecutar(db, ViajeService.finalize, viaje_id, viaje_fin.fecha_fin)
     if not viaje:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
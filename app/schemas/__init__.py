@@ -14,6 +14,13 @@ from app.schemas.schemas import (
     AlertaBase,
     AlertaCreate,
     AlertaResponse,
+    LecturaLoteResponse,
+    LecturaEncoladaResponse,
+    LoteLecturasResponse,
+    PuntoSerieResponse,
+    SerieLecturasResponse,
+    ViajeFlotaResponse,
+    FlotaResponse,
     EstadisticasViajeResponse,
 )
 
@@ -33,5 +40,12 @@ __all__ = [
     "AlertaBase",
     "AlertaCreate",
     "AlertaResponse",
+    "LecturaLoteResponse",
+    "LecturaEncoladaResponse",
+    "LoteLecturasResponse",
+    "PuntoSerieResponse",
+    "SerieLecturasResponse",
+    "ViajeFlotaResponse",
+    "FlotaResponse",
     "EstadisticasViajeResponse",
 ]
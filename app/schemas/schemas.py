@@ -1,13 +1,22 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Literal, Optional
 from datetime import datetime
 
+# Umbrales que un conductor puede ajustar en su perfil
+UmbralPerfil = Literal[
+    "UMBRAL_FRECUENCIA_CARDIACA_MIN",
+    "UMBRAL_FRECUENCIA_CARDIACA_MAX",
+    "UMBRAL_CABECEOS",
+    "UMBRAL_BOSTEZOS",
+]
+
 
 # Schemas para Conductor
 class ConductorBase(BaseModel):
     nombre: str = Field(..., min_length=1, max_length=255)
     condicion_medica: Optional[str] = None
     horario_riesgo: Optional[str] = None
+    umbrales: Optional[dict[UmbralPerfil, float]] = None
     activo: bool = True
 
 
@@ -19,6 +28,7 @@ class ConductorUpdate(BaseModel):
     nombre: Optional[str] = Field(None, min_length=1, max_length=255)
     condicion_medica: Optional[str] = None
     horario_riesgo: Optional[str] = None
+    umbrales: Optional[dict[UmbralPerfil, float]] = None
     activo: Optional[bool] = None
 
 
@@ -86,6 +96,8 @@ class AlertaCreate(AlertaBase):
 class AlertaResponse(AlertaBase):
     id_alerta: int
     timestamp: datetime
+    ocurrencias: int = 1
+    ultima_ocurrencia: Optional[datetime] = None
     
     class Config:
         from_attributes = True
@@ -94,13 +106,72 @@ class AlertaResponse(AlertaBase):
 # Schemas adicionales para respuestas complejas
 class ViajeDetalladoResponse(ViajeResponse):
     conductor: ConductorResponse
+    # Ventana con las lecturas/alertas más recientes; el historial completo
+    # está en las URLs paginadas
     lecturas: list[LecturaSensorResponse] = []
     alertas: list[AlertaResponse] = []
+    total_lecturas: int = 0
+    total_alertas: int = 0
+    lecturas_url: Optional[str] = None
+    alertas_url: Optional[str] = None
     
     class Config:
         from_attributes = True
 
 
+class LecturaLoteResponse(LecturaSensorResponse):
+    alertas: list[AlertaResponse] = []
+
+
+class LecturaEncoladaResponse(BaseModel):
+    """Lectura aceptada en modo de ingesta diferida, pendiente de persistir"""
+    estado: str = "encolada"
+    pendientes: int
+
+
+class LoteLecturasResponse(BaseModel):
+    total_lecturas: int
+    total_alertas: int
+    lecturas: list[LecturaLoteResponse]
+
+
+class PuntoSerieResponse(BaseModel):
+    inicio: datetime
+    lecturas: int
+    frecuencia_cardiaca_promedio: Optional[float] = None
+    frecuencia_cardiaca_min: Optional[int] = None
+    frecuencia_cardiaca_max: Optional[int] = None
+    percios_promedio: Optional[float] = None
+    total_cabeceos: int = 0
+    total_bostezos: int = 0
+
+
+class SerieLecturasResponse(BaseModel):
+    id_viaje: int
+    intervalo_segundos: int
+    puntos: list[PuntoSerieResponse]
+
+
+class ViajeFlotaResponse(BaseModel):
+    id_viaje: int
+    id_conductor: int
+    nombre_conductor: str
+    fecha_inicio: datetime
+    total_lecturas: int = 0
+    ultima_lectura: Optional[LecturaSensorResponse] = None
+    # Mayor nivel de somnolencia con alertas en la ventana de riesgo
+    nivel_riesgo: Optional[str] = None
+    total_alertas: int = 0
+    alertas_por_nivel: dict[str, int] = {}
+    ultima_alerta: Optional[datetime] = None
+
+
+class FlotaResponse(BaseModel):
+    generado: datetime
+    total_viajes: int
+    viajes: list[ViajeFlotaResponse]
+
+
 class EstadisticasViajeResponse(BaseModel):
     id_viaje: int
     total_lecturas: int
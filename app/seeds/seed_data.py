@@ -3,7 +3,8 @@ Script para poblar la base de datos con datos de ejemplo
 Ejecutar con: python -m app.seeds.seed_data
 """
 from app.config.database import SessionLocal
-from app.models.models import Conductor, Viaje, LecturaSensor, Alerta
+from app.models.models import Conductor, Viaje, LecturaSensor, Alerta, AgregadoViaje, ArchivoViaje
+from app.services.agregados import AgregadoViajeService
 from datetime import datetime, timedelta
 import random
 
@@ -17,6 +18,8 @@ def seed_database():
         
         # Limpiar datos existentes (opcional)
         print("\n1. Limpiando datos existentes...")
+        db.query(AgregadoViaje).delete()
+        db.query(ArchivoViaje).delete()
         db.query(Alerta).delete()
         db.query(LecturaSensor).delete()
         db.query(Viaje).delete()
@@ -133,6 +136,11 @@ def seed_database():
         db.commit()
         print(f"   ✓ {len(alertas)} alertas creadas")
         
+        # Las filas se insertaron directamente, sin pasar por los servicios
+        print("\n6. Calculando agregados por viaje...")
+        total_agregados = AgregadoViajeService.reconstruir(db)
+        print(f"   ✓ {total_agregados} agregados calculados")
+        
         print("\n✅ Seed completado exitosamente!")
         print("\nResumen:")
         print(f"  - Conductores: {len(conductores)}")
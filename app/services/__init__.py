@@ -4,10 +4,14 @@ from app.services.services import (
     LecturaSensorService,
     AlertaService,
 )
+from app.services.agregados import AgregadoViajeService
+from app.services.archivo import ArchivoService
 
 __all__ = [
     "ConductorService",
     "ViajeService",
     "LecturaSensorService",
     "AlertaService",
+    "AgregadoViajeService",
+    "ArchivoService",
 ]
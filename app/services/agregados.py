@@ -0,0 +1,281 @@
+from sqlalchemy import and_, case, delete, func, or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from typing import Optional
+from app.models.models import AgregadoViaje, LecturaSensor, Alerta, ArchivoViaje
+from app.services.archivo import ArchivoService
+
+# INSERT ... ON CONFLICT DO UPDATE de cada dialecto soportado
+INSERT_UPSERT = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+# Columnas que se comparan en la verificación de consistencia
+COLUMNAS_AGREGADO = [
+    "total_lecturas",
+    "lecturas_con_fc",
+    "suma_fc",
+    "total_cabeceos",
+    "total_bostezos",
+    "total_alertas",
+    "primera_lectura",
+    "ultima_lectura",
+    "id_ultima_lectura",
+    "ultima_alerta",
+]
+
+
+def _menor(actual, nuevo):
+    return case((or_(actual.is_(None), nuevo < actual), nuevo), else_=actual)
+
+
+def _posterior(actual, nuevo):
+    return or_(actual.is_(None), nuevo >= actual)
+
+
+class AgregadoViajeService:
+    """
+    Mantiene los totales por viaje de forma incremental. Los métodos registrar_*
+    no confirman la transacción: se llaman junto al INSERT de lecturas/alertas
+    para que el agregado quede en la misma transacción
+    """
+    
+    _RETORNO = (
+        AgregadoViaje.__table__.c.id_viaje,
+        AgregadoViaje.__table__.c.total_lecturas,
+        AgregadoViaje.__table__.c.total_alertas,
+    )
+    
+    @staticmethod
+    def _upsert(db: Session, filas: list[dict], set_, returning: tuple = ()):
+        tabla = AgregadoViaje.__table__
+        insert_dialecto = INSERT_UPSERT[db.get_bind().dialect.name]
+        stmt = insert_dialecto(tabla)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[tabla.c.id_viaje],
+            set_=set_(tabla.c, stmt.excluded),
+        )
+        if returning:
+            stmt = stmt.returning(*returning)
+        return db.execute(stmt, filas)
+    
+    @staticmethod
+    def _completar_creados(db: Session, deltas: dict, resultado):
+        """
+        Si el upsert acaba de crear el agregado de un viaje que ya tenía filas
+        (previas a la tabla de agregados o cargadas sin pasar por el servicio),
+        el incremento no las incluye: esos agregados se recalculan desde las
+        filas, que ya contienen las recién insertadas. Un agregado es nuevo si
+        sus totales quedaron iguales a los del incremento
+        """
+        creados = [
+            id_viaje for id_viaje, total_lecturas, total_alertas in resultado
+            if total_lecturas == deltas[id_viaje].get("total_lecturas", 0)
+            and total_alertas == deltas[id_viaje].get("total_alertas", 0)
+        ]
+        if not creados:
+            return
+        calculados = AgregadoViajeService.calcular_desde_filas(db, creados)
+        filas = [
+            {"id_viaje": id_viaje, **{columna: agregado[columna] for columna in COLUMNAS_AGREGADO}}
+            for id_viaje, agregado in calculados.items()
+            if agregado["total_lecturas"] != deltas[id_viaje].get("total_lecturas", 0)
+            or agregado["total_alertas"] != deltas[id_viaje].get("total_alertas", 0)
+        ]
+        if filas:
+            AgregadoViajeService._upsert(
+                db, filas, lambda actual, nuevo: {columna: getattr(nuevo, columna) for columna in COLUMNAS_AGREGADO}
+            )
+    
+    @staticmethod
+    def registrar_lecturas(db: Session, lecturas: list):
+        """Suma al agregado de cada viaje las lecturas recién insertadas"""
+        deltas = {}
+        for lectura in lecturas:
+            delta = deltas.setdefault(lectura.id_viaje, {
+                "id_viaje": lectura.id_viaje,
+                "total_lecturas": 0,
+                "lecturas_con_fc": 0,
+                "suma_fc": 0,
+                "total_cabeceos": 0,
+                "total_bostezos": 0,
+                "primera_lectura": lectura.timestamp,
+                "ultima_lectura": lectura.timestamp,
+                "id_ultima_lectura": lectura.id_lectura,
+            })
+            delta["total_lecturas"] += 1
+            if lectura.frecuencia_cardiaca is not None:
+                delta["lecturas_con_fc"] += 1
+                delta["suma_fc"] += lectura.frecuencia_cardiaca
+            delta["total_cabeceos"] += lectura.conteo_cabeceos or 0
+            delta["total_bostezos"] += lectura.conteo_bostezos or 0
+            delta["primera_lectura"] = min(delta["primera_lectura"], lectura.timestamp)
+            if (lectura.timestamp, lectura.id_lectura) >= (delta["ultima_lectura"], delta["id_ultima_lectura"]):
+                delta["ultima_lectura"] = lectura.timestamp
+                delta["id_ultima_lectura"] = lectura.id_lectura
+        
+        if not deltas:
+            return
+        
+        def _set(actual, nuevo):
+            es_ultima = _posterior(actual.ultima_lectura, nuevo.ultima_lectura)
+            return {
+                "total_lecturas": actual.total_lecturas + nuevo.total_lecturas,
+                "lecturas_con_fc": actual.lecturas_con_fc + nuevo.lecturas_con_fc,
+                "suma_fc": actual.suma_fc + nuevo.suma_fc,
+                "total_cabeceos": actual.total_cabeceos + nuevo.total_cabeceos,
+                "total_bostezos": actual.total_bostezos + nuevo.total_bostezos,
+                "primera_lectura": _menor(actual.primera_lectura, nuevo.primera_lectura),
+                "ultima_lectura": case((es_ultima, nuevo.ultima_lectura), else_=actual.ultima_lectura),
+                "id_ultima_lectura": case((es_ultima, nuevo.id_ultima_lectura), else_=actual.id_ultima_lectura),
+            }
+        
+        resultado = AgregadoViajeService._upsert(db, list(deltas.values()), _set, AgregadoViajeService._RETORNO)
+        AgregadoViajeService._completar_creados(db, deltas, resultado.all())
+    
+    @staticmethod
+    def registrar_alertas(db: Session, alertas: list):
+        """Suma al agregado de cada viaje las alertas recién insertadas"""
+        deltas = {}
+        for alerta in alertas:
+            delta = deltas.setdefault(alerta.id_viaje, {
+                "id_viaje": alerta.id_viaje,
+                "total_alertas": 0,
+                "ultima_alerta": alerta.timestamp,
+            })
+            delta["total_alertas"] += 1
+            delta["ultima_alerta"] = max(delta["ultima_alerta"], alerta.timestamp)
+        
+        if not deltas:
+            return
+        
+        def _set(actual, nuevo):
+            return {
+                "total_alertas": actual.total_alertas + nuevo.total_alertas,
+                "ultima_alerta": case(
+                    (_posterior(actual.ultima_alerta, nuevo.ultima_alerta), nuevo.ultima_alerta),
+                    else_=actual.ultima_alerta,
+                ),
+            }
+        
+        resultado = AgregadoViajeService._upsert(db, list(deltas.values()), _set, AgregadoViajeService._RETORNO)
+        AgregadoViajeService._completar_creados(db, deltas, resultado.all())
+    
+    @staticmethod
+    def calcular_desde_filas(db: Session, viaje_ids: Optional[list[int]] = None) -> dict[int, dict]:
+        """Recalcula los agregados desde las tablas de lecturas y alertas y los archivos de viajes"""
+        def _filtrar(stmt, columna):
+            return stmt.where(columna.in_(viaje_ids)) if viaje_ids else stmt
+        
+        lecturas = db.execute(_filtrar(select(
+            LecturaSensor.id_viaje,
+            func.count(LecturaSensor.id_lectura),
+            func.count(LecturaSensor.frecuencia_cardiaca),
+            func.coalesce(func.sum(LecturaSensor.frecuencia_cardiaca), 0),
+            func.coalesce(func.sum(LecturaSensor.conteo_cabeceos), 0),
+            func.coalesce(func.sum(LecturaSensor.conteo_bostezos), 0),
+            func.min(LecturaSensor.timestamp),
+            func.max(LecturaSensor.timestamp),
+        ), LecturaSensor.id_viaje).group_by(LecturaSensor.id_viaje)).all()
+        
+        ultimo_ts = _filtrar(select(
+            LecturaSensor.id_viaje,
+            func.max(LecturaSensor.timestamp).label("timestamp"),
+        ), LecturaSensor.id_viaje).group_by(LecturaSensor.id_viaje).subquery()
+        ultimas = dict(db.execute(
+            select(LecturaSensor.id_viaje, func.max(LecturaSensor.id_lectura))
+            .join(ultimo_ts, and_(
+                LecturaSensor.id_viaje == ultimo_ts.c.id_viaje,
+                LecturaSensor.timestamp == ultimo_ts.c.timestamp,
+            ))
+            .group_by(LecturaSensor.id_viaje)
+        ).all())
+        
+        alertas = db.execute(_filtrar(select(
+            Alerta.id_viaje,
+            func.count(Alerta.id_alerta),
+            func.max(Alerta.timestamp),
+        ), Alerta.id_viaje).group_by(Alerta.id_viaje)).all()
+        
+        agregados = {}
+        for id_viaje, total, con_fc, suma_fc, cabeceos, bostezos, primera, ultima in lecturas:
+            agregados[id_viaje] = {
+                "id_viaje": id_viaje,
+                "total_lecturas": total,
+                "lecturas_con_fc": con_fc,
+                "suma_fc": int(suma_fc),
+                "total_cabeceos": int(cabeceos),
+                "total_bostezos": int(bostezos),
+                "total_alertas": 0,
+                "primera_lectura": primera,
+                "ultima_lectura": ultima,
+                "id_ultima_lectura": ultimas.get(id_viaje),
+                "ultima_alerta": None,
+            }
+        # Las lecturas de los viajes archivados ya no están en la tabla
+        archivados = db.execute(_filtrar(select(ArchivoViaje.id_viaje), ArchivoViaje.id_viaje)).scalars().all()
+        for id_viaje in archivados:
+            archivo = ArchivoService.get_archivo(db, id_viaje).agregado()
+            agregado = agregados.get(id_viaje)
+            if agregado is None:
+                agregados[id_viaje] = {"id_viaje": id_viaje, **archivo, "total_alertas": 0, "ultima_alerta": None}
+                continue
+            for columna in COLUMNAS_AGREGADO[:5]:
+                agregado[columna] += archivo[columna]
+            agregado["primera_lectura"] = min(agregado["primera_lectura"], archivo["primera_lectura"])
+            if archivo["ultima_lectura"] > agregado["ultima_lectura"]:
+                agregado["ultima_lectura"] = archivo["ultima_lectura"]
+                agregado["id_ultima_lectura"] = archivo["id_ultima_lectura"]
+        
+        for id_viaje, total, ultima in alertas:
+            agregado = agregados.setdefault(id_viaje, {
+                "id_viaje": id_viaje,
+                **{columna: 0 for columna in COLUMNAS_AGREGADO[:5]},
+                "primera_lectura": None,
+                "ultima_lectura": None,
+                "id_ultima_lectura": None,
+            })
+            agregado["total_alertas"] = total
+            agregado["ultima_alerta"] = ultima
+        
+        return agregados
+    
+    @staticmethod
+    def verificar(db: Session, viaje_ids: Optional[list[int]] = None) -> dict[int, dict]:
+        """
+        Compara los agregados guardados con los recalculados.
+        Retorna {id_viaje: {columna: (guardado, calculado)}} de los que difieren
+        """
+        calculados = AgregadoViajeService.calcular_desde_filas(db, viaje_ids)
+        query = db.query(AgregadoViaje)
+        if viaje_ids:
+            query = query.filter(AgregadoViaje.id_viaje.in_(viaje_ids))
+        guardados = {agregado.id_viaje: agregado for agregado in query.all()}
+        
+        diferencias = {}
+        for id_viaje in calculados.keys() | guardados.keys():
+            calculado = calculados.get(id_viaje)
+            guardado = guardados.get(id_viaje)
+            difiere = {}
+            for columna in COLUMNAS_AGREGADO:
+                valor_guardado = getattr(guardado, columna) if guardado else None
+                valor_calculado = calculado[columna] if calculado else None
+                if valor_guardado != valor_calculado:
+                    difiere[columna] = (valor_guardado, valor_calculado)
+            if difiere:
+                diferencias[id_viaje] = difiere
+        return diferencias
+    
+    @staticmethod
+    def reconstruir(db: Session, viaje_ids: Optional[list[int]] = None) -> int:
+        """Reemplaza los agregados por los recalculados desde las filas. Retorna cuántos escribió"""
+        calculados = AgregadoViajeService.calcular_desde_filas(db, viaje_ids)
+        borrar = delete(AgregadoViaje)
+        if viaje_ids:
+            borrar = borrar.where(AgregadoViaje.id_viaje.in_(viaje_ids))
+        db.execute(borrar)
+        if calculados:
+            db.bulk_insert_mappings(AgregadoViaje, list(calculados.values()))
+        db.commit()
+        return len(calculados)
@@ -1,78 +1,152 @@
 from app.models.models import LecturaSensor, Alerta
 from app.schemas.schemas import AlertaCreate
 from app.config.settings import settings
+from app.config.metricas import registrar_ingesta
+from app.services.agregados import AgregadoViajeService
+from app.services.ventanas import detector_ventanas
+from app.services.reglas import motor_reglas
+from app.services.perfiles import resolutor_perfiles
+from app.services.recientes import alertas_recientes
+from app.services.cooldown import AlertaAbierta, NIVELES, cooldown_alertas
+from app.utils.insercion import insertar_retornando
+from datetime import datetime, timedelta
+from sqlalchemy import bindparam, update
 from sqlalchemy.orm import Session
 
 
 class AlertaAutoDetector:
     """Servicio para detectar y generar alertas automáticamente basado en lecturas de sensores"""
     
+    @staticmethod
+    def evaluar_lectura(lectura: LecturaSensor) -> list[AlertaCreate]:
+        """
+        Evalúa una lectura contra las reglas con los umbrales globales, sin tocar la base de datos
+        Retorna las alertas que deberían generarse
+        """
+        resultados = motor_reglas.evaluar(lectura)
+        if not resultados:
+            return []
+        return [
+            AlertaCreate(id_viaje=lectura.id_viaje, tipo_alerta=tipo, nivel_somnolencia=nivel)
+            for tipo, nivel in resultados
+        ]
+    
     @staticmethod
     def analizar_lectura(db: Session, lectura: LecturaSensor) -> list[Alerta]:
         """
         Analiza una lectura de sensor y genera alertas si es necesario
         Retorna una lista de alertas generadas
         """
-        alertas_generadas = []
+        db_alertas = AlertaAutoDetector.analizar_lote(db, [lectura])[0]
+        # También confirma las repeticiones que solo actualizaron una alerta abierta
+        db.commit()
         
-        # Detectar frecuencia cardíaca anormal
-        if lectura.frecuencia_cardiaca is not None:
-            if lectura.frecuencia_cardiaca < settings.UMBRAL_FRECUENCIA_CARDIACA_MIN:
-                alerta = AlertaCreate(
-                    id_viaje=lectura.id_viaje,
-                    tipo_alerta="FRECUENCIA_CARDIACA_BAJA",
-                    nivel_somnolencia="MEDIO"
-                )
-                alertas_generadas.append(alerta)
-            
-            elif lectura.frecuencia_cardiaca > settings.UMBRAL_FRECUENCIA_CARDIACA_MAX:
-                alerta = AlertaCreate(
-                    id_viaje=lectura.id_viaje,
-                    tipo_alerta="FRECUENCIA_CARDIACA_ALTA",
-                    nivel_somnolencia="BAJO"
-                )
-                alertas_generadas.append(alerta)
+        return db_alertas
+    
+    @staticmethod
+    def analizar_lote(db: Session, lecturas: list) -> list[list]:
+        """
+        Analiza un lote de lecturas ya insertadas con los umbrales del perfil del
+        conductor de cada viaje e inserta todas las alertas resultantes en una
+        sola sentencia INSERT ... RETURNING (ver app/utils/insercion.py). Las repeticiones
+        dentro del cooldown solo incrementan las ocurrencias de la alerta abierta.
+        No confirma la transacción: el llamador decide cuándo hacer commit.
+        Retorna, para cada lectura (en el mismo orden), la lista de alertas generadas
+        """
+        candidatas = [
+            (indice, AlertaCreate(id_viaje=lecturas[indice].id_viaje, tipo_alerta=tipo, nivel_somnolencia=nivel))
+            for indice, tipo, nivel in resolutor_perfiles.evaluar_lote(db, lecturas)
+        ]
         
-        # Detectar cabeceos excesivos (señal de somnolencia)
-        if lectura.conteo_cabeceos >= settings.UMBRAL_CABECEOS:
-            nivel = "ALTO" if lectura.conteo_cabeceos >= settings.UMBRAL_CABECEOS * 2 else "MEDIO"
-            alerta = AlertaCreate(
-                id_viaje=lectura.id_viaje,
-                tipo_alerta="SOMNOLENCIA_CABECEOS",
-                nivel_somnolencia=nivel
-            )
-            alertas_generadas.append(alerta)
+        if settings.DETECCION_MODO == "ventana":
+            for indice, alertas in enumerate(detector_ventanas.evaluar_lote(db, lecturas)):
+                candidatas.extend((indice, alerta) for alerta in alertas)
+            candidatas.sort(key=lambda candidata: candidata[0])
         
-        # Detectar bostezos excesivos (señal de fatiga)
-        if lectura.conteo_bostezos >= settings.UMBRAL_BOSTEZOS:
-            nivel = "ALTO" if lectura.conteo_bostezos >= settings.UMBRAL_BOSTEZOS * 2 else "MEDIO"
-            alerta = AlertaCreate(
-                id_viaje=lectura.id_viaje,
-                tipo_alerta="FATIGA_BOSTEZOS",
-                nivel_somnolencia=nivel
-            )
-            alertas_generadas.append(alerta)
+        alertas_por_lectura = [[] for _ in lecturas]
+        if not candidatas:
+            registrar_ingesta(db, len(lecturas), [], 0)
+            return alertas_por_lectura
+        
+        nuevas, repeticiones, abiertas = AlertaAutoDetector._deduplicar(lecturas, candidatas)
+        tabla = Alerta.__table__
+        filas = []
         
-        # Detectar combinación peligrosa de cabeceos y bostezos
-        if (lectura.conteo_cabeceos >= settings.UMBRAL_CABECEOS and 
-            lectura.conteo_bostezos >= settings.UMBRAL_BOSTEZOS):
-            alerta = AlertaCreate(
-                id_viaje=lectura.id_viaje,
-                tipo_alerta="PELIGRO_CRITICO",
-                nivel_somnolencia="CRITICO"
+        if repeticiones:
+            db.execute(
+                update(tabla)
+                .where(tabla.c.id_alerta == bindparam("b_id_alerta"))
+                .values(
+                    ocurrencias=tabla.c.ocurrencias + bindparam("b_ocurrencias"),
+                    ultima_ocurrencia=bindparam("b_ultima_ocurrencia"),
+                ),
+                [
+                    {"b_id_alerta": id_alerta, "b_ocurrencias": cantidad, "b_ultima_ocurrencia": ultima}
+                    for id_alerta, (cantidad, ultima) in repeticiones.items()
+                ],
             )
-            alertas_generadas.append(alerta)
         
-        # Guardar todas las alertas generadas en la base de datos
-        db_alertas = []
-        for alerta_create in alertas_generadas:
-            db_alerta = Alerta(**alerta_create.model_dump())
-            db.add(db_alerta)
-            db_alertas.append(db_alerta)
+        if nuevas:
+            filas = insertar_retornando(db, tabla, [parametros for _, parametros in nuevas])
+            for (indice, _), fila in zip(nuevas, filas):
+                alertas_por_lectura[indice].append(fila)
+                abiertas[(fila.id_viaje, fila.tipo_alerta)] = AlertaAbierta(
+                    fila.id_alerta, NIVELES.get(fila.nivel_somnolencia, 0), fila.ultima_ocurrencia
+                )
+            AgregadoViajeService.registrar_alertas(db, filas)
         
-        if db_alertas:
-            db.commit()
-            for alerta in db_alertas:
-                db.refresh(alerta)
+        if settings.ALERTAS_COOLDOWN_SEGUNDOS > 0:
+            cooldown_alertas.registrar(db, abiertas)
+        alertas_recientes.publicar(db, filas, repeticiones)
+        registrar_ingesta(db, len(lecturas), filas, sum(cantidad for cantidad, _ in repeticiones.values()))
         
-        return db_alertas
+        return alertas_por_lectura
+    
+    @staticmethod
+    def _deduplicar(lecturas: list, candidatas: list) -> tuple[list, dict, dict]:
+        """
+        Separa las candidatas en alertas nuevas [(indice, parámetros del INSERT)] y
+        repeticiones de alertas ya abiertas {id_alerta: (cantidad, última ocurrencia)}.
+        Las repeticiones de una alerta nueva del mismo lote se suman a su fila.
+        También retorna el nuevo estado de las alertas abiertas que se repitieron
+        """
+        nuevas = []
+        repeticiones = {}
+        # (viaje, tipo) -> ("abierta", AlertaAbierta) | ("nueva", parámetros del INSERT)
+        vigentes = {}
+        cooldown = timedelta(seconds=settings.ALERTAS_COOLDOWN_SEGUNDOS)
+        
+        for indice, alerta in candidatas:
+            momento = lecturas[indice].timestamp or datetime.utcnow()
+            # La alerta se fecha con su lectura: timestamp y ultima_ocurrencia usan el mismo reloj
+            parametros = {**alerta.model_dump(), "timestamp": momento, "ocurrencias": 1, "ultima_ocurrencia": momento}
+            if settings.ALERTAS_COOLDOWN_SEGUNDOS <= 0:
+                nuevas.append((indice, parametros))
+                continue
+            
+            clave = (alerta.id_viaje, alerta.tipo_alerta)
+            nivel = NIVELES.get(alerta.nivel_somnolencia, 0)
+            if clave not in vigentes:
+                abierta = cooldown_alertas.abierta(clave, nivel, momento)
+                if abierta:
+                    vigentes[clave] = ("abierta", abierta)
+            
+            tipo, vigente = vigentes.get(clave, (None, None))
+            if tipo == "abierta":
+                if nivel <= vigente.nivel and momento - vigente.ultima_ocurrencia <= cooldown:
+                    cantidad, ultima = repeticiones.get(vigente.id_alerta, (0, momento))
+                    repeticiones[vigente.id_alerta] = (cantidad + 1, max(ultima, momento))
+                    vigentes[clave] = ("abierta", AlertaAbierta(vigente.id_alerta, vigente.nivel, max(ultima, momento)))
+                    continue
+            elif tipo == "nueva":
+                nivel_vigente = NIVELES.get(vigente["nivel_somnolencia"], 0)
+                if nivel <= nivel_vigente and momento - vigente["ultima_ocurrencia"] <= cooldown:
+                    vigente["ocurrencias"] += 1
+                    vigente["ultima_ocurrencia"] = max(vigente["ultima_ocurrencia"], momento)
+                    continue
+            
+            nuevas.append((indice, parametros))
+            vigentes[clave] = ("nueva", parametros)
+        
+        abiertas = {clave: vigente for clave, (tipo, vigente) in vigentes.items() if tipo == "abierta"}
+        return nuevas, repeticiones, abiertas
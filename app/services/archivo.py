@@ -0,0 +1,409 @@
+"""
+Archivo columnar comprimido de las lecturas de viajes finalizados
+
+Cada viaje archivado se guarda en un archivo propio con una columna por campo
+(arreglos tipados, con delta-encoding para ids y timestamps) comprimida con
+zlib, en bloques de FILAS_POR_BLOQUE filas: las consultas leen y descomprimen
+solo los bloques y columnas que necesitan.
+Las filas archivadas se eliminan de lecturas_sensores; los agregados del viaje
+se conservan.
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from functools import lru_cache
+from itertools import accumulate
+from typing import Optional
+from sqlalchemy import delete, exists, select
+from sqlalchemy.orm import Session
+from app.config.settings import settings
+from app.models.models import Viaje, LecturaSensor, ArchivoViaje
+import json
+import logging
+import os
+import struct
+import sys
+import zlib
+
+logger = logging.getLogger(__name__)
+
+MAGIA = b"RAC1"
+EPOCA = datetime(1970, 1, 1)
+NIVEL_COMPRESION = 6
+# Filas por bloque comprimido (512 KB por columna de 8 bytes)
+FILAS_POR_BLOQUE = 65536
+
+# (columna, typecode de array, admite nulos, delta-encoding)
+COLUMNAS = [
+    ("id_lectura", "q", False, True),
+    ("timestamp", "q", False, True),
+    ("percios", "d", True, False),
+    ("frecuencia_cardiaca", "i", True, False),
+    ("conteo_cabeceos", "i", False, False),
+    ("conteo_bostezos", "i", False, False),
+]
+
+
+class LecturaArchivada:
+    """Lectura reconstruida desde el archivo, con los mismos atributos que LecturaSensor"""
+    __slots__ = (
+        "id_lectura", "id_viaje", "timestamp", "percios",
+        "frecuencia_cardiaca", "conteo_cabeceos", "conteo_bostezos",
+    )
+    
+    def __init__(self, **valores):
+        for campo, valor in valores.items():
+            setattr(self, campo, valor)
+
+
+def _a_microsegundos(fecha: Optional[datetime]) -> int:
+    if fecha is None:
+        return 0
+    if fecha.tzinfo is not None:
+        fecha = fecha.replace(tzinfo=None) - fecha.utcoffset()
+    return (fecha - EPOCA) // timedelta(microseconds=1)
+
+
+def _a_fecha(microsegundos: int) -> datetime:
+    return EPOCA + timedelta(microseconds=microsegundos)
+
+
+def escribir_archivo(ruta: str, filas: list) -> int:
+    """
+    Escribe las lecturas (ordenadas por timestamp, id) en formato columnar, en
+    bloques de FILAS_POR_BLOQUE filas. La escritura es atómica (archivo
+    temporal + rename). Retorna el tamaño en bytes
+    """
+    cabecera = {
+        "version": 2,
+        "filas": len(filas),
+        "orden_bytes": sys.byteorder,
+        "filas_por_bloque": FILAS_POR_BLOQUE,
+        "claves": [],
+        "columnas": [
+            {"nombre": nombre, "tipo": tipo, "delta": delta, "bloques": [], **({"mascaras": []} if admite_nulos else {})}
+            for nombre, tipo, admite_nulos, delta in COLUMNAS
+        ],
+    }
+    bloques = []
+    desplazamiento = 0
+    
+    def _agregar(datos: bytes) -> dict:
+        nonlocal desplazamiento
+        bloques.append(datos)
+        ubicacion = {"desplazamiento": desplazamiento, "longitud": len(datos)}
+        desplazamiento += len(datos)
+        return ubicacion
+    
+    for inicio in range(0, len(filas), FILAS_POR_BLOQUE):
+        lote = filas[inicio:inicio + FILAS_POR_BLOQUE]
+        cabecera["claves"].append([_a_microsegundos(lote[0].timestamp), lote[0].id_lectura])
+        for columna, (nombre, tipo, admite_nulos, delta) in zip(cabecera["columnas"], COLUMNAS):
+            valores = [getattr(fila, nombre) for fila in lote]
+            if nombre == "timestamp":
+                valores = [_a_microsegundos(valor) for valor in valores]
+            
+            if admite_nulos:
+                mascara = array("B", (valor is not None for valor in valores))
+                valores = [0 if valor is None else valor for valor in valores]
+            if delta:
+                # Cada bloque parte de 0 para poder decodificarse por separado
+                valores = [actual - previo for previo, actual in zip([0] + valores, valores)]
+            
+            columna["bloques"].append(_agregar(zlib.compress(array(tipo, valores).tobytes(), NIVEL_COMPRESION)))
+            if admite_nulos:
+                columna["mascaras"].append(_agregar(zlib.compress(mascara.tobytes(), NIVEL_COMPRESION)))
+    
+    datos_cabecera = json.dumps(cabecera).encode()
+    os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+    temporal = f"{ruta}.tmp"
+    with open(temporal, "wb") as archivo:
+        archivo.write(MAGIA)
+        archivo.write(struct.pack("<I", len(datos_cabecera)))
+        archivo.write(datos_cabecera)
+        for bloque in bloques:
+            archivo.write(bloque)
+        archivo.flush()
+        os.fsync(archivo.fileno())
+    os.replace(temporal, ruta)
+    return os.path.getsize(ruta)
+
+
+@lru_cache(maxsize=settings.ARCHIVO_CACHE_BLOQUES)
+def _leer_bloque(ruta: str, desplazamiento: int, longitud: int, tipo: str, delta: bool, invertir: bool) -> array:
+    """Lee y descomprime un único bloque de una columna como arreglo tipado"""
+    with open(ruta, "rb") as archivo:
+        archivo.seek(desplazamiento)
+        valores = array(tipo)
+        valores.frombytes(zlib.decompress(archivo.read(longitud)))
+    if invertir and tipo != "B":
+        valores.byteswap()
+    if delta:
+        valores = array(tipo, accumulate(valores))
+    return valores
+
+
+class ArchivoLecturas:
+    """
+    Viaje archivado, ordenado por (timestamp, id_lectura). Al abrirlo solo se
+    lee la cabecera; cada consulta descomprime únicamente los bloques de las
+    columnas que necesita, que se guardan como arreglos tipados en un caché
+    acotado (ARCHIVO_CACHE_BLOQUES)
+    """
+    
+    def __init__(self, ruta: str, id_viaje: int, cabecera: dict, inicio_datos: int):
+        self.ruta = ruta
+        self.id_viaje = id_viaje
+        self.total = cabecera["filas"]
+        self.filas_por_bloque = cabecera["filas_por_bloque"]
+        self.claves = [tuple(clave) for clave in cabecera["claves"]]
+        self.columnas = {columna["nombre"]: columna for columna in cabecera["columnas"]}
+        self._inicio_datos = inicio_datos
+        self._invertir = cabecera["orden_bytes"] != sys.byteorder
+    
+    @classmethod
+    def leer(cls, ruta: str, id_viaje: int) -> "ArchivoLecturas":
+        with open(ruta, "rb") as archivo:
+            if archivo.read(4) != MAGIA:
+                raise ValueError(f"{ruta} no es un archivo de lecturas válido")
+            (largo_cabecera,) = struct.unpack("<I", archivo.read(4))
+            cabecera = json.loads(archivo.read(largo_cabecera))
+        
+        if cabecera["version"] == 1:
+            # Versión 1: un único bloque por columna
+            cabecera["filas_por_bloque"] = max(cabecera["filas"], 1)
+            cabecera["claves"] = [[-(2 ** 63), 0]] if cabecera["filas"] else []
+            for columna in cabecera["columnas"]:
+                columna["bloques"] = [{"desplazamiento": columna["desplazamiento"], "longitud": columna["longitud"]}]
+                if "mascara" in columna:
+                    columna["mascaras"] = [columna["mascara"]]
+        return cls(ruta, id_viaje, cabecera, 8 + largo_cabecera)
+    
+    @property
+    def bloques(self) -> int:
+        return len(self.claves)
+    
+    def _bloque(self, ubicacion: dict, tipo: str, delta: bool) -> array:
+        return _leer_bloque(
+            self.ruta, self._inicio_datos + ubicacion["desplazamiento"], ubicacion["longitud"],
+            tipo, delta, self._invertir,
+        )
+    
+    def valores(self, nombre: str, bloque: int) -> tuple[array, Optional[array]]:
+        """Valores de una columna en un bloque y su máscara de presencia (None si no admite nulos)"""
+        columna = self.columnas[nombre]
+        valores = self._bloque(columna["bloques"][bloque], columna["tipo"], columna["delta"])
+        mascara = self._bloque(columna["mascaras"][bloque], "B", False) if "mascaras" in columna else None
+        return valores, mascara
+    
+    def filas(self, inicio: int, fin: int) -> list[LecturaArchivada]:
+        """Lecturas de las posiciones [inicio, fin), decodificando solo sus bloques"""
+        lecturas = []
+        if inicio >= fin:
+            return lecturas
+        for bloque in range(inicio // self.filas_por_bloque, (fin - 1) // self.filas_por_bloque + 1):
+            base = bloque * self.filas_por_bloque
+            c = {nombre: self.valores(nombre, bloque) for nombre in self.columnas}
+            for i in range(max(inicio, base) - base, min(fin, base + self.filas_por_bloque) - base):
+                lectura = {"id_lectura": c["id_lectura"][0][i], "id_viaje": self.id_viaje,
+                           "timestamp": _a_fecha(c["timestamp"][0][i])}
+                for nombre in ("percios", "frecuencia_cardiaca", "conteo_cabeceos", "conteo_bostezos"):
+                    valores, mascara = c[nombre]
+                    lectura[nombre] = valores[i] if mascara is None or mascara[i] else None
+                lecturas.append(LecturaArchivada(**lectura))
+        return lecturas
+    
+    def _posicion(self, clave: tuple) -> int:
+        """Cantidad de lecturas con (timestamp, id_lectura) menor que `clave`"""
+        bloque = bisect_left(self.claves, clave) - 1
+        if bloque < 0:
+            return 0
+        timestamps, _ = self.valores("timestamp", bloque)
+        ids, _ = self.valores("id_lectura", bloque)
+        # Dentro del bloque: primero por timestamp y, entre los iguales, por id
+        desde = bisect_left(timestamps, clave[0])
+        hasta = bisect_right(timestamps, clave[0], desde)
+        return bloque * self.filas_por_bloque + bisect_left(ids, clave[1], desde, hasta)
+    
+    def pagina(self, skip: int = 0, limit: int = 100, despues_de: Optional[tuple] = None) -> list:
+        """
+        Lecturas de la más reciente a la más antigua, como LecturaSensorService.get_all.
+        `despues_de` es el (timestamp, id_lectura) del cursor
+        """
+        if despues_de is not None:
+            fin = self._posicion((_a_microsegundos(despues_de[0]), despues_de[1]))
+        else:
+            fin = max(self.total - skip, 0)
+        inicio = max(fin - (limit if limit is not None else fin), 0)
+        return self.filas(inicio, fin)[::-1]
+    
+    def serie(self, intervalo_segundos: int, desde: Optional[datetime] = None, hasta: Optional[datetime] = None) -> list:
+        """Buckets de tiempo con la misma forma que las filas de LecturaSensorService.get_serie"""
+        tamano = intervalo_segundos * 1_000_000
+        minimo = _a_microsegundos(desde) if desde else None
+        maximo = _a_microsegundos(hasta) if hasta else None
+        # Solo los bloques que pueden tener lecturas dentro del rango
+        primero = max(bisect_right(self.claves, (minimo,)) - 1, 0) if minimo is not None else 0
+        ultimo = bisect_right(self.claves, (maximo, float("inf"))) if maximo is not None else self.bloques
+        
+        buckets = {}
+        for bloque in range(primero, ultimo):
+            timestamps, _ = self.valores("timestamp", bloque)
+            fcs, con_fc = self.valores("frecuencia_cardiaca", bloque)
+            percios, con_percios = self.valores("percios", bloque)
+            cabeceos, _ = self.valores("conteo_cabeceos", bloque)
+            bostezos, _ = self.valores("conteo_bostezos", bloque)
+            for i, ts in enumerate(timestamps):
+                if (minimo is not None and ts < minimo) or (maximo is not None and ts > maximo):
+                    continue
+                b = buckets.setdefault(ts // tamano, [0, 0, 0, None, None, 0.0, 0, 0, 0])
+                b[0] += 1
+                if con_fc[i]:
+                    fc = fcs[i]
+                    b[1] += fc
+                    b[2] += 1
+                    b[3] = fc if b[3] is None else min(b[3], fc)
+                    b[4] = fc if b[4] is None else max(b[4], fc)
+                if con_percios[i]:
+                    b[5] += percios[i]
+                    b[6] += 1
+                b[7] += cabeceos[i]
+                b[8] += bostezos[i]
+        
+        return [
+            (numero, b[0], b[1] / b[2] if b[2] else None, b[3], b[4],
+             b[5] / b[6] if b[6] else None, b[7], b[8])
+            for numero, b in sorted(buckets.items())
+        ]
+    
+    def agregado(self) -> dict:
+        """Totales de las lecturas archivadas, con las columnas de AgregadoViaje"""
+        totales = {"total_lecturas": self.total, "lecturas_con_fc": 0, "suma_fc": 0,
+                   "total_cabeceos": 0, "total_bostezos": 0}
+        for bloque in range(self.bloques):
+            fcs, con_fc = self.valores("frecuencia_cardiaca", bloque)
+            # Los nulos se guardan como 0
+            totales["suma_fc"] += sum(fcs)
+            totales["lecturas_con_fc"] += sum(con_fc)
+            totales["total_cabeceos"] += sum(self.valores("conteo_cabeceos", bloque)[0])
+            totales["total_bostezos"] += sum(self.valores("conteo_bostezos", bloque)[0])
+        
+        primera = self.filas(0, 1)[0] if self.total else None
+        ultima = self.filas(self.total - 1, self.total)[0] if self.total else None
+        return {
+            **totales,
+            "primera_lectura": primera.timestamp if primera else None,
+            "ultima_lectura": ultima.timestamp if ultima else None,
+            "id_ultima_lectura": ultima.id_lectura if ultima else None,
+        }
+
+
+@lru_cache(maxsize=settings.ARCHIVO_CACHE_VIAJES)
+def _cargar(ruta: str, id_viaje: int) -> ArchivoLecturas:
+    # Los archivos no cambian una vez escritos: se cachea la cabecera por ruta
+    return ArchivoLecturas.leer(ruta, id_viaje)
+
+
+class ArchivoService:
+    @staticmethod
+    def ruta(viaje_id: int) -> str:
+        return os.path.join(settings.ARCHIVO_DIRECTORIO, f"viaje_{viaje_id}.rac")
+    
+    @staticmethod
+    def get_archivo(db: Session, viaje_id: int) -> Optional[ArchivoLecturas]:
+        """Lecturas archivadas del viaje, o None si el viaje no está archivado"""
+        registro = db.get(ArchivoViaje, viaje_id)
+        if not registro:
+            return None
+        return _cargar(registro.ruta, viaje_id)
+    
+    @staticmethod
+    def archivar_viaje(db: Session, viaje_id: int) -> Optional[ArchivoViaje]:
+        """
+        Archiva las lecturas de un viaje finalizado y las elimina de la tabla.
+        Retorna el registro del archivo, o None si el viaje no está finalizado,
+        ya está archivado o no tiene lecturas
+        """
+        # FOR UPDATE sobre el viaje: en PostgreSQL bloquea los INSERT de lecturas
+        # del viaje (la FK toma FOR KEY SHARE) hasta terminar de archivar
+        viaje = db.get(Viaje, viaje_id, with_for_update=True)
+        if not viaje or viaje.fecha_fin is None or db.get(ArchivoViaje, viaje_id):
+            # Libera el bloqueo antes de volver al llamador
+            db.rollback()
+            return None
+        
+        filas = db.execute(
+            select(LecturaSensor.__table__)
+            .where(LecturaSensor.id_viaje == viaje_id)
+            .order_by(LecturaSensor.timestamp, LecturaSensor.id_lectura)
+        ).all()
+        if not filas:
+            db.rollback()
+            return None
+        
+        ruta = ArchivoService.ruta(viaje_id)
+        tamano = escribir_archivo(ruta, filas)
+        try:
+            registro = ArchivoViaje(
+                id_viaje=viaje_id,
+                ruta=ruta,
+                total_lecturas=len(filas),
+                bytes_archivo=tamano,
+                fecha_archivo=datetime.utcnow(),
+            )
+            db.add(registro)
+            # Solo se borran las lecturas hasta la última archivada
+            borrar = delete(LecturaSensor).where(
+                LecturaSensor.id_viaje == viaje_id,
+                LecturaSensor.id_lectura <= max(fila.id_lectura for fila in filas),
+            )
+            if settings.DB_PARTICIONADO:
+                # Acotar al rango del viaje para que solo se recorran sus particiones
+                borrar = borrar.where(
+                    LecturaSensor.timestamp >= filas[0].timestamp,
+                    LecturaSensor.timestamp <= filas[-1].timestamp,
+                )
+            borradas = db.execute(borrar).rowcount
+            restantes = db.execute(
+                select(LecturaSensor.id_lectura).where(LecturaSensor.id_viaje == viaje_id).limit(1)
+            ).first()
+            if borradas != len(filas) or restantes is not None:
+                # Se insertaron lecturas después de leerlas (sin bloqueo, p. ej. SQLite):
+                # se deshace todo y el viaje se archiva completo en otro intento
+                raise RuntimeError(f"Las lecturas del viaje {viaje_id} cambiaron durante el archivo")
+            db.commit()
+        except Exception:
+            db.rollback()
+            os.remove(ruta)
+            raise
+        return registro
+    
+    @staticmethod
+    def archivar_finalizados(db: Session, antiguedad_horas: Optional[int] = None, limite: int = 100) -> list[int]:
+        """
+        Archiva los viajes finalizados hace más de `antiguedad_horas`. Retorna sus ids.
+        Los viajes sin lecturas no son candidatos: no ocupan el límite de cada corrida
+        """
+        antiguedad_horas = settings.ARCHIVO_ANTIGUEDAD_HORAS if antiguedad_horas is None else antiguedad_horas
+        limite_fecha = datetime.utcnow() - timedelta(hours=antiguedad_horas)
+        candidatos = db.execute(
+            select(Viaje.id_viaje)
+            .outerjoin(ArchivoViaje, ArchivoViaje.id_viaje == Viaje.id_viaje)
+            .where(
+                Viaje.fecha_fin.is_not(None),
+                Viaje.fecha_fin <= limite_fecha,
+                ArchivoViaje.id_viaje.is_(None),
+                exists().where(LecturaSensor.id_viaje == Viaje.id_viaje),
+            )
+            .order_by(Viaje.fecha_fin)
+            .limit(limite)
+        ).scalars().all()
+        
+        archivados = []
+        for viaje_id in candidatos:
+            try:
+                if ArchivoService.archivar_viaje(db, viaje_id):
+                    archivados.append(viaje_id)
+            except Exception as e:
+                logger.error(f"No se pudo archivar el viaje {viaje_id}: {str(e)}")
+        return archivados
@@ -0,0 +1,78 @@
+"""
+Deduplicación de alertas por (viaje, tipo_alerta)
+
+Mientras una alerta siga repitiéndose dentro de ALERTAS_COOLDOWN_SEGUNDOS desde
+su última ocurrencia, las repeticiones incrementan `ocurrencias` de la alerta
+abierta en lugar de insertar filas nuevas. Una repetición con un nivel de
+somnolencia mayor abre una alerta nueva. El estado vive en memoria: tras un
+reinicio la primera repetición simplemente abre una alerta nueva.
+"""
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy.orm import Session
+from app.config.settings import settings
+from app.utils.transacciones import al_confirmar
+import threading
+
+# Orden de los niveles de somnolencia para detectar escaladas
+NIVELES = {None: 0, "BAJO": 1, "MEDIO": 2, "ALTO": 3, "CRITICO": 4}
+
+
+class AlertaAbierta:
+    __slots__ = ("id_alerta", "nivel", "ultima_ocurrencia")
+    
+    def __init__(self, id_alerta: int, nivel: int, ultima_ocurrencia: datetime):
+        self.id_alerta = id_alerta
+        self.nivel = nivel
+        self.ultima_ocurrencia = ultima_ocurrencia
+
+
+class CooldownAlertas:
+    """Alertas abiertas por (viaje, tipo_alerta), con expulsión LRU"""
+    
+    def __init__(self):
+        self._abiertas: OrderedDict[tuple, AlertaAbierta] = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def __len__(self):
+        return len(self._abiertas)
+    
+    def limpiar(self):
+        with self._lock:
+            self._abiertas.clear()
+    
+    def descartar_viaje(self, viaje_id: int):
+        with self._lock:
+            for clave in [clave for clave in self._abiertas if clave[0] == viaje_id]:
+                del self._abiertas[clave]
+    
+    def abierta(self, clave: tuple, nivel: int, momento: datetime) -> Optional[AlertaAbierta]:
+        """Alerta abierta que absorbe una repetición de `clave` con `nivel` en `momento`, si la hay"""
+        with self._lock:
+            alerta = self._abiertas.get(clave)
+        if (
+            alerta is None
+            or nivel > alerta.nivel
+            or momento - alerta.ultima_ocurrencia > timedelta(seconds=settings.ALERTAS_COOLDOWN_SEGUNDOS)
+        ):
+            return None
+        return alerta
+    
+    def registrar(self, db: Session, abiertas: dict[tuple, AlertaAbierta]):
+        """Publica las alertas abiertas cuando se confirme la transacción de `db`"""
+        def _publicar():
+            with self._lock:
+                for clave, alerta in abiertas.items():
+                    actual = self._abiertas.get(clave)
+                    # Otra transacción pudo haber abierto una alerta de nivel mayor
+                    if actual is None or actual.id_alerta == alerta.id_alerta or alerta.nivel >= actual.nivel:
+                        self._abiertas[clave] = alerta
+                    self._abiertas.move_to_end(clave)
+                while len(self._abiertas) > settings.ALERTAS_COOLDOWN_MAX_CLAVES:
+                    self._abiertas.popitem(last=False)
+        
+        al_confirmar(db, _publicar)
+
+
+cooldown_alertas = CooldownAlertas()
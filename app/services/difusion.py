@@ -0,0 +1,116 @@
+"""
+Difusión en proceso de las alertas confirmadas a los suscriptores del stream SSE
+
+Cada suscriptor tiene una cola acotada en el event loop. Publicar nunca
+bloquea: si la cola de un suscriptor está llena se le desconecta (y podrá
+reanudar con Last-Event-ID) en lugar de frenar la ingesta. Al apagar el
+servidor se cierran todas las suscripciones para que los streams terminen.
+"""
+from typing import Optional
+from app.config.settings import settings
+import asyncio
+import logging
+import orjson
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class Suscriptor:
+    __slots__ = ("cola", "loop", "descartado")
+    
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.cola: asyncio.Queue = asyncio.Queue(maxsize=settings.SSE_COLA_MAX)
+        self.loop = loop
+        self.descartado = False
+    
+    def _entregar(self, evento: dict):
+        if self.descartado:
+            return
+        try:
+            self.cola.put_nowait(evento)
+        except asyncio.QueueFull:
+            # Consumidor lento: se le avisa que termine
+            self._cerrar()
+    
+    def _cerrar(self):
+        """Vacía la cola y deja el centinela None para que el stream termine"""
+        if self.descartado:
+            return
+        self.descartado = True
+        while not self.cola.empty():
+            self.cola.get_nowait()
+        self.cola.put_nowait(None)
+
+
+class DifusorAlertas:
+    def __init__(self):
+        self._suscriptores: set[Suscriptor] = set()
+        self._lock = threading.Lock()
+        self.cerrado = False
+    
+    def __len__(self):
+        return len(self._suscriptores)
+    
+    def suscribir(self) -> Suscriptor:
+        """Debe llamarse desde el event loop que consumirá la cola"""
+        suscriptor = Suscriptor(asyncio.get_running_loop())
+        with self._lock:
+            self._suscriptores.add(suscriptor)
+        if self.cerrado:
+            # El servidor se está apagando: el stream termina enseguida
+            suscriptor._cerrar()
+        return suscriptor
+    
+    def desuscribir(self, suscriptor: Suscriptor):
+        with self._lock:
+            self._suscriptores.discard(suscriptor)
+    
+    def publicar(self, alertas: list[dict]):
+        """Entrega las alertas a todos los suscriptores. Se puede llamar desde cualquier hilo"""
+        if not alertas:
+            return
+        with self._lock:
+            suscriptores = list(self._suscriptores)
+        for suscriptor in suscriptores:
+            for alerta in alertas:
+                try:
+                    suscriptor.loop.call_soon_threadsafe(suscriptor._entregar, alerta)
+                except RuntimeError:
+                    # El loop del suscriptor ya se cerró
+                    self.desuscribir(suscriptor)
+                    break
+
+
+    def cerrar(self):
+        """
+        Termina todos los streams (centinela None en cada cola). Se puede
+        llamar desde cualquier hilo o desde un manejador de señales
+        """
+        self.cerrado = True
+        with self._lock:
+            suscriptores = list(self._suscriptores)
+        for suscriptor in suscriptores:
+            try:
+                suscriptor.loop.call_soon_threadsafe(suscriptor._cerrar)
+            except RuntimeError:
+                self.desuscribir(suscriptor)
+    
+    def abrir(self):
+        self.cerrado = False
+
+
+def evento_sse(alerta: dict, evento: str = "alerta") -> str:
+    """Serializa una alerta como evento SSE con su id como id del evento"""
+    datos = orjson.dumps(alerta, option=orjson.OPT_UTC_Z).decode()
+    return f"id: {alerta['id_alerta']}\nevent: {evento}\ndata: {datos}\n\n"
+
+
+def parsear_ultimo_id(valor: Optional[str]) -> Optional[int]:
+    try:
+        return int(valor) if valor else None
+    except ValueError:
+        return None
+
+
+difusor_alertas = DifusorAlertas()
@@ -0,0 +1,154 @@
+"""
+Vista de flota: todos los viajes activos con su conductor, última lectura,
+nivel de riesgo actual y conteo de alertas
+
+Se calcula con dos consultas por conjuntos (viajes activos con su agregado y
+última lectura; alertas de esos viajes agrupadas por nivel) y se guarda en
+memoria FLOTA_CACHE_SEGUNDOS. Iniciar o finalizar un viaje y editar un
+conductor la invalidan; las lecturas y alertas nuevas se reflejan al expirar,
+así que cualquier cantidad de tableros cuesta una consulta por intervalo.
+"""
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import and_, func, select
+from sqlalchemy.orm import Session
+from app.config.database import ejecutar_con_sesion
+from app.config.settings import settings
+from app.models.models import AgregadoViaje, Alerta, Conductor, LecturaSensor, Viaje
+from app.schemas.schemas import FlotaResponse
+from app.services.cooldown import NIVELES
+import asyncio
+import time
+
+
+class FlotaService:
+    @staticmethod
+    def calcular(db: Session) -> dict:
+        """Arma la vista de flota desde la base"""
+        activos = select(Viaje.id_viaje).where(Viaje.fecha_fin == None).scalar_subquery()
+        filas = db.execute(
+            select(
+                Viaje.id_viaje,
+                Viaje.id_conductor,
+                Viaje.fecha_inicio,
+                Conductor.nombre,
+                AgregadoViaje.total_lecturas,
+                AgregadoViaje.total_alertas,
+                AgregadoViaje.ultima_alerta,
+                LecturaSensor,
+            )
+            .join(Conductor, Conductor.id_conductor == Viaje.id_conductor)
+            .outerjoin(AgregadoViaje, AgregadoViaje.id_viaje == Viaje.id_viaje)
+            # El timestamp permite descartar particiones con DB_PARTICIONADO
+            .outerjoin(LecturaSensor, and_(
+                LecturaSensor.id_lectura == AgregadoViaje.id_ultima_lectura,
+                LecturaSensor.timestamp == AgregadoViaje.ultima_lectura,
+            ))
+            .where(Viaje.fecha_fin == None)
+            .order_by(Viaje.id_viaje)
+        ).all()
+        
+        niveles = db.execute(
+            select(
+                Alerta.id_viaje,
+                Alerta.nivel_somnolencia,
+                func.count(Alerta.id_alerta),
+                func.max(func.coalesce(Alerta.ultima_ocurrencia, Alerta.timestamp)),
+            )
+            .where(Alerta.id_viaje.in_(activos))
+            .group_by(Alerta.id_viaje, Alerta.nivel_somnolencia)
+        ).all()
+        
+        # Nivel de riesgo: el mayor nivel con alguna alerta dentro de la ventana
+        desde = datetime.utcnow() - timedelta(seconds=settings.FLOTA_VENTANA_RIESGO_SEGUNDOS)
+        por_nivel: dict[int, dict[str, int]] = {}
+        riesgo: dict[int, Optional[str]] = {}
+        for id_viaje, nivel, total, ultima in niveles:
+            por_nivel.setdefault(id_viaje, {})[nivel or "SIN_NIVEL"] = total
+            if ultima is not None and ultima >= desde and NIVELES.get(nivel, 0) > NIVELES.get(riesgo.get(id_viaje), 0):
+                riesgo[id_viaje] = nivel
+        
+        viajes = []
+        for id_viaje, id_conductor, fecha_inicio, nombre, total_lecturas, total_alertas, ultima_alerta, lectura in filas:
+            viajes.append({
+                "id_viaje": id_viaje,
+                "id_conductor": id_conductor,
+                "nombre_conductor": nombre,
+                "fecha_inicio": fecha_inicio,
+                "total_lecturas": total_lecturas or 0,
+                "ultima_lectura": lectura,
+                "nivel_riesgo": riesgo.get(id_viaje),
+                "total_alertas": total_alertas or 0,
+                "alertas_por_nivel": por_nivel.get(id_viaje, {}),
+                "ultima_alerta": ultima_alerta,
+            })
+        
+        return {
+            "generado": datetime.utcnow(),
+            "total_viajes": len(viajes),
+            "viajes": viajes,
+        }
+
+
+class VistaFlota:
+    """Última vista de flota calculada, válida durante FLOTA_CACHE_SEGUNDOS"""
+    
+    def __init__(self):
+        self._vista: Optional[dict] = None
+        self._expira = 0.0
+        self._generacion = 0
+        # Cálculo en curso, compartido por las peticiones que encuentran la vista
+        # expirada, y la generación en la que empezó
+        self._calculo: Optional[asyncio.Future] = None
+        self._generacion_calculo = 0
+    
+    def vigente(self) -> Optional[dict]:
+        """La vista en memoria si no expiró ni fue invalidada"""
+        if self._vista is not None and time.monotonic() < self._expira:
+            return self._vista
+        return None
+    
+    async def obtener(self) -> dict:
+        """
+        Retorna la vista vigente o la recalcula. Las peticiones concurrentes
+        esperan un único cálculo (sin locks: todas corren en el event loop y la
+        consulta se hace en una sesión propia con ejecutar_con_sesion)
+        """
+        vista = self.vigente()
+        if vista is not None:
+            return vista
+        # Un cálculo que empezó antes de invalidar la vista no sirve a las nuevas peticiones
+        if self._calculo is None or self._generacion_calculo != self._generacion:
+            calculo = asyncio.ensure_future(self._recalcular(self._generacion))
+            self._calculo = calculo
+            self._generacion_calculo = self._generacion
+            calculo.add_done_callback(self._terminar_calculo)
+        # shield: si una petición se cancela, el cálculo sigue para las demás
+        return await asyncio.shield(self._calculo)
+    
+    async def _recalcular(self, generacion: int) -> dict:
+        vista = await ejecutar_con_sesion(self._calcular)
+        if generacion == self._generacion:
+            self._vista = vista
+            self._expira = time.monotonic() + settings.FLOTA_CACHE_SEGUNDOS
+        return vista
+    
+    def _terminar_calculo(self, calculo: asyncio.Future):
+        if self._calculo is calculo:
+            self._calculo = None
+        if not calculo.cancelled():
+            # Evita el aviso de excepción no recuperada si ninguna petición la esperaba
+            calculo.exception()
+    
+    @staticmethod
+    def _calcular(db: Session) -> dict:
+        # Se valida aquí, dentro de la sesión, para servir la vista ya serializable
+        return FlotaResponse.model_validate(FlotaService.calcular(db)).model_dump()
+    
+    def invalidar(self):
+        self._generacion += 1
+        self._vista = None
+        self._expira = 0.0
+
+
+vista_flota = VistaFlota()
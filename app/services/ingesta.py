@@ -0,0 +1,118 @@
+"""
+Ingesta diferida (write-behind) de lecturas
+
+Con INGESTA_DIFERIDA, POST /lecturas/ solo valida la lectura y la encola; un
+escritor de fondo la persiste junto con las demás en lotes (por tamaño o por
+intervalo) con LecturaSensorService.create_batch, que también ejecuta la
+detección de alertas sobre el lote. Al apagar la aplicación se vacía la cola.
+"""
+from typing import Optional
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from app.config.database import ejecutar_con_sesion
+from app.config.settings import settings
+from app.schemas.schemas import LecturaSensorCreate
+from app.services.micro_lotes import recolectar_lote
+from app.services.services import LecturaSensorService
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class EscritorDiferido:
+    def __init__(self):
+        self._cola: Optional[asyncio.Queue] = None
+        self._tarea: Optional[asyncio.Task] = None
+        # Encoladas y aún no persistidas, incluido el lote en curso
+        self._pendientes = 0
+        self.persistidas = 0
+        self.descartadas = 0
+        self.rechazadas = 0
+    
+    @property
+    def activo(self) -> bool:
+        return self._tarea is not None and not self._tarea.done()
+    
+    @property
+    def pendientes(self) -> int:
+        return self._pendientes
+    
+    def iniciar(self):
+        """Crea la cola y el escritor en el event loop actual"""
+        self._cola = asyncio.Queue(maxsize=settings.INGESTA_COLA_MAX)
+        self._pendientes = 0
+        self._tarea = asyncio.create_task(self._escribir())
+    
+    async def detener(self):
+        """Persiste lo que quede en la cola y termina el escritor"""
+        if not self.activo:
+            return
+        await self._cola.put(None)
+        await self._tarea
+    
+    def encolar(self, lecturas: list[LecturaSensorCreate]) -> bool:
+        """Encola las lecturas si caben todas. Retorna False si la cola está llena"""
+        if not self.activo or settings.INGESTA_COLA_MAX - self._pendientes < len(lecturas):
+            self.rechazadas += len(lecturas)
+            return False
+        for lectura in lecturas:
+            self._cola.put_nowait(lectura)
+        self._pendientes += len(lecturas)
+        return True
+    
+    async def _persistir(self, lecturas: list[LecturaSensorCreate]):
+        for intento in range(settings.INGESTA_REINTENTOS + 1):
+            try:
+                await ejecutar_con_sesion(LecturaSensorService.create_batch, lecturas)
+                self.persistidas += len(lecturas)
+                return
+            except IntegrityError:
+                # Una lectura inválida (p. ej. un viaje inexistente) no debe
+                # arrastrar al resto del lote: se reintenta por viaje
+                if len({lectura.id_viaje for lectura in lecturas}) > 1:
+                    await self._persistir_por_viaje(lecturas)
+                    return
+                break
+            except SQLAlchemyError as e:
+                logger.warning(f"Error al persistir {len(lecturas)} lecturas (intento {intento + 1}): {str(e)}")
+                await asyncio.sleep(min(2 ** intento * 0.1, 5))
+        
+        self.descartadas += len(lecturas)
+        logger.error(f"Se descartaron {len(lecturas)} lecturas del viaje {lecturas[0].id_viaje}")
+    
+    async def _persistir_por_viaje(self, lecturas: list[LecturaSensorCreate]):
+        por_viaje = {}
+        for lectura in lecturas:
+            por_viaje.setdefault(lectura.id_viaje, []).append(lectura)
+        for grupo in por_viaje.values():
+            await self._persistir(grupo)
+    
+    async def _escribir(self):
+        while True:
+            lote = await recolectar_lote(
+                self._cola, settings.INGESTA_LOTE_MAX, settings.INGESTA_LOTE_INTERVALO_MS / 1000
+            )
+            lecturas = [lectura for lectura in lote if lectura is not None]
+            if lecturas:
+                try:
+                    await self._persistir(lecturas)
+                except Exception as e:
+                    self.descartadas += len(lecturas)
+                    logger.error(f"Error inesperado en la ingesta diferida: {str(e)}")
+                finally:
+                    self._pendientes -= len(lecturas)
+            if lote[-1] is None:
+                return
+    
+    def resumen(self) -> dict:
+        return {
+            "activa": self.activo,
+            "pendientes": self.pendientes,
+            "capacidad": settings.INGESTA_COLA_MAX,
+            "persistidas": self.persistidas,
+            "descartadas": self.descartadas,
+            "rechazadas": self.rechazadas,
+        }
+
+
+escritor_diferido = EscritorDiferido()
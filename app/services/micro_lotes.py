@@ -0,0 +1,27 @@
+import asyncio
+
+
+async def recolectar_lote(cola: asyncio.Queue, max_elementos: int, intervalo: float) -> list:
+    """
+    Espera el primer elemento de la cola y sigue acumulando hasta reunir
+    max_elementos o hasta que pasen `intervalo` segundos desde el primero.
+    Un elemento None marca el fin del flujo: se incluye en el lote y corta la espera
+    """
+    loop = asyncio.get_running_loop()
+    lote = [await cola.get()]
+    limite = loop.time() + intervalo
+    
+    while lote[-1] is not None and len(lote) < max_elementos:
+        if not cola.empty():
+            lote.append(cola.get_nowait())
+            continue
+        
+        restante = limite - loop.time()
+        if restante <= 0:
+            break
+        try:
+            lote.append(await asyncio.wait_for(cola.get(), restante))
+        except asyncio.TimeoutError:
+            break
+    
+    return lote
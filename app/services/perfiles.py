@@ -0,0 +1,193 @@
+"""
+Perfiles de umbrales por conductor
+
+Los umbrales de las reglas se ajustan, en este orden, por la condición médica
+del conductor (PERFILES_CONDICION), por su horario de riesgo "HH:MM-HH:MM"
+(PERFIL_HORARIO_RIESGO, aplicado a las lecturas dentro de ese horario, en la
+hora local de ZONA_HORARIA) y por los umbrales propios guardados en el conductor.
+El perfil de cada viaje se resuelve una vez y queda en caché; ConductorService
+invalida los viajes del conductor al modificarlo o eliminarlo.
+"""
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Optional
+from zoneinfo import ZoneInfo
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.config.settings import settings
+from app.models.models import Conductor, Viaje
+from app.services.reglas import MotorReglas, motor_para, motor_reglas, umbrales_globales, UMBRALES
+import re
+import threading
+import unicodedata
+
+HORARIO = re.compile(r"^\s*(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*$")
+
+
+def _normalizar(texto: str) -> str:
+    return unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode().lower()
+
+
+def _parsear_horario(horario: Optional[str]) -> Optional[tuple[int, int]]:
+    """Minutos del día de inicio y fin de un horario "HH:MM-HH:MM", o None si no tiene ese formato"""
+    coincidencia = HORARIO.match(horario or "")
+    if not coincidencia:
+        return None
+    h1, m1, h2, m2 = map(int, coincidencia.groups())
+    if h1 > 23 or h2 > 23 or m1 > 59 or m2 > 59:
+        return None
+    return h1 * 60 + m1, h2 * 60 + m2
+
+
+class PerfilConductor:
+    __slots__ = ("motor", "motor_riesgo", "horario", "zona")
+    
+    def __init__(
+        self, motor: MotorReglas, motor_riesgo: MotorReglas = None, horario: tuple = None, zona: ZoneInfo = None
+    ):
+        self.motor = motor
+        self.motor_riesgo = motor_riesgo
+        self.horario = horario
+        self.zona = zona
+    
+    def motor_en(self, momento: Optional[datetime]) -> MotorReglas:
+        """Motor que corresponde a una lectura tomada en `momento`"""
+        if self.horario is None or momento is None:
+            return self.motor
+        if self.zona is not None:
+            # Las lecturas guardan la hora UTC sin zona; el horario es hora local
+            if momento.tzinfo is None:
+                momento = momento.replace(tzinfo=timezone.utc)
+            momento = momento.astimezone(self.zona)
+        minuto = momento.hour * 60 + momento.minute
+        inicio, fin = self.horario
+        en_riesgo = inicio <= minuto < fin if inicio <= fin else (minuto >= inicio or minuto < fin)
+        return self.motor_riesgo if en_riesgo else self.motor
+    
+    @classmethod
+    def desde_conductor(cls, condicion_medica: Optional[str], horario_riesgo: Optional[str], umbrales: Optional[dict]):
+        base = umbrales_globales()
+        if condicion_medica:
+            condicion = _normalizar(condicion_medica)
+            for clave, ajustes in settings.PERFILES_CONDICION.items():
+                if _normalizar(clave) in condicion:
+                    base.update(ajustes)
+        propios = {nombre: valor for nombre, valor in (umbrales or {}).items() if nombre in UMBRALES}
+        
+        horario = _parsear_horario(horario_riesgo)
+        motor = motor_para({**base, **propios})
+        if horario is None:
+            return cls(motor)
+        motor_riesgo = motor_para({**base, **settings.PERFIL_HORARIO_RIESGO, **propios})
+        return cls(motor, motor_riesgo, horario, ZoneInfo(settings.ZONA_HORARIA))
+
+
+PERFIL_GLOBAL = PerfilConductor(motor_reglas)
+
+
+class ResolutorPerfiles:
+    """Caché LRU viaje -> perfil del conductor, invalidable por conductor"""
+    
+    def __init__(self):
+        self._por_viaje: OrderedDict[int, tuple[int, PerfilConductor]] = OrderedDict()
+        self._viajes_por_conductor: dict[int, set[int]] = {}
+        # Aumenta con cada invalidación: un perfil leído antes no se guarda
+        self._generacion = 0
+        self._lock = threading.Lock()
+    
+    def __len__(self):
+        return len(self._por_viaje)
+    
+    def limpiar(self):
+        with self._lock:
+            self._generacion += 1
+            self._por_viaje.clear()
+            self._viajes_por_conductor.clear()
+    
+    def _quitar(self, viaje_id: int):
+        entrada = self._por_viaje.pop(viaje_id, None)
+        if entrada:
+            viajes = self._viajes_por_conductor.get(entrada[0])
+            if viajes is not None:
+                viajes.discard(viaje_id)
+                if not viajes:
+                    del self._viajes_por_conductor[entrada[0]]
+    
+    def descartar_viaje(self, viaje_id: int):
+        with self._lock:
+            self._generacion += 1
+            self._quitar(viaje_id)
+    
+    def invalidar_conductor(self, conductor_id: int):
+        with self._lock:
+            self._generacion += 1
+            for viaje_id in list(self._viajes_por_conductor.get(conductor_id, ())):
+                self._quitar(viaje_id)
+    
+    def resolver(self, db: Session, viaje_ids) -> dict[int, PerfilConductor]:
+        """Perfiles de los viajes; solo consulta la base por los que no están en caché"""
+        perfiles = {}
+        with self._lock:
+            generacion = self._generacion
+            for viaje_id in viaje_ids:
+                entrada = self._por_viaje.get(viaje_id)
+                if entrada:
+                    self._por_viaje.move_to_end(viaje_id)
+                    perfiles[viaje_id] = entrada[1]
+        
+        faltantes = [viaje_id for viaje_id in viaje_ids if viaje_id not in perfiles]
+        if not faltantes:
+            return perfiles
+        
+        filas = db.execute(
+            select(
+                Viaje.id_viaje,
+                Conductor.id_conductor,
+                Conductor.condicion_medica,
+                Conductor.horario_riesgo,
+                Conductor.umbrales,
+            )
+            .join(Conductor, Conductor.id_conductor == Viaje.id_conductor)
+            .where(Viaje.id_viaje.in_(faltantes))
+        ).all()
+        with self._lock:
+            # Si hubo una invalidación durante la consulta los perfiles sirven
+            # para este lote, pero no se guardan en caché
+            guardar = generacion == self._generacion
+            for viaje_id, conductor_id, condicion, horario, umbrales in filas:
+                perfil = PerfilConductor.desde_conductor(condicion, horario, umbrales)
+                perfiles[viaje_id] = perfil
+                if guardar:
+                    self._por_viaje[viaje_id] = (conductor_id, perfil)
+                    self._viajes_por_conductor.setdefault(conductor_id, set()).add(viaje_id)
+            while len(self._por_viaje) > settings.PERFILES_CACHE_VIAJES:
+                self._quitar(next(iter(self._por_viaje)))
+        
+        for viaje_id in faltantes:
+            perfiles.setdefault(viaje_id, PERFIL_GLOBAL)
+        return perfiles
+    
+    def evaluar_lote(self, db: Session, lecturas: list) -> list[tuple[int, str, Optional[str]]]:
+        """
+        Evalúa cada lectura con el motor del perfil de su viaje.
+        Retorna (índice de la lectura, tipo_alerta, nivel) en orden de lectura
+        """
+        perfiles = self.resolver(db, {lectura.id_viaje for lectura in lecturas})
+        grupos: dict[MotorReglas, list[int]] = {}
+        for indice, lectura in enumerate(lecturas):
+            motor = perfiles[lectura.id_viaje].motor_en(lectura.timestamp)
+            grupos.setdefault(motor, []).append(indice)
+        
+        if len(grupos) == 1:
+            (motor,) = grupos
+            return motor.evaluar_lote(lecturas)
+        
+        resultados = []
+        for motor, indices in grupos.items():
+            for j, tipo, nivel in motor.evaluar_lote([lecturas[i] for i in indices]):
+                resultados.append((indices[j], tipo, nivel))
+        resultados.sort(key=lambda resultado: resultado[0])
+        return resultados
+
+
+resolutor_perfiles = ResolutorPerfiles()
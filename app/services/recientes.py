@@ -0,0 +1,111 @@
+"""
+Buffer en memoria con las alertas más recientes del sistema
+
+Se alimenta desde el camino de escritura (al confirmarse cada transacción) y
+se precarga desde la base al iniciar la aplicación, de modo que
+/alertas/recientes no consulta la base. Con varios procesos de la API cada
+uno mantiene su propio buffer; RECIENTES_SINCRONIZAR_SEGUNDOS hace que cada
+proceso incorpore periódicamente las alertas escritas por los demás.
+Las alertas nuevas confirmadas también se difunden al stream SSE.
+"""
+from bisect import bisect_right, insort
+from typing import Optional
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.config.settings import settings
+from app.models.models import Alerta
+from app.schemas.schemas import AlertaResponse
+from app.services.difusion import difusor_alertas
+from app.utils.transacciones import al_confirmar
+import threading
+
+
+def _instantanea(alerta) -> dict:
+    return AlertaResponse.model_validate(alerta, from_attributes=True).model_dump()
+
+
+class AlertasRecientes:
+    """Últimas RECIENTES_CAPACIDAD alertas ordenadas por id_alerta"""
+    
+    def __init__(self):
+        self._ids: list[int] = []
+        self._por_id: dict[int, dict] = {}
+        self._lock = threading.Lock()
+        self.cargado = False
+    
+    def __len__(self):
+        return len(self._ids)
+    
+    @property
+    def ultimo_id(self) -> int:
+        return self._ids[-1] if self._ids else 0
+    
+    def _agregar(self, instantaneas: list[dict]):
+        with self._lock:
+            for alerta in instantaneas:
+                id_alerta = alerta["id_alerta"]
+                if id_alerta not in self._por_id:
+                    if self._ids and len(self._ids) >= settings.RECIENTES_CAPACIDAD and id_alerta < self._ids[0]:
+                        continue
+                    insort(self._ids, id_alerta)
+                self._por_id[id_alerta] = alerta
+            sobrantes = len(self._ids) - settings.RECIENTES_CAPACIDAD
+            if sobrantes > 0:
+                for id_alerta in self._ids[:sobrantes]:
+                    del self._por_id[id_alerta]
+                del self._ids[:sobrantes]
+    
+    def _actualizar(self, repeticiones: dict[int, tuple]):
+        with self._lock:
+            for id_alerta, (cantidad, ultima) in repeticiones.items():
+                alerta = self._por_id.get(id_alerta)
+                if alerta:
+                    self._por_id[id_alerta] = {
+                        **alerta,
+                        "ocurrencias": alerta["ocurrencias"] + cantidad,
+                        "ultima_ocurrencia": ultima,
+                    }
+    
+    def publicar(self, db: Session, alertas: list, repeticiones: Optional[dict[int, tuple]] = None):
+        """
+        Agrega las alertas (filas u objetos Alerta) y las repeticiones
+        {id_alerta: (cantidad, última ocurrencia)} cuando se confirme la transacción
+        """
+        instantaneas = [_instantanea(alerta) for alerta in alertas]
+        
+        def _publicar():
+            self._agregar(instantaneas)
+            if repeticiones:
+                self._actualizar(repeticiones)
+            difusor_alertas.publicar(instantaneas)
+        
+        al_confirmar(db, _publicar)
+    
+    def listar(self, limit: int = 10, since_id: Optional[int] = None) -> list[dict]:
+        """Alertas de la más reciente a la más antigua, solo las posteriores a `since_id` si se indica"""
+        with self._lock:
+            inicio = bisect_right(self._ids, since_id) if since_id is not None else 0
+            inicio = max(inicio, len(self._ids) - limit)
+            return [self._por_id[id_alerta] for id_alerta in reversed(self._ids[inicio:])]
+    
+    def cubre(self, limit: int) -> bool:
+        """
+        Si el buffer puede responder sin ir a la base: está precargado y guarda
+        al menos `limit` alertas (o todas las que existen)
+        """
+        return self.cargado and limit <= settings.RECIENTES_CAPACIDAD
+    
+    def sincronizar(self, db: Session) -> int:
+        """Incorpora desde la base las alertas posteriores a la última del buffer. Retorna cuántas"""
+        filas = db.execute(
+            select(Alerta.__table__)
+            .where(Alerta.id_alerta > self.ultimo_id)
+            .order_by(Alerta.id_alerta.desc())
+            .limit(settings.RECIENTES_CAPACIDAD)
+        ).all()
+        self._agregar([_instantanea(fila) for fila in filas])
+        self.cargado = True
+        return len(filas)
+
+
+alertas_recientes = AlertasRecientes()
@@ -0,0 +1,195 @@
+"""
+Motor de reglas de alertas declaradas como datos
+
+Cada regla tiene un tipo de alerta y una lista de niveles, del más grave al
+más leve; se emite el primer nivel cuyas condiciones se cumplen:
+
+    {"tipo_alerta": "SOMNOLENCIA_CABECEOS", "niveles": [
+        {"nivel": "ALTO", "condiciones": [{"campo": "conteo_cabeceos", "comparador": ">=", "umbral": 6}]},
+        {"nivel": "MEDIO", "combinacion": "todas", "condiciones": [...]}
+    ]}
+
+`combinacion` es "todas" (por defecto) o "alguna". El umbral puede ser un
+número o el nombre de uno de UMBRALES (opcionalmente con "factor"), que se
+resuelve con los umbrales del perfil del conductor al compilar.
+Las reglas se compilan una sola vez por perfil a una función Python que
+recorre las columnas de un lote completo en una sola pasada. Sin
+REGLAS_ARCHIVO se usan las reglas equivalentes a los umbrales de Settings.
+"""
+from functools import lru_cache
+from typing import Iterable, Optional
+from app.config.settings import settings
+import json
+import math
+import re
+
+CAMPOS = ("percios", "frecuencia_cardiaca", "conteo_cabeceos", "conteo_bostezos")
+COMPARADORES = ("<", "<=", ">", ">=", "==", "!=")
+COMBINACIONES = {"todas": " and ", "alguna": " or "}
+# Umbrales con nombre que las reglas pueden referenciar y los perfiles ajustar
+UMBRALES = (
+    "UMBRAL_FRECUENCIA_CARDIACA_MIN",
+    "UMBRAL_FRECUENCIA_CARDIACA_MAX",
+    "UMBRAL_CABECEOS",
+    "UMBRAL_BOSTEZOS",
+)
+
+
+def _condicion(campo: str, comparador: str, umbral, factor: float = 1) -> dict:
+    condicion = {"campo": campo, "comparador": comparador, "umbral": umbral}
+    if factor != 1:
+        condicion["factor"] = factor
+    return condicion
+
+
+def umbrales_globales() -> dict[str, float]:
+    return {nombre: getattr(settings, nombre) for nombre in UMBRALES}
+
+
+def reglas_por_defecto() -> list[dict]:
+    """Reglas equivalentes a los umbrales configurados en Settings"""
+    cabeceos = _condicion("conteo_cabeceos", ">=", "UMBRAL_CABECEOS")
+    bostezos = _condicion("conteo_bostezos", ">=", "UMBRAL_BOSTEZOS")
+    return [
+        {"tipo_alerta": "FRECUENCIA_CARDIACA_BAJA", "niveles": [
+            {"nivel": "MEDIO", "condiciones": [
+                _condicion("frecuencia_cardiaca", "<", "UMBRAL_FRECUENCIA_CARDIACA_MIN"),
+            ]},
+        ]},
+        {"tipo_alerta": "FRECUENCIA_CARDIACA_ALTA", "niveles": [
+            {"nivel": "BAJO", "condiciones": [
+                _condicion("frecuencia_cardiaca", ">", "UMBRAL_FRECUENCIA_CARDIACA_MAX"),
+            ]},
+        ]},
+        {"tipo_alerta": "SOMNOLENCIA_CABECEOS", "niveles": [
+            {"nivel": "ALTO", "condiciones": [
+                _condicion("conteo_cabeceos", ">=", "UMBRAL_CABECEOS", factor=2),
+            ]},
+            {"nivel": "MEDIO", "condiciones": [cabeceos]},
+        ]},
+        {"tipo_alerta": "FATIGA_BOSTEZOS", "niveles": [
+            {"nivel": "ALTO", "condiciones": [
+                _condicion("conteo_bostezos", ">=", "UMBRAL_BOSTEZOS", factor=2),
+            ]},
+            {"nivel": "MEDIO", "condiciones": [bostezos]},
+        ]},
+        {"tipo_alerta": "PELIGRO_CRITICO", "niveles": [
+            {"nivel": "CRITICO", "combinacion": "todas", "condiciones": [cabeceos, bostezos]},
+        ]},
+    ]
+
+
+def cargar_reglas(ruta: Optional[str] = None) -> list[dict]:
+    """Reglas del archivo JSON indicado (o REGLAS_ARCHIVO), o las reglas por defecto"""
+    ruta = ruta or settings.REGLAS_ARCHIVO
+    if not ruta:
+        return reglas_por_defecto()
+    with open(ruta, encoding="utf-8") as archivo:
+        return json.load(archivo)
+
+
+class MotorReglas:
+    """Evaluador compilado de un conjunto de reglas"""
+    
+    def __init__(self, reglas: list[dict], umbrales: Optional[dict[str, float]] = None):
+        self.umbrales = umbrales_globales() if umbrales is None else umbrales
+        # (tipo_alerta, nivel) de cada resultado que puede emitir el evaluador
+        self.resultados: list[tuple[str, Optional[str]]] = []
+        self.campos: list[str] = []
+        self.fuente = self._generar(reglas)
+        espacio = {}
+        exec(compile(self.fuente, "<reglas de alertas>", "exec"), espacio)
+        self._evaluar = espacio["evaluar"]
+        self._evaluar_fila = espacio["evaluar_fila"]
+    
+    def _expresion(self, condicion: dict) -> str:
+        campo, comparador, umbral = condicion.get("campo"), condicion.get("comparador"), condicion.get("umbral")
+        if campo not in CAMPOS:
+            raise ValueError(f"Campo de regla desconocido: {campo!r}")
+        if isinstance(umbral, str):
+            if umbral not in self.umbrales:
+                raise ValueError(f"Umbral desconocido en la regla de {campo}: {umbral!r}")
+            umbral = self.umbrales[umbral] * condicion.get("factor", 1)
+        if comparador not in COMPARADORES:
+            raise ValueError(f"Comparador de regla desconocido: {comparador!r}")
+        if isinstance(umbral, bool) or not isinstance(umbral, (int, float)) or not math.isfinite(umbral):
+            raise ValueError(f"El umbral de {campo} debe ser numérico: {umbral!r}")
+        if campo not in self.campos:
+            self.campos.append(campo)
+        return f"({campo} is not None and {campo} {comparador} {umbral!r})"
+    
+    def _generar(self, reglas: list[dict]) -> str:
+        cuerpo = []
+        for regla in reglas:
+            tipo = regla.get("tipo_alerta")
+            if not tipo or not regla.get("niveles"):
+                raise ValueError(f"Regla sin tipo_alerta o sin niveles: {regla!r}")
+            for posicion, nivel in enumerate(regla["niveles"]):
+                combinacion = nivel.get("combinacion", "todas")
+                if combinacion not in COMBINACIONES or not nivel.get("condiciones"):
+                    raise ValueError(f"Nivel inválido en la regla {tipo}: {nivel!r}")
+                expresion = COMBINACIONES[combinacion].join(
+                    self._expresion(condicion) for condicion in nivel["condiciones"]
+                )
+                self.resultados.append((tipo, nivel.get("nivel")))
+                sentencia = "if" if posicion == 0 else "elif"
+                cuerpo.append(f"{sentencia} {expresion}: agregar(RESULTADO{len(self.resultados) - 1})")
+        
+        if not cuerpo:
+            return "def evaluar(columnas):\n    return []\n\ndef evaluar_fila(lectura):\n    return []\n"
+        campos = ", ".join(self.campos)
+        # Misma lógica sobre un lote en columnas (índice de fila, resultado) y sobre una sola fila
+        por_lote = "\n".join("        " + re.sub(r"RESULTADO(\d+)", r"(i, \1)", linea) for linea in cuerpo)
+        por_fila = "\n".join("    " + re.sub(r"RESULTADO(\d+)", r"\1", linea) for linea in cuerpo)
+        return (
+            "def evaluar(columnas):\n"
+            "    resultado = []\n"
+            "    agregar = resultado.append\n"
+            f"    for i, ({campos},) in enumerate(zip({', '.join(f'columnas[{c!r}]' for c in self.campos)})):\n"
+            f"{por_lote}\n"
+            "    return resultado\n\n"
+            "def evaluar_fila(lectura):\n"
+            "    resultado = []\n"
+            "    agregar = resultado.append\n"
+            + "".join(f"    {campo} = lectura.{campo}\n" for campo in self.campos)
+            + f"{por_fila}\n"
+            "    return resultado\n"
+        )
+    
+    def evaluar_columnas(self, columnas: dict[str, list]) -> list[tuple[int, str, Optional[str]]]:
+        """
+        Evalúa todas las filas de un lote en formato columnar ({campo: valores}).
+        Retorna (índice de la fila, tipo_alerta, nivel) de cada alerta, en orden de fila
+        """
+        return [(i, *self.resultados[r]) for i, r in self._evaluar(columnas)]
+    
+    def evaluar_lote(self, lecturas: Iterable) -> list[tuple[int, str, Optional[str]]]:
+        """Evalúa objetos/filas con los atributos de LecturaSensor"""
+        lecturas = list(lecturas)
+        return self.evaluar_columnas({
+            campo: [getattr(lectura, campo) for lectura in lecturas] for campo in self.campos
+        })
+    
+    def evaluar(self, lectura) -> list[tuple[str, Optional[str]]]:
+        """Evalúa una sola lectura. Retorna (tipo_alerta, nivel) de cada alerta"""
+        indices = self._evaluar_fila(lectura)
+        if not indices:
+            return indices
+        resultados = self.resultados
+        return [resultados[r] for r in indices]
+
+
+REGLAS = cargar_reglas()
+
+
+@lru_cache(maxsize=256)
+def _motor_para(umbrales: tuple) -> MotorReglas:
+    return MotorReglas(REGLAS, dict(umbrales))
+
+
+def motor_para(umbrales: dict[str, float]) -> MotorReglas:
+    """Motor compilado para unos umbrales; se compila una vez por combinación distinta"""
+    return _motor_para(tuple(sorted(umbrales.items())))
+
+
+motor_reglas = motor_para(umbrales_globales())
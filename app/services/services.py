@@ -1,24 +1,80 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from app.models.models import Conductor, Viaje, LecturaSensor, Alerta
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import Integer, cast, func, select
+from app.models.models import Conductor, Viaje, LecturaSensor, Alerta, AgregadoViaje
 from app.schemas.schemas import (
     ConductorCreate,
     ConductorUpdate,
     ViajeCreate,
     LecturaSensorCreate,
+    LecturaSensorResponse,
     AlertaCreate,
+    AlertaResponse,
 )
-from datetime import datetime
+from app.config.settings import settings
+from app.services.alerta_detector import AlertaAutoDetector
+from app.services.ventanas import detector_ventanas
+from app.services.cooldown import cooldown_alertas
+from app.services.perfiles import resolutor_perfiles
+from app.services.recientes import alertas_recientes
+from app.services.flota import vista_flota
+from app.services.agregados import AgregadoViajeService
+from app.services.archivo import ArchivoService
+from app.utils.insercion import insertar_retornando
+from app.utils.paginacion import decodificar_cursor, despues_de
+from app.utils.respuestas import columnas, como_dicts
+from app.utils.series import lttb
+from datetime import datetime, timedelta
 from typing import Optional
+import math
+
+# Época para convertir el número de bucket en la fecha de inicio del intervalo
+EPOCA = datetime(1970, 1, 1)
+
+# Cuántos buckets candidatos se calculan por cada punto final en modo max_puntos
+FACTOR_CANDIDATOS_LTTB = 4
+
+
+def _rango_particiones(db: Session, viaje_id: int) -> list:
+    """
+    Con DB_PARTICIONADO, acota las lecturas del viaje al rango de timestamps de
+    su agregado para que PostgreSQL descarte las particiones que no lo contienen
+    """
+    if not settings.DB_PARTICIONADO:
+        return []
+    agregado = db.get(AgregadoViaje, viaje_id)
+    if not agregado or agregado.primera_lectura is None:
+        return []
+    return [
+        LecturaSensor.timestamp >= agregado.primera_lectura,
+        LecturaSensor.timestamp <= agregado.ultima_lectura,
+    ]
+
+
+def _bucket_tiempo(db: Session, columna, segundos: int):
+    """Expresión SQL con el número de intervalo de `segundos` al que pertenece `columna`"""
+    if db.get_bind().dialect.name == "sqlite":
+        return cast(func.strftime("%s", columna), Integer) / segundos
+    return func.floor(func.extract("epoch", columna) / segundos)
 
 
 class ConductorService:
     @staticmethod
-    def get_all(db: Session, skip: int = 0, limit: int = 100, activo: Optional[bool] = None):
+    def get_all(
+        db: Session,
+        skip: int = 0,
+        limit: int = 100,
+        activo: Optional[bool] = None,
+        cursor: Optional[str] = None,
+    ):
         query = db.query(Conductor)
         if activo is not None:
             query = query.filter(Conductor.activo == activo)
-        return query.offset(skip).limit(limit).all()
+        if cursor:
+            query = query.filter(
+                despues_de([Conductor.id_conductor], decodificar_cursor(cursor, int), descendente=False)
+            )
+            return query.order_by(Conductor.id_conductor).limit(limit).all()
+        return query.order_by(Conductor.id_conductor).offset(skip).limit(limit).all()
     
     @staticmethod
     def get_by_id(db: Session, conductor_id: int):
@@ -41,6 +97,8 @@ class ConductorService:
                 setattr(db_conductor, key, value)
             db.commit()
             db.refresh(db_conductor)
+            resolutor_perfiles.invalidar_conductor(conductor_id)
+            vista_flota.invalidar()
         return db_conductor
     
     @staticmethod
@@ -49,21 +107,91 @@ class ConductorService:
         if db_conductor:
             db.delete(db_conductor)
             db.commit()
+            resolutor_perfiles.invalidar_conductor(conductor_id)
+            vista_flota.invalidar()
         return db_conductor
 
 
 class ViajeService:
     @staticmethod
-    def get_all(db: Session, skip: int = 0, limit: int = 100, conductor_id: Optional[int] = None):
+    def get_all(
+        db: Session,
+        skip: int = 0,
+        limit: int = 100,
+        conductor_id: Optional[int] = None,
+        cursor: Optional[str] = None,
+    ):
         query = db.query(Viaje)
         if conductor_id:
             query = query.filter(Viaje.id_conductor == conductor_id)
-        return query.order_by(Viaje.fecha_inicio.desc()).offset(skip).limit(limit).all()
+        query = query.order_by(Viaje.fecha_inicio.desc(), Viaje.id_viaje.desc())
+        if cursor:
+            valores = decodificar_cursor(cursor, datetime, int)
+            return query.filter(
+                despues_de([Viaje.fecha_inicio, Viaje.id_viaje], valores)
+            ).limit(limit).all()
+        return query.offset(skip).limit(limit).all()
     
     @staticmethod
     def get_by_id(db: Session, viaje_id: int):
         return db.query(Viaje).filter(Viaje.id_viaje == viaje_id).first()
     
+    @staticmethod
+    def get_detalle(
+        db: Session,
+        viaje_id: int,
+        limite_lecturas: Optional[int] = 100,
+        limite_alertas: Optional[int] = 100,
+    ):
+        """
+        Viaje con su conductor (joinedload) y una ventana de sus lecturas y
+        alertas más recientes, junto con el total de cada una.
+        Un límite None trae el historial completo
+        """
+        fila = db.query(Viaje, AgregadoViaje).outerjoin(
+            AgregadoViaje, AgregadoViaje.id_viaje == Viaje.id_viaje
+        ).options(joinedload(Viaje.conductor)).filter(Viaje.id_viaje == viaje_id).first()
+        if not fila:
+            return None
+        viaje, agregado = fila
+        
+        lecturas = db.query(LecturaSensor).filter(
+            LecturaSensor.id_viaje == viaje_id, *_rango_particiones(db, viaje_id)
+        ).order_by(LecturaSensor.timestamp.desc(), LecturaSensor.id_lectura.desc())
+        alertas = db.query(Alerta).filter(
+            Alerta.id_viaje == viaje_id
+        ).order_by(Alerta.timestamp.desc(), Alerta.id_alerta.desc())
+        
+        if agregado:
+            total_lecturas, total_alertas = agregado.total_lecturas, agregado.total_alertas
+        else:
+            total_lecturas = db.query(func.count(LecturaSensor.id_lectura)).filter(
+                LecturaSensor.id_viaje == viaje_id
+            ).scalar()
+            total_alertas = db.query(func.count(Alerta.id_alerta)).filter(
+                Alerta.id_viaje == viaje_id
+            ).scalar()
+        
+        lecturas = lecturas.limit(limite_lecturas).all()
+        if not lecturas and viaje.fecha_fin is not None:
+            archivo = ArchivoService.get_archivo(db, viaje_id)
+            if archivo:
+                lecturas = archivo.pagina(0, limite_lecturas)
+                if not agregado:
+                    total_lecturas = archivo.total
+        
+        return {
+            "id_viaje": viaje.id_viaje,
+            "id_conductor": viaje.id_conductor,
+            "fecha_inicio": viaje.fecha_inicio,
+            "fecha_fin": viaje.fecha_fin,
+            "conductor": viaje.conductor,
+            "lecturas": lecturas,
+            "alertas": alertas.limit(limite_alertas).all(),
+            "total_lecturas": total_lecturas or 0,
+            "total_alertas": total_alertas or 0,
+        }
+    
     @staticmethod
     def get_active_by_conductor(db: Session, conductor_id: int):
         """Obtiene el viaje activo (sin fecha_fin) de un conductor"""
@@ -83,6 +211,7 @@ class ViajeService:
         db.add(db_viaje)
         db.commit()
         db.refresh(db_viaje)
+        vista_flota.invalidar()
         return db_viaje
     
     @staticmethod
@@ -92,13 +221,44 @@ class ViajeService:
             db_viaje.fecha_fin = fecha_fin
             db.commit()
             db.refresh(db_viaje)
+            detector_ventanas.descartar(viaje_id)
+            cooldown_alertas.descartar_viaje(viaje_id)
+            resolutor_perfiles.descartar_viaje(viaje_id)
+            vista_flota.invalidar()
         return db_viaje
     
     @staticmethod
     def get_estadisticas(db: Session, viaje_id: int):
-        viaje = db.query(Viaje).filter(Viaje.id_viaje == viaje_id).first()
-        if not viaje:
+        """
+        Estadísticas del viaje leídas de su agregado (una búsqueda por clave primaria).
+        Si el viaje no tiene agregado (viajes sin lecturas o anteriores a los
+        agregados) se calculan desde las filas
+        """
+        fila = db.query(Viaje, AgregadoViaje).outerjoin(
+            AgregadoViaje, AgregadoViaje.id_viaje == Viaje.id_viaje
+        ).filter(Viaje.id_viaje == viaje_id).first()
+        if not fila:
             return None
+        viaje, agregado = fila
+        
+        # Calcular duración
+        duracion_minutos = None
+        if viaje.fecha_fin:
+            duracion = viaje.fecha_fin - viaje.fecha_inicio
+            duracion_minutos = duracion.total_seconds() / 60
+        
+        if agregado:
+            return {
+                "id_viaje": viaje_id,
+                "total_lecturas": agregado.total_lecturas,
+                "total_alertas": agregado.total_alertas,
+                "frecuencia_cardiaca_promedio": (
+                    agregado.suma_fc / agregado.lecturas_con_fc if agregado.lecturas_con_fc else None
+                ),
+                "total_cabeceos": agregado.total_cabeceos,
+                "total_bostezos": agregado.total_bostezos,
+                "duracion_minutos": duracion_minutos
+            }
         
         # Obtener estadísticas de lecturas
         lecturas_stats = db.query(
@@ -113,11 +273,20 @@ class ViajeService:
             Alerta.id_viaje == viaje_id
         ).scalar()
         
-        # Calcular duración
-        duracion_minutos = None
-        if viaje.fecha_fin:
-            duracion = viaje.fecha_fin - viaje.fecha_inicio
-            duracion_minutos = duracion.total_seconds() / 60
+        archivo = ArchivoService.get_archivo(db, viaje_id) if not lecturas_stats.total_lecturas else None
+        if archivo:
+            totales = archivo.agregado()
+            return {
+                "id_viaje": viaje_id,
+                "total_lecturas": totales["total_lecturas"],
+                "total_alertas": total_alertas or 0,
+                "frecuencia_cardiaca_promedio": (
+                    totales["suma_fc"] / totales["lecturas_con_fc"] if totales["lecturas_con_fc"] else None
+                ),
+                "total_cabeceos": totales["total_cabeceos"],
+                "total_bostezos": totales["total_bostezos"],
+                "duracion_minutos": duracion_minutos
+            }
         
         return {
             "id_viaje": viaje_id,
@@ -132,31 +301,182 @@ class ViajeService:
 
 class LecturaSensorService:
     @staticmethod
-    def get_all(db: Session, viaje_id: int, skip: int = 0, limit: int = 100):
-        return db.query(LecturaSensor).filter(
-            LecturaSensor.id_viaje == viaje_id
-        ).order_by(LecturaSensor.timestamp.desc()).offset(skip).limit(limit).all()
+    def get_all(
+        db: Session,
+        viaje_id: int,
+        skip: int = 0,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        filas: bool = False,
+    ):
+        """
+        Lecturas del viaje de la más reciente a la más antigua.
+        Con `cursor` pagina por keyset sobre (timestamp, id_lectura) e ignora `skip`.
+        Si el viaje no tiene lecturas en la tabla se leen de su archivo.
+        Con `filas` se devuelven dicts de LecturaSensorResponse en lugar de entidades
+        """
+        entidades = columnas(LecturaSensor, LecturaSensorResponse) if filas else [LecturaSensor]
+        query = db.query(*entidades).filter(
+            LecturaSensor.id_viaje == viaje_id, *_rango_particiones(db, viaje_id)
+        ).order_by(LecturaSensor.timestamp.desc(), LecturaSensor.id_lectura.desc())
+        valores = decodificar_cursor(cursor, datetime, int) if cursor else None
+        if valores:
+            lecturas = query.filter(
+                despues_de([LecturaSensor.timestamp, LecturaSensor.id_lectura], valores)
+            ).limit(limit).all()
+        else:
+            lecturas = query.offset(skip).limit(limit).all()
+        
+        if not lecturas:
+            archivo = ArchivoService.get_archivo(db, viaje_id)
+            if archivo:
+                lecturas = archivo.pagina(skip, limit, valores)
+        return como_dicts(lecturas, LecturaSensorResponse) if filas else lecturas
     
     @staticmethod
     def get_by_id(db: Session, lectura_id: int):
         return db.query(LecturaSensor).filter(LecturaSensor.id_lectura == lectura_id).first()
     
+    @staticmethod
+    def get_serie(
+        db: Session,
+        viaje_id: int,
+        intervalo_segundos: Optional[int] = None,
+        max_puntos: Optional[int] = None,
+        desde: Optional[datetime] = None,
+        hasta: Optional[datetime] = None,
+    ):
+        """
+        Serie de lecturas del viaje agregada en SQL por intervalos de tiempo
+        (o desde su archivo, si el viaje está archivado).
+        Con `max_puntos` se eligen con LTTB los intervalos más representativos
+        para no devolver más puntos de los que se pueden graficar; si además no
+        se indica el intervalo, se deriva de la duración del rango consultado
+        """
+        filtros = [LecturaSensor.id_viaje == viaje_id, *_rango_particiones(db, viaje_id)]
+        if desde:
+            filtros.append(LecturaSensor.timestamp >= desde)
+        if hasta:
+            filtros.append(LecturaSensor.timestamp <= hasta)
+        
+        if intervalo_segundos is None:
+            intervalo_segundos = 60
+            if max_puntos:
+                inicio, fin = desde, hasta
+                if inicio is None or fin is None:
+                    agregado = db.get(AgregadoViaje, viaje_id)
+                    if agregado:
+                        rango = (agregado.primera_lectura, agregado.ultima_lectura)
+                    else:
+                        rango = db.query(
+                            func.min(LecturaSensor.timestamp), func.max(LecturaSensor.timestamp)
+                        ).filter(*filtros).one()
+                    inicio, fin = inicio or rango[0], fin or rango[1]
+                if inicio and fin:
+                    duracion = (fin - inicio).total_seconds()
+                    intervalo_segundos = max(1, math.ceil(duracion / (max_puntos * FACTOR_CANDIDATOS_LTTB)))
+        
+        bucket = _bucket_tiempo(db, LecturaSensor.timestamp, intervalo_segundos).label("bucket")
+        filas = db.execute(
+            select(
+                bucket,
+                func.count(LecturaSensor.id_lectura),
+                func.avg(LecturaSensor.frecuencia_cardiaca),
+                func.min(LecturaSensor.frecuencia_cardiaca),
+                func.max(LecturaSensor.frecuencia_cardiaca),
+                func.avg(LecturaSensor.percios),
+                func.coalesce(func.sum(LecturaSensor.conteo_cabeceos), 0),
+                func.coalesce(func.sum(LecturaSensor.conteo_bostezos), 0),
+            ).where(*filtros).group_by(bucket).order_by(bucket)
+        ).all()
+        if not filas:
+            archivo = ArchivoService.get_archivo(db, viaje_id)
+            if archivo:
+                filas = archivo.serie(intervalo_segundos, desde, hasta)
+        
+        puntos = [
+            {
+                "inicio": EPOCA + timedelta(seconds=int(numero) * intervalo_segundos),
+                "lecturas": lecturas,
+                "frecuencia_cardiaca_promedio": float(fc_prom) if fc_prom is not None else None,
+                "frecuencia_cardiaca_min": fc_min,
+                "frecuencia_cardiaca_max": fc_max,
+                "percios_promedio": float(percios) if percios is not None else None,
+                "total_cabeceos": int(cabeceos),
+                "total_bostezos": int(bostezos),
+            }
+            for numero, lecturas, fc_prom, fc_min, fc_max, percios, cabeceos, bostezos in filas
+        ]
+        
+        if max_puntos and len(puntos) > max_puntos:
+            # Los intervalos sin FC se ubican en la media para no distorsionar el LTTB
+            valores_fc = [
+                p["frecuencia_cardiaca_promedio"] for p in puntos
+                if p["frecuencia_cardiaca_promedio"] is not None
+            ]
+            fc_media = sum(valores_fc) / len(valores_fc) if valores_fc else 0.0
+            puntos = lttb(
+                puntos,
+                max_puntos,
+                x=lambda p: (p["inicio"] - EPOCA).total_seconds(),
+                y=lambda p: fc_media if p["frecuencia_cardiaca_promedio"] is None else p["frecuencia_cardiaca_promedio"],
+            )
+        
+        return {
+            "id_viaje": viaje_id,
+            "intervalo_segundos": intervalo_segundos,
+            "puntos": puntos,
+        }
+    
     @staticmethod
     def create(db: Session, lectura: LecturaSensorCreate):
-        db_lectura = LecturaSensor(**lectura.model_dump())
-        db.add(db_lectura)
-        db.commit()
-        db.refresh(db_lectura)
+        """
+        Inserta la lectura y las alertas que genere en una sola transacción.
+        El id y el timestamp se obtienen vía RETURNING, sin consultas de refresh
+        """
+        db_lectura, _ = LecturaSensorService.create_batch(db, [lectura])[0]
         return db_lectura
+    
+    @staticmethod
+    def create_batch(db: Session, lecturas: list[LecturaSensorCreate]):
+        """
+        Inserta un lote de lecturas (de uno o varios viajes) con INSERT ... RETURNING
+        de varias filas (una sentencia por página de insertmanyvalues), analiza el
+        lote completo y guarda sus alertas, todo dentro de una misma transacción.
+        Retorna una lista de tuplas (lectura, alertas generadas por la lectura)
+        """
+        db_lecturas = insertar_retornando(
+            db, LecturaSensor.__table__, [lectura.model_dump() for lectura in lecturas]
+        )
+        
+        AgregadoViajeService.registrar_lecturas(db, db_lecturas)
+        alertas = AlertaAutoDetector.analizar_lote(db, db_lecturas)
+        db.commit()
+        return list(zip(db_lecturas, alertas))
 
 
 class AlertaService:
     @staticmethod
-    def get_all(db: Session, viaje_id: Optional[int] = None, skip: int = 0, limit: int = 100):
-        query = db.query(Alerta)
+    def get_all(
+        db: Session,
+        viaje_id: Optional[int] = None,
+        skip: int = 0,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        filas: bool = False,
+    ):
+        """Con `filas` se devuelven dicts de AlertaResponse en lugar de entidades"""
+        query = db.query(*columnas(Alerta, AlertaResponse)) if filas else db.query(Alerta)
         if viaje_id:
             query = query.filter(Alerta.id_viaje == viaje_id)
-        return query.order_by(Alerta.timestamp.desc()).offset(skip).limit(limit).all()
+        query = query.order_by(Alerta.timestamp.desc(), Alerta.id_alerta.desc())
+        if cursor:
+            valores = decodificar_cursor(cursor, datetime, int)
+            query = query.filter(despues_de([Alerta.timestamp, Alerta.id_alerta], valores))
+        else:
+            query = query.offset(skip)
+        alertas = query.limit(limit).all()
+        return como_dicts(alertas, AlertaResponse) if filas else alertas
     
     @staticmethod
     def get_by_id(db: Session, alerta_id: int):
@@ -164,13 +484,27 @@ class AlertaService:
     
     @staticmethod
     def create(db: Session, alerta: AlertaCreate):
-        db_alerta = Alerta(**alerta.model_dump())
+        # Una alerta nueva es su propia última ocurrencia
+        momento = datetime.utcnow()
+        db_alerta = Alerta(**alerta.model_dump(), timestamp=momento, ultima_ocurrencia=momento)
         db.add(db_alerta)
+        db.flush()
+        AgregadoViajeService.registrar_alertas(db, [db_alerta])
+        alertas_recientes.publicar(db, [db_alerta])
         db.commit()
         db.refresh(db_alerta)
         return db_alerta
     
     @staticmethod
-    def get_alertas_recientes(db: Session, limit: int = 10):
-        """Obtiene las alertas más recientes del sistema"""
-        return db.query(Alerta).order_by(Alerta.timestamp.desc()).limit(limit).all()
+    def get_alertas_recientes(db: Session, limit: int = 10, since_id: Optional[int] = None):
+        """
+        Obtiene las alertas más recientes del sistema (posteriores a `since_id` si se indica).
+        Se sirven desde el buffer en memoria cuando éste alcanza para `limit`
+        """
+        if alertas_recientes.cubre(limit):
+            return alertas_recientes.listar(limit, since_id)
+        query = db.query(Alerta)
+        if since_id is not None:
+            query = query.filter(Alerta.id_alerta > since_id)
+        # Mismo orden que el buffer
+        return query.order_by(Alerta.id_alerta.desc()).limit(limit).all()
@@ -0,0 +1,216 @@
+"""
+Detección de somnolencia sobre ventanas deslizantes por viaje
+
+Cada viaje activo mantiene en memoria un buffer circular con sus lecturas de
+los últimos DETECCION_VENTANA_SEGUNDOS (como máximo DETECCION_VENTANA_LECTURAS)
+y sumas acumuladas que se actualizan al entrar y salir cada lectura, de modo
+que evaluar las reglas temporales cuesta O(1) por lectura.
+Si el estado de un viaje no está en memoria se reconstruye desde la base.
+"""
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.config.settings import settings
+from app.models.models import LecturaSensor
+from app.schemas.schemas import AlertaCreate
+from app.services.cooldown import NIVELES
+from app.utils.transacciones import al_revertir
+import threading
+import time
+
+
+class VentanaViaje:
+    """Buffer circular de lecturas recientes de un viaje con sus sumas acumuladas"""
+    __slots__ = (
+        "lecturas", "origen", "cabeceos", "bostezos", "n_percios",
+        "s_t", "s_p", "s_tp", "s_tt", "activas", "ultimo_acceso",
+    )
+    
+    def __init__(self):
+        self.lecturas = deque()
+        self.origen = None
+        self.cabeceos = 0
+        self.bostezos = 0
+        # Sumas para la regresión lineal de percios contra el tiempo (en minutos)
+        self.n_percios = 0
+        self.s_t = self.s_p = self.s_tp = self.s_tt = 0.0
+        # Reglas cuya condición se cumplía en la última evaluación, con el mayor
+        # nivel alcanzado en el episodio
+        self.activas: dict[str, str] = {}
+        self.ultimo_acceso = time.monotonic()
+    
+    def _acumular(self, lectura: tuple, signo: int):
+        t, cabeceos, bostezos, percios = lectura
+        self.cabeceos += signo * cabeceos
+        self.bostezos += signo * bostezos
+        if percios is not None:
+            self.n_percios += signo
+            self.s_t += signo * t
+            self.s_p += signo * percios
+            self.s_tp += signo * t * percios
+            self.s_tt += signo * t * t
+    
+    def agregar(self, timestamp: datetime, cabeceos: int, bostezos: int, percios):
+        if self.origen is None:
+            self.origen = timestamp
+        t = (timestamp - self.origen).total_seconds() / 60
+        lectura = (t, cabeceos or 0, bostezos or 0, percios)
+        self.lecturas.append(lectura)
+        self._acumular(lectura, 1)
+        
+        limite = t - settings.DETECCION_VENTANA_SEGUNDOS / 60
+        while self.lecturas and (
+            len(self.lecturas) > settings.DETECCION_VENTANA_LECTURAS or self.lecturas[0][0] < limite
+        ):
+            self._acumular(self.lecturas.popleft(), -1)
+    
+    @property
+    def percios_promedio(self):
+        return self.s_p / self.n_percios if self.n_percios else None
+    
+    @property
+    def pendiente_percios(self):
+        """Variación de percios por minuto dentro de la ventana (mínimos cuadrados)"""
+        denominador = self.n_percios * self.s_tt - self.s_t * self.s_t
+        if self.n_percios < 2 or abs(denominador) < 1e-12:
+            return None
+        return (self.n_percios * self.s_tp - self.s_t * self.s_p) / denominador
+    
+    def condiciones(self) -> dict[str, str]:
+        """Reglas temporales que se cumplen ahora, con su nivel de somnolencia"""
+        cumplidas = {}
+        if self.cabeceos >= settings.UMBRAL_CABECEOS_VENTANA:
+            cumplidas["SOMNOLENCIA_CABECEOS_VENTANA"] = (
+                "ALTO" if self.cabeceos >= settings.UMBRAL_CABECEOS_VENTANA * 2 else "MEDIO"
+            )
+        if self.bostezos >= settings.UMBRAL_BOSTEZOS_VENTANA:
+            cumplidas["FATIGA_BOSTEZOS_VENTANA"] = (
+                "ALTO" if self.bostezos >= settings.UMBRAL_BOSTEZOS_VENTANA * 2 else "MEDIO"
+            )
+        if self.n_percios >= settings.DETECCION_MIN_LECTURAS:
+            if self.percios_promedio >= settings.UMBRAL_PERCLOS:
+                cumplidas["PERCLOS_ELEVADO"] = "ALTO"
+            pendiente = self.pendiente_percios
+            if pendiente is not None and pendiente >= settings.UMBRAL_PERCLOS_PENDIENTE:
+                cumplidas["PERCLOS_EN_AUMENTO"] = "MEDIO"
+        return cumplidas
+    
+    def evaluar(self) -> dict[str, str]:
+        """
+        Reglas que pasaron a cumplirse con la última lectura o que subieron de
+        nivel dentro del episodio (una alerta por episodio y nivel)
+        """
+        cumplidas = self.condiciones()
+        nuevas = {
+            regla: nivel for regla, nivel in cumplidas.items()
+            if NIVELES[nivel] > NIVELES[self.activas.get(regla)]
+        }
+        self.activas = {
+            regla: max(nivel, self.activas.get(regla), key=NIVELES.get) for regla, nivel in cumplidas.items()
+        }
+        return nuevas
+
+
+class DetectorVentanas:
+    """Estado de ventanas por viaje, con expulsión LRU por cantidad y por inactividad"""
+    
+    def __init__(self):
+        self._ventanas: OrderedDict[int, VentanaViaje] = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def __len__(self):
+        return len(self._ventanas)
+    
+    def descartar(self, *viaje_ids: int):
+        """Olvida el estado de los viajes (finalizados o con una transacción revertida)"""
+        with self._lock:
+            for viaje_id in viaje_ids:
+                self._ventanas.pop(viaje_id, None)
+    
+    def limpiar(self):
+        with self._lock:
+            self._ventanas.clear()
+    
+    def _expulsar(self):
+        limite = time.monotonic() - settings.DETECCION_TTL_SEGUNDOS
+        while self._ventanas:
+            viaje_id, ventana = next(iter(self._ventanas.items()))
+            if len(self._ventanas) <= settings.DETECCION_MAX_VIAJES and ventana.ultimo_acceso >= limite:
+                break
+            del self._ventanas[viaje_id]
+    
+    @staticmethod
+    def _reconstruir(db: Session, viaje_id: int, antes_de: datetime, excluir: set) -> VentanaViaje:
+        """Carga desde la base las lecturas de la ventana previas al lote actual"""
+        ventana = VentanaViaje()
+        filas = db.execute(
+            select(
+                LecturaSensor.id_lectura,
+                LecturaSensor.timestamp,
+                LecturaSensor.conteo_cabeceos,
+                LecturaSensor.conteo_bostezos,
+                LecturaSensor.percios,
+            )
+            .where(
+                LecturaSensor.id_viaje == viaje_id,
+                LecturaSensor.timestamp >= antes_de - timedelta(seconds=settings.DETECCION_VENTANA_SEGUNDOS),
+                LecturaSensor.timestamp <= antes_de,
+            )
+            .order_by(LecturaSensor.timestamp.desc(), LecturaSensor.id_lectura.desc())
+            .limit(settings.DETECCION_VENTANA_LECTURAS + len(excluir))
+        ).all()
+        for id_lectura, timestamp, cabeceos, bostezos, percios in reversed(filas):
+            if id_lectura not in excluir:
+                ventana.agregar(timestamp, cabeceos, bostezos, percios)
+        # Los episodios que ya estaban en curso no vuelven a alertar
+        ventana.activas = ventana.condiciones()
+        return ventana
+    
+    def evaluar_lote(self, db: Session, lecturas: list) -> list[list[AlertaCreate]]:
+        """
+        Agrega las lecturas (ya insertadas) a las ventanas de sus viajes y retorna,
+        para cada lectura, las alertas de las reglas temporales que activó.
+        Si la transacción de `db` se revierte se descarta el estado de esos viajes
+        """
+        alertas = [[] for _ in lecturas]
+        por_viaje = {}
+        for indice, lectura in enumerate(lecturas):
+            por_viaje.setdefault(lectura.id_viaje, []).append(indice)
+        
+        with self._lock:
+            faltantes = [viaje_id for viaje_id in por_viaje if viaje_id not in self._ventanas]
+        reconstruidas = {}
+        for viaje_id in faltantes:
+            indices = por_viaje[viaje_id]
+            reconstruidas[viaje_id] = self._reconstruir(
+                db,
+                viaje_id,
+                min(lecturas[i].timestamp for i in indices),
+                {lecturas[i].id_lectura for i in indices},
+            )
+        
+        with self._lock:
+            for viaje_id, indices in por_viaje.items():
+                ventana = self._ventanas.get(viaje_id) or reconstruidas.get(viaje_id) or VentanaViaje()
+                self._ventanas[viaje_id] = ventana
+                self._ventanas.move_to_end(viaje_id)
+                ventana.ultimo_acceso = time.monotonic()
+                for indice in indices:
+                    lectura = lecturas[indice]
+                    ventana.agregar(
+                        lectura.timestamp, lectura.conteo_cabeceos, lectura.conteo_bostezos, lectura.percios
+                    )
+                    for regla, nivel in ventana.evaluar().items():
+                        alertas[indice].append(AlertaCreate(
+                            id_viaje=viaje_id,
+                            tipo_alerta=regla,
+                            nivel_somnolencia=nivel,
+                        ))
+            self._expulsar()
+        
+        al_revertir(db, lambda: self.descartar(*por_viaje))
+        return alertas
+
+
+detector_ventanas = DetectorVentanas()
@@ -0,0 +1,40 @@
+"""
+Verifica o reconstruye los agregados por viaje a partir de las lecturas y alertas
+Ejecutar con: python -m app.utils.agregados [--reconstruir] [--viaje ID ...]
+
+Sin opciones solo informa las diferencias y termina con código 1 si las hay.
+Usar --reconstruir después de crear la tabla en una base con datos previos.
+"""
+import argparse
+import sys
+from app.config.database import SessionLocal
+from app.services.agregados import AgregadoViajeService
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Agregados por viaje")
+    parser.add_argument("--reconstruir", action="store_true", help="recalcular y reemplazar los agregados")
+    parser.add_argument("--viaje", type=int, nargs="*", help="limitar a estos viajes")
+    args = parser.parse_args()
+    
+    db = SessionLocal()
+    try:
+        if args.reconstruir:
+            total = AgregadoViajeService.reconstruir(db, args.viaje)
+            print(f"✓ {total} agregados reconstruidos")
+            return
+        
+        diferencias = AgregadoViajeService.verificar(db, args.viaje)
+        for id_viaje, columnas in sorted(diferencias.items()):
+            print(f"✗ Viaje {id_viaje}:")
+            for columna, (guardado, calculado) in columnas.items():
+                print(f"    {columna}: guardado={guardado} calculado={calculado}")
+        if diferencias:
+            sys.exit(1)
+        print("✓ Los agregados son consistentes")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
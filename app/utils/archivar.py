@@ -0,0 +1,57 @@
+"""
+Archiva las lecturas de los viajes finalizados en el formato columnar comprimido
+Ejecutar con: python -m app.utils.archivar [--viaje ID ...] [--antiguedad-horas N]
+
+Sin --viaje archiva los viajes finalizados hace más de ARCHIVO_ANTIGUEDAD_HORAS.
+Las lecturas archivadas se eliminan de lecturas_sensores y se siguen leyendo
+desde ARCHIVO_DIRECTORIO a través de los mismos endpoints.
+"""
+import argparse
+import asyncio
+import logging
+from fastapi.concurrency import run_in_threadpool
+from app.config.database import SessionLocal, con_sesion
+from app.config.settings import settings
+from app.services.archivo import ArchivoService
+
+logger = logging.getLogger(__name__)
+
+
+async def archivar_periodicamente():
+    """Tarea de fondo de la app: archiva viajes finalizados cada ARCHIVO_INTERVALO_MINUTOS"""
+    while True:
+        try:
+            archivados = await run_in_threadpool(con_sesion, ArchivoService.archivar_finalizados)
+            if archivados:
+                logger.info(f"Viajes archivados: {archivados}")
+        except Exception as e:
+            logger.error(f"Error al archivar viajes: {str(e)}")
+        await asyncio.sleep(settings.ARCHIVO_INTERVALO_MINUTOS * 60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archivo de lecturas de viajes finalizados")
+    parser.add_argument("--viaje", type=int, nargs="*", help="archivar solo estos viajes")
+    parser.add_argument("--antiguedad-horas", type=int, help="antigüedad mínima desde la finalización")
+    parser.add_argument("--limite", type=int, default=100, help="máximo de viajes por ejecución")
+    args = parser.parse_args()
+    
+    db = SessionLocal()
+    try:
+        if args.viaje:
+            for viaje_id in args.viaje:
+                registro = ArchivoService.archivar_viaje(db, viaje_id)
+                if registro:
+                    print(f"✓ Viaje {viaje_id}: {registro.total_lecturas} lecturas, {registro.bytes_archivo} bytes")
+                else:
+                    print(f"✗ Viaje {viaje_id}: no finalizado, sin lecturas o ya archivado")
+            return
+        
+        archivados = ArchivoService.archivar_finalizados(db, args.antiguedad_horas, args.limite)
+        print(f"✓ Viajes archivados: {archivados or 'ninguno'}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
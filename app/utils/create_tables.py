@@ -4,17 +4,20 @@ Ejecutar con: python -m app.utils.create_tables
 """
 from app.config.database import engine, Base
 from app.models.models import Conductor, Viaje, LecturaSensor, Alerta
+from app.utils.migraciones import sincronizar_esquema
 
 def create_tables():
-    """Crear todas las tablas en la base de datos"""
+    """Crear todas las tablas (y los índices que falten) en la base de datos"""
     print("Creando tablas en la base de datos...")
-    Base.metadata.create_all(bind=engine)
+    sincronizar_esquema(engine)
     print("✓ Tablas creadas exitosamente!")
     print("\nTablas creadas:")
     print("  - conductores")
     print("  - viajes")
     print("  - lecturas_sensores")
     print("  - alertas")
+    print("  - agregados_viajes")
+    print("  - archivos_viajes")
 
 if __name__ == "__main__":
     create_tables()
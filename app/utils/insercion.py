@@ -0,0 +1,20 @@
+"""
+INSERT ... RETURNING de varias filas con los resultados en el orden de los parámetros
+
+En PostgreSQL `sort_by_parameter_order` agrega un centinela implícito y el lote
+se inserta en una sentencia por página (insertmanyvalues). SQLite no admite ese
+centinela y SQLAlchemy recurriría a un INSERT por fila; ahí se inserta sin
+pedir orden y se ordena por la clave primaria, que SQLite asigna en el orden
+de VALUES.
+"""
+from sqlalchemy import Table, insert
+from sqlalchemy.orm import Session
+
+
+def insertar_retornando(db: Session, tabla: Table, filas: list[dict]) -> list:
+    """Inserta `filas` y retorna las filas insertadas (todas las columnas) en el mismo orden"""
+    if db.get_bind().dialect.name != "sqlite":
+        return db.execute(insert(tabla).returning(*tabla.c, sort_by_parameter_order=True), filas).all()
+    (clave,) = tabla.primary_key.columns
+    insertadas = db.execute(insert(tabla).returning(*tabla.c), filas).all()
+    return sorted(insertadas, key=lambda fila: fila._mapping[clave])
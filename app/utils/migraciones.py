@@ -0,0 +1,73 @@
+"""
+Sincroniza el esquema de una base de datos existente con los modelos
+Ejecutar con: python -m app.utils.migraciones
+
+create_all solo crea las tablas que faltan; este script además agrega las
+columnas y crea los índices declarados en los modelos que todavía no existen
+en tablas ya creadas. Las columnas nuevas deben ser nulables o tener server_default.
+"""
+from sqlalchemy import inspect
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateColumn, CreateIndex
+from app.config.database import engine, Base
+from app.config.settings import settings
+from app.utils.particiones import crear_layout_particionado, es_particionada
+import app.models.models  # noqa: F401  (registra los modelos en Base.metadata)
+
+
+def _crear_indice(engine: Engine, indice):
+    ddl = str(CreateIndex(indice).compile(dialect=engine.dialect))
+    if engine.dialect.name == "postgresql":
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            # CONCURRENTLY evita bloquear las escrituras mientras se construye el
+            # índice, pero no puede ejecutarse dentro de una transacción ni
+            # sobre una tabla particionada
+            if not es_particionada(conn, indice.table.name):
+                ddl = ddl.replace("CREATE INDEX", "CREATE INDEX CONCURRENTLY", 1)
+            conn.exec_driver_sql(ddl)
+    else:
+        with engine.begin() as conn:
+            conn.exec_driver_sql(ddl)
+
+
+def _agregar_columna(engine: Engine, columna):
+    ddl = CreateColumn(columna).compile(dialect=engine.dialect)
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"ALTER TABLE {columna.table.name} ADD COLUMN {ddl}")
+
+
+def sincronizar_esquema(engine: Engine = engine) -> list[str]:
+    """
+    Crea las tablas, columnas e índices que falten. Retorna los nombres de las
+    columnas (tabla.columna) e índices agregados a tablas que ya existían
+    """
+    if settings.DB_PARTICIONADO and engine.dialect.name == "postgresql":
+        crear_layout_particionado(engine)
+    Base.metadata.create_all(bind=engine)
+    
+    inspector = inspect(engine)
+    creados = []
+    for tabla in Base.metadata.sorted_tables:
+        columnas = {columna["name"] for columna in inspector.get_columns(tabla.name)}
+        for columna in tabla.columns:
+            if columna.name not in columnas:
+                _agregar_columna(engine, columna)
+                creados.append(f"{tabla.name}.{columna.name}")
+        
+        existentes = {indice["name"] for indice in inspector.get_indexes(tabla.name)}
+        for indice in tabla.indexes:
+            if indice.name not in existentes:
+                _crear_indice(engine, indice)
+                creados.append(indice.name)
+    return creados
+
+
+if __name__ == "__main__":
+    print("Sincronizando esquema de la base de datos...")
+    cambios = sincronizar_esquema()
+    if cambios:
+        print("✓ Columnas e índices creados:")
+        for nombre in cambios:
+            print(f"  - {nombre}")
+    else:
+        print("✓ El esquema ya estaba actualizado")
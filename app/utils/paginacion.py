@@ -0,0 +1,65 @@
+"""
+Utilidades para paginación por cursor (keyset)
+
+El cursor es un valor opaco (base64 de los valores de ordenamiento de la
+última fila devuelta). La siguiente página se obtiene con una condición
+(timestamp, id) < (t, i) que aprovecha los índices, en lugar de OFFSET.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Optional
+from fastapi import Response
+from sqlalchemy import tuple_
+
+HEADER_SIGUIENTE_CURSOR = "X-Next-Cursor"
+
+
+def codificar_cursor(*valores) -> str:
+    datos = [v.isoformat() if isinstance(v, datetime) else v for v in valores]
+    return base64.urlsafe_b64encode(json.dumps(datos).encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor: str, *tipos) -> tuple:
+    """Decodifica un cursor con los tipos esperados. Lanza ValueError si es inválido"""
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        datos = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        if not isinstance(datos, list) or len(datos) != len(tipos):
+            raise ValueError
+        return tuple(
+            datetime.fromisoformat(valor) if tipo is datetime else tipo(valor)
+            for tipo, valor in zip(tipos, datos)
+        )
+    except (ValueError, TypeError, binascii.Error):
+        raise ValueError("Cursor de paginación inválido")
+
+
+def despues_de(columnas: list, valores: tuple, descendente: bool = True):
+    """
+    Condición keyset: filas posteriores a `valores` en el orden de `columnas`.
+    Se usa la comparación de filas (a, b) < (x, y), que PostgreSQL y SQLite
+    resuelven como un rango sobre el índice; el equivalente con OR no
+    """
+    if len(columnas) == 1:
+        return columnas[0] < valores[0] if descendente else columnas[0] > valores[0]
+    fila, referencia = tuple_(*columnas), tuple_(*valores)
+    return fila < referencia if descendente else fila > referencia
+
+
+def siguiente_cursor(items: list, limit: int, *campos) -> Optional[str]:
+    """Cursor de la página siguiente, o None si esta página fue la última"""
+    if not items or len(items) < limit:
+        return None
+    ultimo = items[-1]
+    if isinstance(ultimo, dict):
+        return codificar_cursor(*(ultimo[campo] for campo in campos))
+    return codificar_cursor(*(getattr(ultimo, campo) for campo in campos))
+
+
+def agregar_cursor(response: Response, items: list, limit: int, *campos):
+    """Añade el header X-Next-Cursor a la respuesta si hay más páginas"""
+    cursor = siguiente_cursor(items, limit, *campos)
+    if cursor:
+        response.headers[HEADER_SIGUIENTE_CURSOR] = cursor
@@ -0,0 +1,267 @@
+"""
+Particionado mensual por timestamp de lecturas_sensores y alertas (PostgreSQL)
+Ejecutar con: python -m app.utils.particiones [crear|convertir|mantener]
+
+- crear: crea las tablas particionadas en una base nueva (create_tables lo
+  usa cuando DB_PARTICIONADO está activo)
+- convertir: migra tablas existentes sin particionar. Bloquea las tablas
+  mientras copia las filas, así que debe ejecutarse en una ventana de mantenimiento
+- mantener: crea las particiones de los próximos meses y aplica la retención
+
+Cada tabla tiene particiones <tabla>_pAAAA_MM y una <tabla>_default para las
+filas fuera de rango. La retención desprende (DETACH) o elimina (DROP)
+particiones completas más antiguas que RETENCION_DIAS, sin DELETE fila a fila.
+"""
+import asyncio
+import logging
+import re
+import sys
+from datetime import date, datetime, timedelta
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateIndex, CreateTable
+from fastapi.concurrency import run_in_threadpool
+from app.config.database import engine, Base
+from app.config.settings import settings
+from app.models.models import Conductor, Viaje, LecturaSensor, Alerta
+
+logger = logging.getLogger(__name__)
+
+TABLAS_PARTICIONADAS = [LecturaSensor.__table__, Alerta.__table__]
+COLUMNA_PARTICION = "timestamp"
+PATRON_PARTICION = re.compile(r"_p(\d{4})_(\d{2})$")
+
+
+def _mes(fecha) -> date:
+    return date(fecha.year, fecha.month, 1)
+
+
+def _sumar_meses(mes: date, meses: int) -> date:
+    total = mes.year * 12 + mes.month - 1 + meses
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def _nombre_particion(tabla: str, mes: date) -> str:
+    return f"{tabla}_p{mes:%Y_%m}"
+
+
+def es_particionada(conn, tabla: str) -> bool:
+    return conn.execute(text(
+        "SELECT 1 FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE c.relname = :tabla AND n.nspname = current_schema() AND c.relkind = 'p'"
+    ), {"tabla": tabla}).first() is not None
+
+
+def _ddl_tabla_particionada(tabla, dialecto) -> str:
+    # La clave primaria de una tabla particionada debe incluir la columna de partición
+    preparer = dialecto.identifier_preparer
+    ddl = str(CreateTable(tabla).compile(dialect=dialecto)).strip()
+    pk = ", ".join(preparer.quote(columna.name) for columna in tabla.primary_key.columns)
+    columna = preparer.quote(COLUMNA_PARTICION)
+    ddl = ddl.replace(f"PRIMARY KEY ({pk})", f"PRIMARY KEY ({pk}, {columna})")
+    return f"{ddl} PARTITION BY RANGE ({columna})"
+
+
+def _crear_tabla_particionada(conn, tabla):
+    conn.exec_driver_sql(_ddl_tabla_particionada(tabla, conn.dialect))
+    for indice in tabla.indexes:
+        conn.execute(CreateIndex(indice))
+    conn.exec_driver_sql(
+        f"CREATE TABLE IF NOT EXISTS {tabla.name}_default PARTITION OF {tabla.name} DEFAULT"
+    )
+
+
+def _crear_particion(conn, tabla: str, mes: date) -> str:
+    nombre = _nombre_particion(tabla, mes)
+    conn.exec_driver_sql(
+        f"CREATE TABLE IF NOT EXISTS {nombre} PARTITION OF {tabla} "
+        f"FOR VALUES FROM ('{mes.isoformat()}') TO ('{_sumar_meses(mes, 1).isoformat()}')"
+    )
+    return nombre
+
+
+def listar_particiones(conn, tabla: str) -> list[tuple[str, date]]:
+    """Particiones mensuales de la tabla como (nombre, mes)"""
+    nombres = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :tabla"
+    ), {"tabla": tabla}).scalars()
+    particiones = []
+    for nombre in nombres:
+        coincidencia = PATRON_PARTICION.search(nombre)
+        if coincidencia:
+            particiones.append((nombre, date(int(coincidencia.group(1)), int(coincidencia.group(2)), 1)))
+    return sorted(particiones, key=lambda particion: particion[1])
+
+
+def crear_particiones_futuras(engine: Engine = engine, meses: int = None) -> list[str]:
+    """Crea las particiones desde el mes actual hasta `meses` meses adelante"""
+    meses = settings.PARTICIONES_MESES_FUTUROS if meses is None else meses
+    actual = _mes(datetime.utcnow())
+    creadas = []
+    for tabla in TABLAS_PARTICIONADAS:
+        existentes = None
+        for desplazamiento in range(meses + 1):
+            mes = _sumar_meses(actual, desplazamiento)
+            # Cada partición en su propia transacción: si la default ya tiene
+            # filas de ese mes, falla solo esa y se informa
+            try:
+                with engine.begin() as conn:
+                    if existentes is None:
+                        existentes = {nombre for nombre, _ in listar_particiones(conn, tabla.name)}
+                    nombre = _nombre_particion(tabla.name, mes)
+                    if nombre not in existentes:
+                        creadas.append(_crear_particion(conn, tabla.name, mes))
+            except Exception as e:
+                logger.error(f"No se pudo crear la partición de {tabla.name} para {mes:%Y-%m}: {str(e)}")
+    return creadas
+
+
+def crear_layout_particionado(engine: Engine = engine) -> list[str]:
+    """
+    Crea lecturas_sensores y alertas como tablas particionadas (si no existen)
+    con sus índices, la partición default y las particiones de los próximos meses
+    """
+    creadas = []
+    with engine.begin() as conn:
+        Base.metadata.create_all(conn, tables=[Conductor.__table__, Viaje.__table__])
+        inspector = inspect(conn)
+        for tabla in TABLAS_PARTICIONADAS:
+            if not inspector.has_table(tabla.name):
+                _crear_tabla_particionada(conn, tabla)
+                creadas.append(tabla.name)
+            elif not es_particionada(conn, tabla.name):
+                logger.warning(
+                    f"La tabla {tabla.name} ya existe sin particionar; "
+                    "usar 'python -m app.utils.particiones convertir'"
+                )
+    crear_particiones_futuras(engine)
+    return creadas
+
+
+def convertir_tablas(engine: Engine = engine) -> list[str]:
+    """
+    Migra a particionadas las tablas existentes que no lo están: renombra la
+    tabla original, crea la particionada con particiones para todo el rango de
+    datos y copia las filas. Bloquea cada tabla durante la copia
+    """
+    convertidas = []
+    for tabla in TABLAS_PARTICIONADAS:
+        with engine.begin() as conn:
+            if not inspect(conn).has_table(tabla.name) or es_particionada(conn, tabla.name):
+                continue
+            
+            nombre, legado = tabla.name, f"{tabla.name}_sin_particionar"
+            pk = tabla.primary_key.columns.values()[0].name
+            conn.exec_driver_sql(f"LOCK TABLE {nombre} IN ACCESS EXCLUSIVE MODE")
+            
+            # Liberar los nombres de la tabla, sus índices y su secuencia
+            conn.exec_driver_sql(f"ALTER TABLE {nombre} RENAME TO {legado}")
+            indices = conn.execute(text(
+                "SELECT indexname FROM pg_indexes "
+                "WHERE tablename = :tabla AND schemaname = current_schema()"
+            ), {"tabla": legado}).scalars().all()
+            for indice in indices:
+                conn.exec_driver_sql(f"ALTER INDEX {indice} RENAME TO {indice}_legado")
+            secuencia = conn.execute(
+                text("SELECT pg_get_serial_sequence(:tabla, :columna)"),
+                {"tabla": legado, "columna": pk},
+            ).scalar()
+            if secuencia:
+                conn.exec_driver_sql(f"ALTER SEQUENCE {secuencia} RENAME TO {legado}_{pk}_seq")
+            
+            _crear_tabla_particionada(conn, tabla)
+            minimo, maximo = conn.exec_driver_sql(
+                f"SELECT min({COLUMNA_PARTICION}), max({COLUMNA_PARTICION}) FROM {legado}"
+            ).one()
+            if minimo is not None:
+                mes, ultimo = _mes(minimo), _mes(maximo)
+                while mes <= ultimo:
+                    _crear_particion(conn, nombre, mes)
+                    mes = _sumar_meses(mes, 1)
+            
+            # Las filas sin timestamp (no admitido en la clave) van a la partición default
+            columnas = [columna.name for columna in tabla.columns]
+            seleccion = [
+                f"COALESCE({c}, TIMESTAMP '1970-01-01')" if c == COLUMNA_PARTICION else c
+                for c in columnas
+            ]
+            conn.exec_driver_sql(
+                f"INSERT INTO {nombre} ({', '.join(columnas)}) "
+                f"SELECT {', '.join(seleccion)} FROM {legado}"
+            )
+            conn.exec_driver_sql(
+                f"SELECT setval(pg_get_serial_sequence('{nombre}', '{pk}'), "
+                f"COALESCE((SELECT max({pk}) FROM {nombre}), 0) + 1, false)"
+            )
+            conn.exec_driver_sql(f"DROP TABLE {legado}")
+            convertidas.append(nombre)
+    
+    crear_particiones_futuras(engine)
+    return convertidas
+
+
+def aplicar_retencion(engine: Engine = engine, dias: int = None, modo: str = None) -> list[str]:
+    """
+    Desprende (modo 'detach') o elimina (modo 'drop') las particiones cuyo mes
+    terminó hace más de `dias` días. Retorna los nombres de las particiones afectadas
+    """
+    dias = settings.RETENCION_DIAS if dias is None else dias
+    modo = settings.RETENCION_MODO if modo is None else modo
+    if not dias:
+        return []
+    
+    limite = (datetime.utcnow() - timedelta(days=dias)).date()
+    afectadas = []
+    with engine.begin() as conn:
+        for tabla in TABLAS_PARTICIONADAS:
+            for nombre, mes in listar_particiones(conn, tabla.name):
+                if _sumar_meses(mes, 1) > limite:
+                    continue
+                if modo == "drop":
+                    conn.exec_driver_sql(f"DROP TABLE IF EXISTS {nombre}")
+                else:
+                    conn.exec_driver_sql(f"ALTER TABLE {tabla.name} DETACH PARTITION {nombre}")
+                afectadas.append(nombre)
+    return afectadas
+
+
+def mantener(engine: Engine = engine) -> dict:
+    """Crea las particiones futuras y aplica la retención"""
+    return {
+        "creadas": crear_particiones_futuras(engine),
+        "retenidas": aplicar_retencion(engine),
+    }
+
+
+async def mantener_periodicamente():
+    """Tarea de fondo de la app: ejecuta el mantenimiento cada PARTICIONES_INTERVALO_HORAS"""
+    while True:
+        try:
+            resultado = await run_in_threadpool(mantener)
+            if resultado["creadas"] or resultado["retenidas"]:
+                logger.info(f"Mantenimiento de particiones: {resultado}")
+        except Exception as e:
+            logger.error(f"Error en el mantenimiento de particiones: {str(e)}")
+        await asyncio.sleep(settings.PARTICIONES_INTERVALO_HORAS * 3600)
+
+
+if __name__ == "__main__":
+    if engine.dialect.name != "postgresql":
+        print("✗ El particionado solo está disponible en PostgreSQL")
+        sys.exit(1)
+    
+    accion = sys.argv[1] if len(sys.argv) > 1 else "mantener"
+    if accion == "crear":
+        print(f"✓ Tablas particionadas creadas: {crear_layout_particionado() or 'ninguna'}")
+    elif accion == "convertir":
+        print(f"✓ Tablas convertidas: {convertir_tablas() or 'ninguna'}")
+    elif accion == "mantener":
+        resultado = mantener()
+        print(f"✓ Particiones creadas: {resultado['creadas'] or 'ninguna'}")
+        print(f"✓ Particiones retenidas ({settings.RETENCION_MODO}): {resultado['retenidas'] or 'ninguna'}")
+    else:
+        print("Uso: python -m app.utils.particiones [crear|convertir|mantener]")
+        sys.exit(1)
@@ -0,0 +1,201 @@
+"""
+Perfilador de SQL por petición para detectar patrones N+1
+
+Mientras hay un perfil activo (en el contexto de la petición o, para tests,
+global del proceso) cada sentencia que ejecuta el engine se registra con su
+texto, duración y filas. Las sentencias que solo difieren en sus parámetros
+se agrupan por su texto normalizado y, si se repiten al menos
+PERFIL_SQL_UMBRAL_REPETIDAS veces, se marcan como posible N+1.
+
+Uso en tests (pytest) para fijar el máximo de consultas de un endpoint:
+
+    from app.utils.perfil_sql import assert_max_consultas
+
+    def test_detalle_viaje(client):
+        with assert_max_consultas(4, max_repetidas=0):
+            client.get("/viajes/1")
+"""
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from itertools import count
+from typing import Iterator, Optional
+from sqlalchemy import event
+from app.config.settings import settings
+import re
+import threading
+import time
+
+_LITERALES = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|%\(\w+\)s|\$\d+|:\w+\b")
+_LISTAS = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_ESPACIOS = re.compile(r"\s+")
+
+
+def normalizar(sentencia: str) -> str:
+    """Texto de la sentencia sin sus parámetros ni literales, con las listas IN (...) colapsadas"""
+    sentencia = _LITERALES.sub("?", sentencia)
+    sentencia = _LISTAS.sub("(?)", sentencia)
+    return _ESPACIOS.sub(" ", sentencia).strip()
+
+
+class ConsultaPerfilada:
+    __slots__ = ("sentencia", "duracion", "filas")
+    
+    def __init__(self, sentencia: str, duracion: float, filas: Optional[int]):
+        self.sentencia = sentencia
+        self.duracion = duracion
+        self.filas = filas
+
+
+class _CursorContado:
+    """Envuelve el cursor de un SELECT para contar las filas que se leen de él"""
+    
+    def __init__(self, cursor, consulta: ConsultaPerfilada):
+        self._cursor = cursor
+        self._consulta = consulta
+        consulta.filas = 0
+    
+    def fetchone(self):
+        fila = self._cursor.fetchone()
+        if fila is not None:
+            self._consulta.filas += 1
+        return fila
+    
+    def fetchmany(self, *args, **kwargs):
+        filas = self._cursor.fetchmany(*args, **kwargs)
+        self._consulta.filas += len(filas)
+        return filas
+    
+    def fetchall(self):
+        filas = self._cursor.fetchall()
+        self._consulta.filas += len(filas)
+        return filas
+    
+    def __getattr__(self, nombre):
+        return getattr(self._cursor, nombre)
+
+
+class PerfilSQL:
+    """Sentencias ejecutadas durante una petición (o un bloque de test)"""
+    
+    _ids = count(1)
+    
+    def __init__(self, metodo: Optional[str] = None, path: Optional[str] = None):
+        self.id = next(self._ids)
+        self.metodo = metodo
+        self.path = path
+        self.consultas: list[ConsultaPerfilada] = []
+        self._lock = threading.Lock()
+    
+    def registrar(self, consulta: ConsultaPerfilada):
+        with self._lock:
+            self.consultas.append(consulta)
+    
+    @property
+    def total(self) -> int:
+        return len(self.consultas)
+    
+    @property
+    def duracion_ms(self) -> float:
+        return sum(consulta.duracion for consulta in self.consultas) * 1000
+    
+    def repetidas(self, umbral: Optional[int] = None) -> dict[str, int]:
+        """Sentencias normalizadas que se ejecutaron al menos `umbral` veces"""
+        umbral = umbral or settings.PERFIL_SQL_UMBRAL_REPETIDAS
+        veces = Counter(normalizar(consulta.sentencia) for consulta in self.consultas)
+        return {sentencia: n for sentencia, n in veces.most_common() if n >= umbral}
+    
+    def resumen(self, detalle: bool = False) -> dict:
+        datos = {
+            "id": self.id,
+            "metodo": self.metodo,
+            "path": self.path,
+            "consultas": self.total,
+            "duracion_ms": round(self.duracion_ms, 3),
+            "repetidas": self.repetidas(),
+        }
+        if detalle:
+            datos["sentencias"] = [
+                {
+                    "sentencia": consulta.sentencia,
+                    "duracion_ms": round(consulta.duracion * 1000, 3),
+                    "filas": consulta.filas,
+                }
+                for consulta in self.consultas
+            ]
+        return datos
+
+
+_perfil_actual: ContextVar[Optional[PerfilSQL]] = ContextVar("perfil_sql", default=None)
+# Perfil de todo el proceso, para tests donde la app corre en otro hilo
+_perfil_global: Optional[PerfilSQL] = None
+
+# Últimos perfiles de peticiones, para GET /debug/sql
+historial: deque[PerfilSQL] = deque(maxlen=settings.PERFIL_SQL_HISTORIAL)
+
+
+def perfil_activo() -> Optional[PerfilSQL]:
+    return _perfil_actual.get() or _perfil_global
+
+
+@contextmanager
+def perfilar(perfil: Optional[PerfilSQL] = None) -> Iterator[PerfilSQL]:
+    """Activa un perfil en el contexto actual (la petición y sus hilos del threadpool)"""
+    perfil = perfil or PerfilSQL()
+    token = _perfil_actual.set(perfil)
+    try:
+        yield perfil
+    finally:
+        _perfil_actual.reset(token)
+
+
+@contextmanager
+def assert_max_consultas(maximo: int, max_repetidas: Optional[int] = None) -> Iterator[PerfilSQL]:
+    """
+    Falla con AssertionError si dentro del bloque se ejecutan más de `maximo`
+    sentencias o, con `max_repetidas`, si alguna sentencia normalizada se repite
+    más veces que eso. Captura las sentencias de cualquier hilo (p. ej. las de
+    la app bajo TestClient), así que no debe usarse con peticiones concurrentes
+    """
+    global _perfil_global
+    perfil = PerfilSQL()
+    anterior, _perfil_global = _perfil_global, perfil
+    try:
+        yield perfil
+    finally:
+        _perfil_global = anterior
+    
+    sentencias = "\n".join(f"  {consulta.sentencia}" for consulta in perfil.consultas)
+    assert perfil.total <= maximo, f"Se ejecutaron {perfil.total} consultas (máximo {maximo}):\n{sentencias}"
+    if max_repetidas is not None:
+        repetidas = {sentencia: n for sentencia, n in perfil.repetidas(2).items() if n > max_repetidas}
+        assert not repetidas, f"Sentencias repetidas más de {max_repetidas} veces (posible N+1): {repetidas}"
+
+
+def instrumentar(engine):
+    """Registra los listeners del perfilador en un engine síncrono"""
+    
+    @event.listens_for(engine, "before_cursor_execute")
+    def _antes(conn, cursor, statement, parameters, context, executemany):
+        if perfil_activo() is not None:
+            conn.info.setdefault("inicio_perfil", []).append(time.perf_counter())
+    
+    @event.listens_for(engine, "after_cursor_execute")
+    def _despues(conn, cursor, statement, parameters, context, executemany):
+        perfil = perfil_activo()
+        inicios = conn.info.get("inicio_perfil")
+        if perfil is None or not inicios:
+            return
+        consulta = ConsultaPerfilada(statement, time.perf_counter() - inicios.pop(), None)
+        if cursor.description is not None and not executemany and context is not None:
+            # Las filas de un SELECT se cuentan a medida que SQLAlchemy las lee
+            context.cursor = _CursorContado(cursor, consulta)
+        elif cursor.rowcount is not None and cursor.rowcount >= 0:
+            consulta.filas = cursor.rowcount
+        perfil.registrar(consulta)
+    
+    @event.listens_for(engine, "handle_error")
+    def _error(contexto):
+        inicios = contexto.connection.info.get("inicio_perfil") if contexto.connection is not None else None
+        if inicios:
+            inicios.pop()
@@ -0,0 +1,42 @@
+"""
+Camino rápido de serialización JSON para las rutas de listados
+
+Con JSON_RAPIDO las rutas traen las filas como tuplas (sin construir entidades
+ORM), las convierten en dicts con los campos del schema de respuesta y las
+codifican directamente a bytes con orjson. Al devolver una Response FastAPI
+no vuelve a validar contra el response_model, que se mantiene declarado en
+la ruta para la documentación OpenAPI.
+"""
+from collections.abc import Sequence
+from typing import Any
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+import orjson
+
+
+class RespuestaJSONRapida(JSONResponse):
+    """JSONResponse codificada con orjson (datetimes UTC con sufijo Z, como Pydantic)"""
+    
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z)
+
+
+def campos(schema: type[BaseModel]) -> tuple[str, ...]:
+    """Nombres de los campos del schema, en orden"""
+    return tuple(schema.model_fields)
+
+
+def columnas(modelo, schema: type[BaseModel]) -> list:
+    """Columnas del modelo ORM que corresponden a los campos del schema"""
+    return [getattr(modelo, campo) for campo in campos(schema)]
+
+
+def como_dicts(filas: list, schema: type[BaseModel]) -> list[dict]:
+    """
+    Convierte filas (tuplas en el orden de `columnas`) u objetos con esos
+    atributos en dicts con los campos del schema
+    """
+    nombres = campos(schema)
+    if filas and isinstance(filas[0], Sequence):
+        return [dict(zip(nombres, fila)) for fila in filas]
+    return [{nombre: getattr(fila, nombre) for nombre in nombres} for fila in filas]
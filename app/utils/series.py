@@ -0,0 +1,50 @@
+"""Utilidades para series temporales: intervalos de agregación y LTTB"""
+import re
+
+UNIDADES_SEGUNDOS = {"s": 1, "m": 60, "h": 3600}
+
+
+def parsear_intervalo(intervalo: str) -> int:
+    """Convierte '10s', '1m', '5m' o '1h' a segundos. Lanza ValueError si es inválido"""
+    coincidencia = re.fullmatch(r"(\d+)([smh])", intervalo.strip().lower())
+    if not coincidencia or int(coincidencia.group(1)) <= 0:
+        raise ValueError(f"Intervalo inválido: '{intervalo}' (usar por ejemplo 10s, 1m, 5m, 1h)")
+    return int(coincidencia.group(1)) * UNIDADES_SEGUNDOS[coincidencia.group(2)]
+
+
+def lttb(puntos: list, max_puntos: int, x, y) -> list:
+    """
+    Largest-Triangle-Three-Buckets: reduce `puntos` a `max_puntos` conservando
+    la forma visual de la serie. `x` e `y` obtienen las coordenadas de cada punto
+    """
+    total = len(puntos)
+    if max_puntos >= total or max_puntos < 3:
+        return puntos[:max_puntos] if max_puntos < 3 else puntos
+    
+    xs = [x(p) for p in puntos]
+    ys = [y(p) for p in puntos]
+    
+    seleccion = [puntos[0]]
+    tamano = (total - 2) / (max_puntos - 2)
+    a = 0
+    for i in range(max_puntos - 2):
+        # Promedio del siguiente bucket (tercer vértice del triángulo)
+        inicio_sig = int((i + 1) * tamano) + 1
+        fin_sig = min(int((i + 2) * tamano) + 1, total)
+        n_sig = fin_sig - inicio_sig
+        x_prom = sum(xs[inicio_sig:fin_sig]) / n_sig
+        y_prom = sum(ys[inicio_sig:fin_sig]) / n_sig
+        
+        # Punto del bucket actual que forma el triángulo de mayor área
+        inicio = int(i * tamano) + 1
+        fin = int((i + 1) * tamano) + 1
+        mejor, mayor_area = inicio, -1.0
+        for j in range(inicio, fin):
+            area = abs((xs[a] - x_prom) * (ys[j] - ys[a]) - (xs[a] - xs[j]) * (y_prom - ys[a]))
+            if area > mayor_area:
+                mejor, mayor_area = j, area
+        seleccion.append(puntos[mejor])
+        a = mejor
+    
+    seleccion.append(puntos[-1])
+    return seleccion
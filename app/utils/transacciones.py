@@ -0,0 +1,36 @@
+"""
+Callbacks que se ejecutan cuando la transacción de una sesión se confirma o se revierte
+
+Sirve para mantener estado en memoria (cachés, ventanas de detección) coherente
+con la base de datos: el estado se actualiza durante la transacción y se
+descarta si ésta no llega a confirmarse.
+"""
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+_CLAVE_CONFIRMAR = "al_confirmar"
+_CLAVE_REVERTIR = "al_revertir"
+
+
+def al_confirmar(db: Session, callback) -> None:
+    """Ejecuta `callback()` cuando se confirme la transacción en curso de `db`"""
+    db.info.setdefault(_CLAVE_CONFIRMAR, []).append(callback)
+
+
+def al_revertir(db: Session, callback) -> None:
+    """Ejecuta `callback()` si la transacción en curso de `db` se revierte"""
+    db.info.setdefault(_CLAVE_REVERTIR, []).append(callback)
+
+
+@event.listens_for(Session, "after_commit")
+def _despues_de_confirmar(db: Session):
+    db.info.pop(_CLAVE_REVERTIR, None)
+    for callback in db.info.pop(_CLAVE_CONFIRMAR, []):
+        callback()
+
+
+@event.listens_for(Session, "after_rollback")
+def _despues_de_revertir(db: Session):
+    db.info.pop(_CLAVE_CONFIRMAR, None)
+    for callback in db.info.pop(_CLAVE_REVERTIR, []):
+        callback()
@@ -0,0 +1,103 @@
+"""
+Benchmark de POST /lecturas/ en modo síncrono (threadpool) y asíncrono (DB_ASYNC)
+Ejecutar con: python -m benchmarks.bench_async_db [--clientes 500] [--peticiones 10000]
+
+Cada modo corre en un subproceso propio, porque el modo se fija al importar la app.
+Usa SQLite (aiosqlite en modo asíncrono) como base de datos local.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def _preparar_entorno(directorio: str, modo_async: bool):
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(directorio, 'bench.db')}"
+    os.environ["SECRET_KEY"] = "benchmark"
+    os.environ["DB_ASYNC"] = "true" if modo_async else "false"
+
+
+async def _medir(clientes: int, peticiones: int) -> dict:
+    import httpx
+    from app.config.database import Base, async_engine, engine
+    from app.main import app
+
+    Base.metadata.create_all(bind=engine)
+
+    transporte = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as cliente:
+        conductor = (await cliente.post("/conductores/", json={"nombre": "Benchmark"})).json()
+        viaje = (await cliente.post("/viajes/", json={"id_conductor": conductor["id_conductor"]})).json()
+        lectura = {
+            "id_viaje": viaje["id_viaje"],
+            "percios": 0.8,
+            "frecuencia_cardiaca": 80,
+            "conteo_cabeceos": 1,
+            "conteo_bostezos": 1,
+        }
+
+        pendientes = iter(range(peticiones))
+        errores = 0
+
+        async def _cliente():
+            nonlocal errores
+            for _ in pendientes:
+                respuesta = await cliente.post("/lecturas/", json=lectura)
+                if respuesta.status_code != 201:
+                    errores += 1
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(_cliente() for _ in range(clientes)))
+        duracion = time.perf_counter() - inicio
+
+    # aiosqlite mantiene un hilo por conexión que impide terminar el proceso
+    if async_engine is not None:
+        await async_engine.dispose()
+
+    return {
+        "peticiones": peticiones,
+        "clientes": clientes,
+        "errores": errores,
+        "segundos": round(duracion, 3),
+        "peticiones_por_segundo": round(peticiones / duracion, 1),
+    }
+
+
+def _ejecutar_modo(modo: str, clientes: int, peticiones: int) -> dict:
+    salida = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_async_db", "--modo", modo,
+         "--clientes", str(clientes), "--peticiones", str(peticiones)],
+        check=True, capture_output=True, text=True,
+    )
+    return json.loads(salida.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clientes", type=int, default=500)
+    parser.add_argument("--peticiones", type=int, default=10000)
+    parser.add_argument("--modo", choices=["sync", "async"], default=None)
+    args = parser.parse_args()
+
+    if args.modo:
+        with tempfile.TemporaryDirectory() as directorio:
+            _preparar_entorno(directorio, args.modo == "async")
+            resultado = asyncio.run(_medir(args.clientes, args.peticiones))
+        print(json.dumps(resultado))
+        return
+
+    for modo in ("sync", "async"):
+        resultado = _ejecutar_modo(modo, args.clientes, args.peticiones)
+        print(
+            f"{modo:>5}: {resultado['peticiones_por_segundo']:>8} req/s "
+            f"({resultado['peticiones']} peticiones, {resultado['clientes']} clientes, "
+            f"{resultado['errores']} errores, {resultado['segundos']}s)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+Prueba de carga de una flota: N conductores con un viaje activo cada uno envían
+lecturas a POST /lecturas/ a un ritmo fijo mientras varios tableros consultan
+/alertas/recientes y /viajes/{id}/estadisticas
+Ejecutar con: python -m benchmarks.bench_carga_flota [--vehiculos 50] [--hz 1] [--duracion 30]
+    [--tableros 5] [--intervalo-tablero 1] [--database-url postgresql://...] [--salida resultados.json]
+
+Por defecto levanta la app en el mismo proceso (httpx.ASGITransport, con su
+lifespan) sobre SQLite en un directorio temporal; con --database-url usa esa
+base y con --url ataca un servidor ya levantado. Las variables de entorno de
+Settings (DB_ASYNC, INGESTA_DIFERIDA, JSON_RAPIDO...) aplican como siempre.
+Reporta throughput y latencias p50/p95/p99 por endpoint y guarda los
+resultados en JSON junto con el commit y la configuración, para comparar
+corridas entre commits.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import tempfile
+import time
+from contextlib import AsyncExitStack
+from datetime import datetime
+
+ENDPOINT_LECTURAS = "POST /lecturas/"
+ENDPOINT_RECIENTES = "GET /alertas/recientes"
+ENDPOINT_ESTADISTICAS = "GET /viajes/{id}/estadisticas"
+ENDPOINT_FLOTA = "GET /viajes/flota"
+
+# Variables de Settings que cambian el comportamiento medido
+CONFIGURACION = (
+    "DB_ASYNC",
+    "DB_POOL_SIZE",
+    "INGESTA_DIFERIDA",
+    "JSON_RAPIDO",
+    "DETECCION_MODO",
+    "ALERTAS_COOLDOWN_SEGUNDOS",
+    "LOG_PETICIONES_MUESTREO",
+)
+
+
+class Mediciones:
+    def __init__(self):
+        self.latencias: dict[str, list[float]] = {}
+        self.errores: dict[str, int] = {}
+        self.retraso_max = 0.0
+
+    def registrar(self, endpoint: str, segundos: float, ok: bool):
+        self.latencias.setdefault(endpoint, []).append(segundos)
+        if not ok:
+            self.errores[endpoint] = self.errores.get(endpoint, 0) + 1
+
+    def resumen(self, duracion: float) -> dict:
+        return {
+            endpoint: {
+                "peticiones": len(valores),
+                "errores": self.errores.get(endpoint, 0),
+                "peticiones_por_segundo": round(len(valores) / duracion, 1),
+                **_percentiles(valores),
+            }
+            for endpoint, valores in self.latencias.items()
+        }
+
+
+def _percentiles(valores: list[float]) -> dict:
+    ordenados = sorted(valores)
+
+    def _p(percentil: float) -> float:
+        # Rango más cercano
+        indice = max(0, min(len(ordenados) - 1, int(round(percentil / 100 * len(ordenados))) - 1))
+        return round(ordenados[indice] * 1000, 3)
+
+    return {
+        "p50_ms": _p(50),
+        "p95_ms": _p(95),
+        "p99_ms": _p(99),
+        "promedio_ms": round(sum(ordenados) / len(ordenados) * 1000, 3),
+        "max_ms": round(ordenados[-1] * 1000, 3),
+    }
+
+
+def _lectura(id_viaje: int) -> dict:
+    # Una de cada ~20 lecturas viene de un conductor somnoliento y genera alertas
+    somnoliento = random.random() < 0.05
+    return {
+        "id_viaje": id_viaje,
+        "percios": round(random.uniform(0.3, 0.6) if somnoliento else random.uniform(0.0, 0.2), 3),
+        "frecuencia_cardiaca": random.randint(50, 65) if somnoliento else random.randint(65, 95),
+        "conteo_cabeceos": random.randint(3, 8) if somnoliento else 0,
+        "conteo_bostezos": random.randint(5, 12) if somnoliento else random.randint(0, 1),
+    }
+
+
+async def _medir(cliente, mediciones: Mediciones, endpoint: str, metodo: str, url: str, **kwargs):
+    inicio = time.perf_counter()
+    try:
+        respuesta = await cliente.request(metodo, url, **kwargs)
+        ok = respuesta.status_code < 400
+    except Exception:
+        ok = False
+    mediciones.registrar(endpoint, time.perf_counter() - inicio, ok)
+
+
+async def _vehiculo(cliente, mediciones: Mediciones, id_viaje: int, hz: float, fin: float):
+    # Ritmo fijo (carga abierta): si una respuesta se demora, las siguientes no se posponen
+    periodo = 1 / hz
+    siguiente = time.perf_counter() + random.uniform(0, periodo)
+    while siguiente < fin:
+        espera = siguiente - time.perf_counter()
+        if espera > 0:
+            await asyncio.sleep(espera)
+        else:
+            mediciones.retraso_max = max(mediciones.retraso_max, -espera)
+        await _medir(cliente, mediciones, ENDPOINT_LECTURAS, "POST", "/lecturas/", json=_lectura(id_viaje))
+        siguiente += periodo
+
+
+async def _tablero(cliente, mediciones: Mediciones, viajes: list[int], intervalo: float, fin: float, flota: bool):
+    await asyncio.sleep(random.uniform(0, intervalo))
+    while time.perf_counter() < fin:
+        inicio = time.perf_counter()
+        await _medir(cliente, mediciones, ENDPOINT_RECIENTES, "GET", "/alertas/recientes", params={"limit": 20})
+        await _medir(
+            cliente, mediciones, ENDPOINT_ESTADISTICAS, "GET", f"/viajes/{random.choice(viajes)}/estadisticas"
+        )
+        if flota:
+            await _medir(cliente, mediciones, ENDPOINT_FLOTA, "GET", "/viajes/flota")
+        await asyncio.sleep(max(0.0, intervalo - (time.perf_counter() - inicio)))
+
+
+async def _preparar_flota(cliente, vehiculos: int) -> list[int]:
+    viajes = []
+    for i in range(vehiculos):
+        conductor = (await cliente.post("/conductores/", json={"nombre": f"Conductor carga {i}"})).json()
+        viaje = (await cliente.post("/viajes/", json={"id_conductor": conductor["id_conductor"]})).json()
+        viajes.append(viaje["id_viaje"])
+    return viajes
+
+
+async def _correr(args) -> dict:
+    import httpx
+
+    async with AsyncExitStack() as pila:
+        if args.url:
+            cliente = await pila.enter_async_context(httpx.AsyncClient(base_url=args.url, timeout=30))
+        else:
+            from app.config.database import async_engine
+            from app.main import app
+            from app.utils.migraciones import sincronizar_esquema
+
+            sincronizar_esquema()
+            if async_engine is not None:
+                # aiosqlite mantiene un hilo por conexión que impide terminar el proceso
+                pila.push_async_callback(async_engine.dispose)
+            await pila.enter_async_context(app.router.lifespan_context(app))
+            transporte = httpx.ASGITransport(app=app)
+            cliente = await pila.enter_async_context(
+                httpx.AsyncClient(transport=transporte, base_url="http://carga", timeout=30)
+            )
+
+        viajes = await _preparar_flota(cliente, args.vehiculos)
+        mediciones = Mediciones()
+        inicio = time.perf_counter()
+        fin = inicio + args.duracion
+        await asyncio.gather(
+            *(_vehiculo(cliente, mediciones, id_viaje, args.hz, fin) for id_viaje in viajes),
+            *(
+                _tablero(cliente, mediciones, viajes, args.intervalo_tablero, fin, args.flota)
+                for _ in range(args.tableros)
+            ),
+        )
+        duracion = time.perf_counter() - inicio
+
+    return {
+        "duracion_s": round(duracion, 3),
+        "retraso_max_envio_ms": round(mediciones.retraso_max * 1000, 3),
+        "endpoints": mediciones.resumen(duracion),
+    }
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "desconocido"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vehiculos", type=int, default=50)
+    parser.add_argument("--hz", type=float, default=1, help="Lecturas por segundo de cada vehículo")
+    parser.add_argument("--duracion", type=float, default=30, help="Segundos de carga")
+    parser.add_argument("--tableros", type=int, default=5)
+    parser.add_argument("--intervalo-tablero", type=float, default=1, help="Segundos entre consultas de cada tablero")
+    parser.add_argument("--flota", action="store_true", help="Los tableros también consultan /viajes/flota")
+    parser.add_argument("--database-url", default=None, help="Base a usar en lugar de SQLite temporal")
+    parser.add_argument("--url", default=None, help="Servidor ya levantado, en lugar de la app en proceso")
+    parser.add_argument("--salida", default=None, help="Archivo JSON de resultados")
+    parser.add_argument("--semilla", type=int, default=1)
+    args = parser.parse_args()
+    random.seed(args.semilla)
+
+    with tempfile.TemporaryDirectory() as directorio:
+        os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(directorio, 'carga.db')}"
+        os.environ.setdefault("SECRET_KEY", "benchmark")
+        os.environ.setdefault("ARCHIVO_DIRECTORIO", os.path.join(directorio, "archivo"))
+        resultado = asyncio.run(_correr(args))
+
+    parametros = {
+        clave: valor for clave, valor in vars(args).items() if clave not in ("salida", "database_url")
+    }
+    parametros["base"] = "externa" if args.url else (args.database_url or "sqlite").split(":", 1)[0]
+    resultado = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "commit": _commit(),
+        "parametros": parametros,
+        "configuracion": {clave: os.environ[clave] for clave in CONFIGURACION if clave in os.environ},
+        **resultado,
+    }
+
+    print(
+        f"{args.vehiculos} vehículos a {args.hz} Hz, {args.tableros} tableros, "
+        f"{resultado['duracion_s']}s (retraso máximo de envío {resultado['retraso_max_envio_ms']}ms)"
+    )
+    for endpoint, datos in resultado["endpoints"].items():
+        print(
+            f"{endpoint:>30}: {datos['peticiones_por_segundo']:>8} req/s, "
+            f"p50 {datos['p50_ms']:>8}ms, p95 {datos['p95_ms']:>8}ms, p99 {datos['p99_ms']:>8}ms, "
+            f"{datos['errores']} errores"
+        )
+
+    salida = args.salida or f"carga_flota_{resultado['commit']}_{datetime.now():%Y%m%d_%H%M%S}.json"
+    with open(salida, "w") as archivo:
+        json.dump(resultado, archivo, indent=2, ensure_ascii=False)
+    print(f"Resultados guardados en {salida}")
+
+
+if __name__ == "__main__":
+    main()
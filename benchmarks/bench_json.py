@@ -0,0 +1,164 @@
+"""
+Benchmark de serialización de los listados: response_model (entidades ORM
+validadas con Pydantic y codificadas con json) frente a JSON_RAPIDO (filas
+como tuplas codificadas con orjson)
+Ejecutar con: python -m benchmarks.bench_json [--lecturas 1000] [--repeticiones 200]
+
+Primero mide en proceso el paso consulta -> bytes de cada listado y luego las
+peticiones HTTP completas por endpoint con httpx.ASGITransport.
+Usa SQLite en un directorio temporal.
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+
+def _poblar(db, lecturas: int) -> int:
+    from sqlalchemy import insert
+    from app.models.models import Alerta, Conductor, LecturaSensor, Viaje
+    from app.services.agregados import AgregadoViajeService
+
+    conductor = Conductor(nombre="Benchmark")
+    db.add(conductor)
+    db.flush()
+    viaje = Viaje(id_conductor=conductor.id_conductor)
+    db.add(viaje)
+    db.commit()
+
+    inicio = datetime(2025, 1, 1)
+    db.execute(insert(LecturaSensor.__table__), [
+        {
+            "id_viaje": viaje.id_viaje,
+            "timestamp": inicio + timedelta(seconds=i),
+            "percios": (i % 100) / 100,
+            "frecuencia_cardiaca": 60 + i % 40,
+            "conteo_cabeceos": i % 4,
+            "conteo_bostezos": i % 3,
+        }
+        for i in range(lecturas)
+    ])
+    db.execute(insert(Alerta.__table__), [
+        {
+            "id_viaje": viaje.id_viaje,
+            "timestamp": inicio + timedelta(seconds=i),
+            "tipo_alerta": "SOMNOLENCIA_CABECEOS",
+            "nivel_somnolencia": "MEDIO",
+            "ocurrencias": 1,
+        }
+        for i in range(lecturas)
+    ])
+    db.commit()
+    AgregadoViajeService.reconstruir(db)
+    return viaje.id_viaje
+
+
+def _tiempo(fn, repeticiones: int) -> float:
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        fn()
+    return (time.perf_counter() - inicio) / repeticiones
+
+
+def _medir_serializacion(db, viaje_id: int, limite: int, repeticiones: int):
+    import orjson
+    from pydantic import TypeAdapter
+    from app.schemas.schemas import AlertaResponse, LecturaSensorResponse
+    from app.services.services import AlertaService, LecturaSensorService
+
+    def _clasico(schema, obtener):
+        # Lo que hace FastAPI con response_model: validar, volcar en modo json y json.dumps
+        adaptador = TypeAdapter(list[schema])
+
+        def _serializar():
+            objetos = obtener(False)
+            datos = adaptador.dump_python(adaptador.validate_python(objetos, from_attributes=True), mode="json")
+            cuerpo = json.dumps(datos, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+            db.expunge_all()
+            return cuerpo
+        return _serializar
+
+    def _rapido(obtener):
+        return lambda: orjson.dumps(obtener(True), option=orjson.OPT_UTC_Z)
+
+    listados = {
+        "lecturas": (LecturaSensorResponse, lambda filas: LecturaSensorService.get_all(db, viaje_id, limit=limite, filas=filas)),
+        "alertas": (AlertaResponse, lambda filas: AlertaService.get_all(db, viaje_id=viaje_id, limit=limite, filas=filas)),
+    }
+    print(f"Serialización en proceso ({limite} filas por página):")
+    for nombre, (schema, obtener) in listados.items():
+        clasico = _clasico(schema, obtener)
+        rapido = _rapido(obtener)
+        if json.loads(clasico()) != json.loads(rapido()):
+            print(f"  {nombre}: ¡las respuestas difieren!")
+        t_clasico = _tiempo(clasico, repeticiones)
+        t_rapido = _tiempo(rapido, repeticiones)
+        print(
+            f"  {nombre:>8}: response_model {t_clasico * 1000:.2f}ms ({limite / t_clasico:,.0f} filas/s), "
+            f"rápido {t_rapido * 1000:.2f}ms ({limite / t_rapido:,.0f} filas/s), x{t_clasico / t_rapido:.1f}"
+        )
+
+
+async def _medir_http(viaje_id: int, limite: int, repeticiones: int):
+    import httpx
+    from app.config.settings import settings
+    from app.main import app
+    from app.services.flota import vista_flota
+    from app.services.recientes import alertas_recientes
+    from app.config.database import con_sesion
+
+    con_sesion(alertas_recientes.sincronizar)
+    endpoints = [
+        f"/lecturas/viaje/{viaje_id}?limit={limite}",
+        f"/alertas/?viaje_id={viaje_id}&limit={limite}",
+        f"/alertas/recientes?limit={min(limite, settings.RECIENTES_CAPACIDAD)}",
+        "/viajes/flota",
+    ]
+    print(f"Peticiones HTTP ({repeticiones} por endpoint):")
+    transporte = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as cliente:
+        for endpoint in endpoints:
+            resultados = []
+            for modo in (False, True):
+                settings.JSON_RAPIDO = modo
+                vista_flota.invalidar()
+                await cliente.get(endpoint)
+                inicio = time.perf_counter()
+                for _ in range(repeticiones):
+                    respuesta = await cliente.get(endpoint)
+                resultados.append(repeticiones / (time.perf_counter() - inicio))
+            print(
+                f"  {endpoint}: response_model {resultados[0]:,.0f} req/s, "
+                f"rápido {resultados[1]:,.0f} req/s, x{resultados[1] / resultados[0]:.1f} "
+                f"({len(respuesta.content):,} bytes)"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--lecturas", type=int, default=1000)
+    parser.add_argument("--repeticiones", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(directorio, 'bench.db')}"
+        os.environ["SECRET_KEY"] = "benchmark"
+
+        from app.config.database import SessionLocal
+        from app.utils.migraciones import sincronizar_esquema
+
+        sincronizar_esquema()
+        db = SessionLocal()
+        try:
+            viaje_id = _poblar(db, args.lecturas)
+            _medir_serializacion(db, viaje_id, args.lecturas, args.repeticiones)
+        finally:
+            db.close()
+        asyncio.run(_medir_http(viaje_id, args.lecturas, args.repeticiones))
+
+
+if __name__ == "__main__":
+    main()
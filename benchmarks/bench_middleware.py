@@ -0,0 +1,121 @@
+"""
+Benchmark del costo del middleware de logging por petición: sin middleware,
+el LoggingMiddleware anterior (BaseHTTPMiddleware con dos logs INFO) y el
+middleware ASGI actual con y sin muestreo
+Ejecutar con: python -m benchmarks.bench_middleware [--peticiones 20000]
+
+Llama a la aplicación ASGI directamente (sin servidor ni cliente HTTP) para
+que el tiempo medido sea el de la pila de middlewares y la ruta. Los logs se
+escriben con un StreamHandler sobre os.devnull, como un handler real.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+
+
+def _middleware_anterior():
+    from fastapi import Request
+    from starlette.middleware.base import BaseHTTPMiddleware
+
+    logger = logging.getLogger("benchmarks.logging_anterior")
+
+    class LoggingMiddlewareAnterior(BaseHTTPMiddleware):
+        """El LoggingMiddleware previo, como referencia"""
+
+        async def dispatch(self, request: Request, call_next):
+            start_time = time.time()
+            logger.info(f"Iniciando petición: {request.method} {request.url.path}")
+            response = await call_next(request)
+            process_time = time.time() - start_time
+            logger.info(
+                f"Petición completada: {request.method} {request.url.path} "
+                f"- Status: {response.status_code} - Tiempo: {process_time:.3f}s"
+            )
+            response.headers["X-Process-Time"] = str(process_time)
+            return response
+
+    return LoggingMiddlewareAnterior
+
+
+def _crear_app(middleware):
+    from fastapi import FastAPI
+
+    app = FastAPI()
+
+    @app.get("/ping/{item_id}")
+    async def ping(item_id: int):
+        return {"item_id": item_id, "ok": True}
+
+    if middleware is not None:
+        app.add_middleware(middleware)
+    return app
+
+
+async def _medir(app, peticiones: int) -> float:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0", "spec_version": "2.3"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/ping/1",
+        "raw_path": b"/ping/1",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 50000),
+        "server": ("bench", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    for _ in range(200):
+        await app(dict(scope), receive, send)
+    inicio = time.perf_counter()
+    for _ in range(peticiones):
+        await app(dict(scope), receive, send)
+    return (time.perf_counter() - inicio) / peticiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--peticiones", type=int, default=20000)
+    args = parser.parse_args()
+
+    os.environ.setdefault("DATABASE_URL", "sqlite://")
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+
+    from app.config.settings import settings
+    from app.middlewares.logging_middleware import LoggingMiddleware
+
+    with open(os.devnull, "w") as devnull:
+        handler = logging.StreamHandler(devnull)
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+        logging.basicConfig(level=logging.INFO, handlers=[handler], force=True)
+
+        casos = [
+            ("sin middleware", None, 1.0),
+            ("BaseHTTPMiddleware anterior", _middleware_anterior(), 1.0),
+            ("ASGI, log de todas", LoggingMiddleware, 1.0),
+            ("ASGI, muestreo 1%", LoggingMiddleware, 0.01),
+        ]
+        base = None
+        for nombre, middleware, muestreo in casos:
+            settings.LOG_PETICIONES_MUESTREO = muestreo
+            por_peticion = asyncio.run(_medir(_crear_app(middleware), args.peticiones))
+            if base is None:
+                base = por_peticion
+            print(
+                f"{nombre:>28}: {por_peticion * 1e6:7.1f}µs/petición "
+                f"({1 / por_peticion:,.0f} req/s, middleware {(por_peticion - base) * 1e6:+.1f}µs)"
+            )
+
+
+if __name__ == "__main__":
+    main()
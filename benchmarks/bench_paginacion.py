@@ -0,0 +1,108 @@
+"""
+Benchmark de paginación: OFFSET frente a cursor (keyset) al recorrer un viaje completo
+Ejecutar con: python -m benchmarks.bench_paginacion [--lecturas 1000000] [--limite 1000]
+
+Usa SQLite en un directorio temporal y llama directamente a LecturaSensorService.get_all.
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+
+def _poblar(db, total: int) -> int:
+    from sqlalchemy import insert
+    from app.models.models import Conductor, Viaje, LecturaSensor
+
+    conductor = Conductor(nombre="Benchmark")
+    db.add(conductor)
+    db.flush()
+    viaje = Viaje(id_conductor=conductor.id_conductor)
+    db.add(viaje)
+    db.commit()
+
+    inicio = datetime(2025, 1, 1)
+    bloque = 50000
+    for desde in range(0, total, bloque):
+        db.execute(insert(LecturaSensor.__table__), [
+            {
+                "id_viaje": viaje.id_viaje,
+                # Timestamps repetidos cada 2 lecturas para ejercitar el desempate por id
+                "timestamp": inicio + timedelta(seconds=i // 2),
+                "percios": 0.5,
+                "frecuencia_cardiaca": 80,
+                "conteo_cabeceos": 0,
+                "conteo_bostezos": 0,
+            }
+            for i in range(desde, min(desde + bloque, total))
+        ])
+    db.commit()
+    return viaje.id_viaje
+
+
+def _recorrer(db, viaje_id: int, limite: int, modo: str) -> dict:
+    from app.services.services import LecturaSensorService
+    from app.utils.paginacion import siguiente_cursor
+
+    paginas, filas, vistos = 0, 0, set()
+    tiempos = []
+    skip, cursor = 0, None
+    while True:
+        inicio = time.perf_counter()
+        if modo == "offset":
+            pagina = LecturaSensorService.get_all(db, viaje_id, skip=skip, limit=limite)
+        else:
+            pagina = LecturaSensorService.get_all(db, viaje_id, limit=limite, cursor=cursor)
+        tiempos.append(time.perf_counter() - inicio)
+        db.expunge_all()
+
+        paginas += 1
+        filas += len(pagina)
+        vistos.update(lectura.id_lectura for lectura in pagina)
+        skip += limite
+        cursor = siguiente_cursor(pagina, limite, "timestamp", "id_lectura")
+        if len(pagina) < limite:
+            break
+
+    return {
+        "paginas": paginas,
+        "filas": filas,
+        "duplicadas": filas - len(vistos),
+        "total_s": sum(tiempos),
+        "primera_ms": tiempos[0] * 1000,
+        "ultima_ms": tiempos[-2 if len(tiempos) > 1 else -1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--lecturas", type=int, default=1_000_000)
+    parser.add_argument("--limite", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(directorio, 'bench.db')}"
+        os.environ["SECRET_KEY"] = "benchmark"
+
+        from app.config.database import SessionLocal
+        from app.utils.migraciones import sincronizar_esquema
+
+        sincronizar_esquema()
+        db = SessionLocal()
+        try:
+            print(f"Insertando {args.lecturas} lecturas...")
+            viaje_id = _poblar(db, args.lecturas)
+            for modo in ("offset", "cursor"):
+                r = _recorrer(db, viaje_id, args.limite, modo)
+                print(
+                    f"{modo:>6}: {r['paginas']} páginas, {r['filas']} filas en {r['total_s']:.2f}s "
+                    f"(primera {r['primera_ms']:.2f}ms, última completa {r['ultima_ms']:.2f}ms, "
+                    f"{r['duplicadas']} duplicadas)"
+                )
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    main()
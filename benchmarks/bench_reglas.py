@@ -0,0 +1,96 @@
+"""
+Benchmark del motor de reglas: evaluación lectura por lectura frente a un lote columnar
+Ejecutar con: python -m benchmarks.bench_reglas [--lecturas 1000000]
+
+Compara la cadena de ifs anterior al motor (creando un AlertaCreate por alerta,
+como hacía AlertaAutoDetector.evaluar_lectura), el motor aplicado lectura por
+lectura y el motor sobre el lote completo, y verifica que los tres coincidan.
+No usa base de datos.
+"""
+import argparse
+import os
+import random
+import time
+from collections import namedtuple
+
+Lectura = namedtuple("Lectura", "id_viaje percios frecuencia_cardiaca conteo_cabeceos conteo_bostezos")
+
+
+def _generar(total: int) -> list:
+    rng = random.Random(42)
+    return [
+        Lectura(
+            1,
+            None if rng.random() < 0.1 else rng.random() * 0.4,
+            None if rng.random() < 0.1 else int(rng.gauss(80, 12)),
+            rng.choices((0, 1, 2, 3, 7), weights=(80, 10, 6, 3, 1))[0],
+            rng.choices((0, 1, 2, 5, 11), weights=(85, 8, 5, 1.5, 0.5))[0],
+        )
+        for _ in range(total)
+    ]
+
+
+def _evaluar_anterior(lectura, settings, AlertaCreate) -> list:
+    """Reglas escritas a mano tal como estaban antes del motor"""
+    alertas = []
+    if lectura.frecuencia_cardiaca is not None:
+        if lectura.frecuencia_cardiaca < settings.UMBRAL_FRECUENCIA_CARDIACA_MIN:
+            alertas.append(AlertaCreate(id_viaje=lectura.id_viaje, tipo_alerta="FRECUENCIA_CARDIACA_BAJA", nivel_somnolencia="MEDIO"))
+        elif lectura.frecuencia_cardiaca > settings.UMBRAL_FRECUENCIA_CARDIACA_MAX:
+            alertas.append(AlertaCreate(id_viaje=lectura.id_viaje, tipo_alerta="FRECUENCIA_CARDIACA_ALTA", nivel_somnolencia="BAJO"))
+    if lectura.conteo_cabeceos >= settings.UMBRAL_CABECEOS:
+        nivel = "ALTO" if lectura.conteo_cabeceos >= settings.UMBRAL_CABECEOS * 2 else "MEDIO"
+        alertas.append(AlertaCreate(id_viaje=lectura.id_viaje, tipo_alerta="SOMNOLENCIA_CABECEOS", nivel_somnolencia=nivel))
+    if lectura.conteo_bostezos >= settings.UMBRAL_BOSTEZOS:
+        nivel = "ALTO" if lectura.conteo_bostezos >= settings.UMBRAL_BOSTEZOS * 2 else "MEDIO"
+        alertas.append(AlertaCreate(id_viaje=lectura.id_viaje, tipo_alerta="FATIGA_BOSTEZOS", nivel_somnolencia=nivel))
+    if lectura.conteo_cabeceos >= settings.UMBRAL_CABECEOS and lectura.conteo_bostezos >= settings.UMBRAL_BOSTEZOS:
+        alertas.append(AlertaCreate(id_viaje=lectura.id_viaje, tipo_alerta="PELIGRO_CRITICO", nivel_somnolencia="CRITICO"))
+    return alertas
+
+
+def _medir(nombre: str, funcion, total: int):
+    inicio = time.perf_counter()
+    resultado = funcion()
+    segundos = time.perf_counter() - inicio
+    print(f"{nombre:>28}: {segundos:.3f}s ({total / segundos / 1e6:.2f} M lecturas/s, {len(resultado)} alertas)")
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--lecturas", type=int, default=1_000_000)
+    args = parser.parse_args()
+    
+    os.environ.setdefault("DATABASE_URL", "sqlite://")
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    from app.config.settings import settings
+    from app.schemas.schemas import AlertaCreate
+    from app.services.alerta_detector import AlertaAutoDetector
+    from app.services.reglas import motor_reglas
+    
+    print(f"Generando {args.lecturas} lecturas...")
+    lecturas = _generar(args.lecturas)
+    columnas = {campo: [getattr(lectura, campo) for lectura in lecturas] for campo in motor_reglas.campos}
+    
+    anterior = _medir("ifs por lectura (anterior)", lambda: [
+        (i, alerta.tipo_alerta, alerta.nivel_somnolencia)
+        for i, lectura in enumerate(lecturas)
+        for alerta in _evaluar_anterior(lectura, settings, AlertaCreate)
+    ], args.lecturas)
+    por_lectura = _medir("motor por lectura", lambda: [
+        (i, alerta.tipo_alerta, alerta.nivel_somnolencia)
+        for i, lectura in enumerate(lecturas)
+        for alerta in AlertaAutoDetector.evaluar_lectura(lectura)
+    ], args.lecturas)
+    lote = _medir("motor lote (filas)", lambda: motor_reglas.evaluar_lote(lecturas), args.lecturas)
+    columnar = _medir("motor lote (columnas)", lambda: motor_reglas.evaluar_columnas(columnas), args.lecturas)
+    
+    coinciden = anterior == por_lectura == lote == columnar
+    print(f"Resultados idénticos: {'sí' if coinciden else 'NO'}")
+    if not coinciden:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
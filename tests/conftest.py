@@ -0,0 +1,52 @@
+"""
+Fixtures de pytest: la aplicación sobre una base SQLite temporal
+
+Las variables de entorno se fijan antes de importar app, porque Settings y el
+engine se crean al importar. Con TEST_DATABASE_URL las pruebas corren contra
+otra base (p. ej. un PostgreSQL local vacío).
+"""
+import os
+import tempfile
+import pytest
+
+_directorio = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = os.environ.get(
+    "TEST_DATABASE_URL", f"sqlite:///{os.path.join(_directorio.name, 'pruebas.db')}"
+)
+os.environ.setdefault("SECRET_KEY", "pruebas")
+os.environ["ARCHIVO_DIRECTORIO"] = os.path.join(_directorio.name, "archivo")
+
+from fastapi.testclient import TestClient  # noqa: E402
+from app.main import app as aplicacion  # noqa: E402
+from app.utils.migraciones import sincronizar_esquema  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def app():
+    sincronizar_esquema()
+    return aplicacion
+
+
+@pytest.fixture(scope="session")
+def client(app):
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def viaje(client) -> int:
+    """Id de un viaje activo nuevo, con su conductor"""
+    conductor = client.post("/conductores/", json={"nombre": "Conductor de prueba"}).json()
+    return client.post("/viajes/", json={"id_conductor": conductor["id_conductor"]}).json()["id_viaje"]
+
+
+@pytest.fixture
+def viaje_con_datos(client, viaje) -> int:
+    """Viaje con 20 lecturas y sus alertas"""
+    lecturas = [
+        {"id_viaje": viaje, "frecuencia_cardiaca": 70 + i, "percios": 0.1, "conteo_cabeceos": 5 if i % 4 == 0 else 0}
+        for i in range(20)
+    ]
+    assert client.post("/lecturas/batch", json=lecturas).status_code == 201
+    assert client.get("/alertas/", params={"viaje_id": viaje}).json()
+    return viaje
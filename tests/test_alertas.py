@@ -0,0 +1,39 @@
+from datetime import datetime
+from app.config.database import SessionLocal
+from app.config.settings import settings
+from app.models.models import Alerta
+from app.services.recientes import alertas_recientes
+
+
+def test_alerta_manual_es_su_ultima_ocurrencia(client, viaje):
+    alerta = client.post("/alertas/", json={"id_viaje": viaje, "tipo_alerta": "MANUAL"}).json()
+    
+    assert alerta["ocurrencias"] == 1
+    assert alerta["ultima_ocurrencia"] == alerta["timestamp"]
+
+
+def test_recientes_mismo_orden_en_memoria_y_en_la_base(client, viaje_con_datos, monkeypatch):
+    # La última alerta tiene un timestamp anterior a las demás (p. ej. una lectura atrasada)
+    with SessionLocal() as db:
+        alerta = Alerta(id_viaje=viaje_con_datos, tipo_alerta="MANUAL", timestamp=datetime(2020, 1, 1))
+        db.add(alerta)
+        db.flush()
+        alertas_recientes.publicar(db, [alerta])
+        db.commit()
+    desde_buffer = client.get("/alertas/recientes", params={"limit": 5}).json()
+    
+    # Sin capacidad el buffer no cubre ningún límite y se consulta la base
+    monkeypatch.setattr(settings, "RECIENTES_CAPACIDAD", 0)
+    desde_base = client.get("/alertas/recientes", params={"limit": 5}).json()
+    
+    ids = [alerta["id_alerta"] for alerta in desde_buffer]
+    assert ids == sorted(ids, reverse=True)
+    assert [alerta["id_alerta"] for alerta in desde_base] == ids
+
+
+def test_alerta_del_detector_es_su_ultima_ocurrencia(client, viaje):
+    lectura = client.post("/lecturas/", json={"id_viaje": viaje, "conteo_cabeceos": 5}).json()
+    
+    # Ambas con la hora de la lectura, no la del INSERT de la alerta
+    (alerta,) = client.get("/alertas/", params={"viaje_id": viaje}).json()
+    assert alerta["timestamp"] == alerta["ultima_ocurrencia"] == lectura["timestamp"]
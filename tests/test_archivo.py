@@ -0,0 +1,25 @@
+from app.config.database import SessionLocal
+from app.services.archivo import ArchivoService
+
+
+def _finalizar(client, viaje: int, fecha_fin: str = "2026-01-01T00:00:00"):
+    assert client.put(f"/viajes/{viaje}/finalizar", json={"fecha_fin": fecha_fin}).status_code == 200
+
+
+def test_viajes_sin_lecturas_no_ocupan_el_limite(client, viaje_con_datos):
+    conductor = client.post("/conductores/", json={"nombre": "Conductor sin lecturas"}).json()
+    vacio = client.post("/viajes/", json={"id_conductor": conductor["id_conductor"]}).json()["id_viaje"]
+    # El viaje vacío finaliza antes y sería el primer candidato
+    _finalizar(client, vacio, "2025-01-01T00:00:00")
+    _finalizar(client, viaje_con_datos)
+    
+    with SessionLocal() as db:
+        assert ArchivoService.archivar_finalizados(db, antiguedad_horas=0, limite=1) == [viaje_con_datos]
+
+
+def test_archivar_viaje_sin_lecturas_libera_la_transaccion(client, viaje):
+    _finalizar(client, viaje)
+    
+    with SessionLocal() as db:
+        assert ArchivoService.archivar_viaje(db, viaje) is None
+        assert not db.in_transaction()
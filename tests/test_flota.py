@@ -0,0 +1,31 @@
+import asyncio
+from app.services import flota
+from app.services.flota import VistaFlota
+
+
+def test_peticion_posterior_a_invalidar_no_recibe_la_vista_anterior(monkeypatch):
+    async def _probar():
+        calculos = []
+        liberar = asyncio.Event()
+        
+        async def _calcular_lento(funcion):
+            calculos.append(len(calculos))
+            numero = calculos[-1]
+            await liberar.wait()
+            return {"calculo": numero}
+        
+        monkeypatch.setattr(flota, "ejecutar_con_sesion", _calcular_lento)
+        vista = VistaFlota()
+        anterior = asyncio.ensure_future(vista.obtener())
+        await asyncio.sleep(0)
+        
+        # Un viaje se inicia mientras se calcula la vista
+        vista.invalidar()
+        posterior = asyncio.ensure_future(vista.obtener())
+        await asyncio.sleep(0)
+        liberar.set()
+        return await anterior, await posterior, vista.vigente()
+    
+    anterior, posterior, vigente = asyncio.run(_probar())
+    assert anterior == {"calculo": 0}
+    assert posterior == vigente == {"calculo": 1}
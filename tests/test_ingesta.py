@@ -0,0 +1,35 @@
+import asyncio
+from app.config.settings import settings
+from app.schemas.schemas import LecturaSensorCreate
+from app.services.ingesta import EscritorDiferido
+
+
+def test_lote_en_curso_cuenta_para_la_capacidad(monkeypatch):
+    monkeypatch.setattr(settings, "INGESTA_COLA_MAX", 5)
+    monkeypatch.setattr(settings, "INGESTA_LOTE_INTERVALO_MS", 0)
+    
+    async def _probar():
+        liberar = asyncio.Event()
+        
+        async def _persistir_lento(lecturas):
+            await liberar.wait()
+        
+        escritor = EscritorDiferido()
+        monkeypatch.setattr(escritor, "_persistir", _persistir_lento)
+        escritor.iniciar()
+        
+        aceptadas = []
+        for i in range(7):
+            aceptadas.append(escritor.encolar([LecturaSensorCreate(id_viaje=1, frecuencia_cardiaca=70 + i)]))
+            # Deja que el escritor tome lo encolado como lote en curso
+            await asyncio.sleep(0)
+        pendientes = escritor.pendientes
+        
+        liberar.set()
+        await escritor.detener()
+        return aceptadas, pendientes, escritor.pendientes
+    
+    aceptadas, pendientes, pendientes_final = asyncio.run(_probar())
+    assert aceptadas == [True] * 5 + [False] * 2
+    assert pendientes == 5
+    assert pendientes_final == 0
@@ -0,0 +1,69 @@
+import pytest
+from app.services.alerta_detector import AlertaAutoDetector
+from app.utils.perfil_sql import assert_max_consultas
+
+
+def _selects(perfil) -> list[str]:
+    return [consulta.sentencia for consulta in perfil.consultas if consulta.sentencia.lstrip().upper().startswith("SELECT")]
+
+
+def test_crear_lectura_sin_alertas(client, viaje):
+    # La primera lectura del viaje crea su agregado
+    client.post("/lecturas/", json={"id_viaje": viaje, "frecuencia_cardiaca": 70})
+    
+    # Antes: commit + refresh de la lectura y commit del detector (2 commits, 3 sentencias)
+    # Ahora: INSERT ... RETURNING de la lectura y upsert del agregado, en un commit
+    with assert_max_consultas(2) as perfil:
+        respuesta = client.post("/lecturas/", json={"id_viaje": viaje, "frecuencia_cardiaca": 72})
+    
+    assert respuesta.status_code == 201
+    assert respuesta.json()["id_lectura"] is not None
+    assert respuesta.json()["timestamp"] is not None
+    assert _selects(perfil) == []
+
+
+def test_crear_lectura_con_alertas(client, viaje):
+    client.post("/lecturas/", json={"id_viaje": viaje, "frecuencia_cardiaca": 70})
+    
+    # Antes: además un refresh por cada alerta generada (hasta 6 SELECT)
+    # Ahora: las alertas también se insertan con RETURNING en la misma transacción
+    with assert_max_consultas(4) as perfil:
+        respuesta = client.post("/lecturas/", json={"id_viaje": viaje, "conteo_cabeceos": 5})
+    
+    assert respuesta.status_code == 201
+    assert _selects(perfil) == []
+    alertas = client.get("/alertas/", params={"viaje_id": viaje}).json()
+    assert [alerta["tipo_alerta"] for alerta in alertas] == ["SOMNOLENCIA_CABECEOS"]
+
+
+def test_lectura_y_alertas_en_una_transaccion(client, viaje, monkeypatch):
+    def _fallar(*args, **kwargs):
+        raise RuntimeError("fallo del detector")
+    
+    monkeypatch.setattr(AlertaAutoDetector, "analizar_lote", _fallar)
+    with pytest.raises(RuntimeError):
+        client.post("/lecturas/", json={"id_viaje": viaje, "conteo_cabeceos": 5})
+    
+    # Si falla el análisis tampoco queda la lectura
+    assert client.get(f"/lecturas/viaje/{viaje}").json() == []
+
+
+def test_ws_responde_error_con_json_invalido(client, viaje):
+    with client.websocket_connect(f"/lecturas/ws/{viaje}") as websocket:
+        websocket.send_text("no es json")
+        assert websocket.receive_json()["tipo"] == "error"
+        
+        # El canal sigue abierto después del error
+        websocket.send_text('{"frecuencia_cardiaca": 70}')
+        assert websocket.receive_json()["tipo"] == "lote"
+
+
+def test_ws_error_al_persistir_envia_error_y_cierra(client, viaje, monkeypatch):
+    def _fallar(*args, **kwargs):
+        raise RuntimeError("fallo del detector")
+    
+    monkeypatch.setattr(AlertaAutoDetector, "analizar_lote", _fallar)
+    with client.websocket_connect(f"/lecturas/ws/{viaje}") as websocket:
+        websocket.send_text('{"frecuencia_cardiaca": 70}')
+        assert websocket.receive_json()["tipo"] == "error"
+        assert websocket.receive()["code"] == 1011
@@ -0,0 +1,36 @@
+from datetime import datetime
+from sqlalchemy import select
+from app.config.database import SessionLocal
+from app.config.settings import settings
+from app.models.models import Viaje
+from app.services.perfiles import PerfilConductor, ResolutorPerfiles
+
+
+def test_horario_de_riesgo_en_hora_local(monkeypatch):
+    # UTC-5 fijo: las 03:00 UTC son las 22:00 locales
+    monkeypatch.setattr(settings, "ZONA_HORARIA", "Etc/GMT+5")
+    perfil = PerfilConductor.desde_conductor(None, "20:00-23:00", None)
+    
+    assert perfil.motor_en(datetime(2026, 1, 1, 3, 0)) is perfil.motor_riesgo
+    assert perfil.motor_en(datetime(2026, 1, 1, 21, 0)) is perfil.motor
+
+
+def test_invalidacion_durante_la_consulta_no_deja_el_perfil_en_cache(client, viaje):
+    resolutor = ResolutorPerfiles()
+    with SessionLocal() as db:
+        conductor_id = db.scalar(select(Viaje.id_conductor).where(Viaje.id_viaje == viaje))
+        ejecutar = db.execute
+        
+        def _ejecutar_e_invalidar(*args, **kwargs):
+            # El conductor se modifica entre la consulta y el guardado en caché
+            resultado = ejecutar(*args, **kwargs)
+            resolutor.invalidar_conductor(conductor_id)
+            return resultado
+        
+        db.execute = _ejecutar_e_invalidar
+        assert viaje in resolutor.resolver(db, [viaje])
+        assert len(resolutor) == 0
+        
+        db.execute = ejecutar
+        resolutor.resolver(db, [viaje])
+        assert len(resolutor) == 1
@@ -0,0 +1,89 @@
+"""
+Regresión de planes de consulta: se capturan las sentencias que ejecutan los
+servicios y se verifica con EXPLAIN que ninguna recorre una tabla completa
+"""
+from datetime import datetime
+import pytest
+from sqlalchemy import event
+from app.config.database import SessionLocal, engine
+from app.services import AlertaService, LecturaSensorService, ViajeService
+from app.utils.paginacion import codificar_cursor
+
+
+@pytest.fixture
+def db(app):
+    sesion = SessionLocal()
+    try:
+        yield sesion
+    finally:
+        sesion.close()
+
+
+def _capturar(funcion, *args, **kwargs) -> list[tuple]:
+    """Sentencias SELECT (con sus parámetros) que ejecuta funcion(*args, **kwargs)"""
+    sentencias = []
+    
+    def _registrar(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            sentencias.append((statement, parameters))
+    
+    event.listen(engine, "before_cursor_execute", _registrar)
+    try:
+        funcion(*args, **kwargs)
+    finally:
+        event.remove(engine, "before_cursor_execute", _registrar)
+    return sentencias
+
+
+def _plan(conn, sentencia: str, parametros) -> str:
+    if conn.dialect.name == "sqlite":
+        filas = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sentencia}", parametros).all()
+        return "\n".join(fila[-1] for fila in filas)
+    filas = conn.exec_driver_sql(f"EXPLAIN {sentencia}", parametros).all()
+    return "\n".join(fila[0] for fila in filas)
+
+
+def _usa_recorrido_secuencial(dialecto: str, plan: str) -> bool:
+    if dialecto == "sqlite":
+        # "SCAN tabla" sin índice es un recorrido completo
+        return any(
+            linea.strip().startswith("SCAN") and "INDEX" not in linea
+            for linea in plan.splitlines()
+        )
+    return "Seq Scan" in plan
+
+
+CASOS = {
+    "LecturaSensorService.get_all": lambda db, v: LecturaSensorService.get_all(db, v, limit=5, filas=True),
+    "LecturaSensorService.get_all (cursor)": lambda db, v: LecturaSensorService.get_all(
+        db, v, limit=5, cursor=codificar_cursor(datetime.now(), 10**9)
+    ),
+    "LecturaSensorService.get_serie": lambda db, v: LecturaSensorService.get_serie(db, v, intervalo_segundos=60),
+    "AlertaService.get_all": lambda db, v: AlertaService.get_all(db, v, limit=5),
+    "AlertaService.get_all (cursor)": lambda db, v: AlertaService.get_all(
+        db, v, limit=5, cursor=codificar_cursor(datetime.now(), 10**9)
+    ),
+    "AlertaService.get_all (sistema)": lambda db, v: AlertaService.get_all(db, limit=5, filas=True),
+    # Un límite mayor que el buffer obliga a leer de la base
+    "AlertaService.get_alertas_recientes": lambda db, v: AlertaService.get_alertas_recientes(
+        db, limit=10**6, since_id=1
+    ),
+    "ViajeService.get_detalle": lambda db, v: ViajeService.get_detalle(db, v),
+    "ViajeService.get_estadisticas": lambda db, v: ViajeService.get_estadisticas(db, v),
+    "ViajeService.get_active_by_conductor": lambda db, v: ViajeService.get_active_by_conductor(db, 1),
+}
+
+
+@pytest.mark.parametrize("nombre", list(CASOS))
+def test_consultas_usan_indices(db, viaje_con_datos, nombre):
+    sentencias = _capturar(CASOS[nombre], db, viaje_con_datos)
+    assert sentencias
+    
+    with engine.connect() as conn:
+        if conn.dialect.name == "postgresql":
+            # Con tablas pequeñas el planificador prefiere el recorrido secuencial
+            # aunque exista el índice; lo desactivamos para ver si hay alternativa
+            conn.exec_driver_sql("SET enable_seqscan = off")
+        for sentencia, parametros in sentencias:
+            plan = _plan(conn, sentencia, parametros)
+            assert not _usa_recorrido_secuencial(conn.dialect.name, plan), f"{sentencia}\n{plan}"
@@ -0,0 +1,48 @@
+"""
+Presupuestos de consultas por endpoint: el número de sentencias no debe crecer
+con las lecturas y alertas del viaje (una regresión N+1 hace fallar la prueba)
+"""
+import pytest
+from app.utils.perfil_sql import assert_max_consultas
+
+
+@pytest.mark.parametrize(
+    "ruta, maximo",
+    [
+        # Viaje con su conductor, últimas lecturas y alertas
+        ("/viajes/{id}", 3),
+        ("/lecturas/viaje/{id}", 1),
+        # Se leen de agregados_viajes, no recorriendo las lecturas
+        ("/viajes/{id}/estadisticas", 1),
+    ],
+)
+def test_presupuesto_de_consultas(client, viaje_con_datos, ruta, maximo):
+    with assert_max_consultas(maximo, max_repetidas=1):
+        respuesta = client.get(ruta.format(id=viaje_con_datos))
+    
+    assert respuesta.status_code == 200
+
+
+def test_rutas_de_perfiles_solo_con_perfilador(client):
+    # PERFIL_SQL y PERFIL_SQL_HEADER están desactivados en las pruebas
+    assert client.get("/debug/sql").status_code == 404
+
+
+def test_presupuesto_de_lote(client, viaje):
+    client.post("/lecturas/", json={"id_viaje": viaje})
+    lecturas = [
+        {"id_viaje": viaje, "frecuencia_cardiaca": 60 + i % 50, "conteo_cabeceos": 5 if i % 100 == 0 else 0}
+        for i in range(500)
+    ]
+    
+    # Lecturas, agregado, alertas y agregado otra vez: no una sentencia por fila
+    with assert_max_consultas(4, max_repetidas=1):
+        respuesta = client.post("/lecturas/batch", json=lecturas)
+    
+    assert respuesta.status_code == 201
+    insertadas = respuesta.json()["lecturas"]
+    assert [lectura["frecuencia_cardiaca"] for lectura in insertadas] == [
+        lectura["frecuencia_cardiaca"] for lectura in lecturas
+    ]
+    ids = [lectura["id_lectura"] for lectura in insertadas]
+    assert ids == sorted(ids)
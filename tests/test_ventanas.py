@@ -0,0 +1,18 @@
+from app.config.settings import settings
+from app.services.ventanas import detector_ventanas
+
+
+def test_ventana_alerta_al_subir_de_nivel(client, viaje, monkeypatch):
+    monkeypatch.setattr(settings, "DETECCION_MODO", "ventana")
+    detector_ventanas.limpiar()
+    
+    # 2 cabeceos por lectura: la ventana llega al umbral (MEDIO) y luego al doble (ALTO)
+    for _ in range(settings.UMBRAL_CABECEOS_VENTANA):
+        assert client.post("/lecturas/", json={"id_viaje": viaje, "conteo_cabeceos": 2}).status_code == 201
+    
+    alertas = client.get("/alertas/", params={"viaje_id": viaje}).json()
+    niveles = [
+        alerta["nivel_somnolencia"] for alerta in reversed(alertas)
+        if alerta["tipo_alerta"] == "SOMNOLENCIA_CABECEOS_VENTANA"
+    ]
+    assert niveles == ["MEDIO", "ALTO"]